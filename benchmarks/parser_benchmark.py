@@ -0,0 +1,205 @@
+"""
+Benchmark the parsing of parliamentarian-legislature profile pages, on a synthetic corpus (see synthetic_profiles), and
+flag regressions against a stored baseline.
+
+For a given corpus size and seed it reports
+    - pages per second for extract_parliamentarian_info, in full, strained (i.e. only parsing the regions of the page
+      that the extractors read) and fast mode (i.e. getting the simple fields with regexes), and for the BeautifulSoup
+      parse alone
+    - the time per page of each of the get_* extractors, run on pages that are already parsed
+    - the wall time and peak (python) memory of make_parliamentarians_legislature_table, off a synthetic zip archive
+    - how many pages were parsed wrong, i.e. not as synthetic_profiles expects
+    - how many pages of a corpus of mixed layouts (see synthetic_profiles, variety) the extractors routed to by layout
+      (see page_fingerprint) get something else out of than the generic ones, or than synthetic_profiles expects
+    - links per second for reading the link listing that the scraper starts from (the real one, in scrape/), streamed
+      (see scrape/link_manifest.py) and as a BeautifulSoup tree
+
+Run it as "python -m benchmarks.parser_benchmark" from the repo root; add "--save-baseline" to store the results as
+the new baseline, and "--chrome" to run it on pages with the menus, scripts and footer of the real ones (which have a
+baseline of their own). NB: timings are only comparable on the same machine, so baselines are not meant to be shared.
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from bs4 import BeautifulSoup
+from data_tables import person_legislature_table as pl_table
+from scrape import link_manifest
+from benchmarks.synthetic_profiles import make_synthetic_corpus, write_synthetic_archive
+
+baseline_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "parser_baseline.json")
+chrome_baseline_path = os.path.join(os.path.dirname(baseline_path), "parser_baseline_chrome.json")
+link_listing_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scrape",
+                                 "links_parl_htmls_feb_2021.txt")
+
+# the extractors that extract_parliamentarian_info calls, and how to call them on a parsed page
+extractors = {"get_names": lambda soup: pl_table.get_names(soup),
+              "get_legislature": lambda soup: pl_table.get_legislature(soup),
+              "get_chamber": lambda soup: pl_table.get_chamber(soup),
+              "get_constituency": lambda soup: pl_table.get_constituency(soup),
+              "get_mandate": lambda soup: pl_table.get_mandate(soup),
+              "get_deceased_in_office": lambda soup: pl_table.get_deceased_in_office(soup),
+              "get_party_and_first_switch": lambda soup: pl_table.get_party_and_first_switch(soup),
+              "get_rank_in_first_ppg": lambda soup: pl_table.get_rank_in_first_ppg(soup,
+                                                                                  *pl_table.get_mandate(soup),
+                                                                                  *pl_table.get_names(soup))}
+
+# results where bigger is worse; the pages per second are the ones where smaller is worse
+lower_is_better = ["extractor_us_per_page", "table_build_seconds", "table_build_peak_mb"]
+
+
+def best_time(func, repeats):
+    """Run a function repeats times and return the fastest wall time, in seconds."""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run_parser_benchmark(n_pages=1000, seed=0, repeats=3, chrome=False):
+    """
+    Run the whole parser benchmark on a synthetic corpus.
+
+    :param n_pages: int, how many synthetic pages to parse
+    :param seed: int, seed of the synthetic corpus
+    :param repeats: int, timings are the best of this many runs
+    :param chrome: bool, whether the pages have the menus, scripts and footer of the real ones, see synthetic_profiles
+    :return: dict of results, see the module docstring
+    """
+    corpus = make_synthetic_corpus(n_pages, seed, chrome)
+    htmls = [html for file_name, html, expected in corpus]
+
+    # end-to-end: parse the page and run all the extractors
+    extract_time = best_time(lambda: [pl_table.extract_parliamentarian_info(html) for html in htmls], repeats)
+    strained_time = best_time(lambda: [pl_table.extract_parliamentarian_info(html, strained=True) for html in htmls],
+                              repeats)
+    fast_time = best_time(lambda: [pl_table.extract_parliamentarian_info(html, fast=True) for html in htmls], repeats)
+    parse_time = best_time(lambda: [BeautifulSoup(html, 'html.parser') for html in htmls], repeats)
+
+    # each extractor on its own, on pages that are already parsed
+    soups = [BeautifulSoup(html, 'html.parser') for html in htmls]
+    extractor_times = {}
+    for name, extractor in extractors.items():
+        extractor_time = best_time(lambda: [extractor(soup) for soup in soups], repeats)
+        extractor_times[name] = round(extractor_time / n_pages * 1e6, 2)
+
+    errors = sum(1 for html, (file_name, _, expected) in zip(htmls, corpus)
+                 if pl_table.extract_parliamentarian_info(html) != expected
+                 or pl_table.extract_parliamentarian_info(html, strained=True) != expected
+                 or pl_table.extract_parliamentarian_info(html, fast=True) != expected)
+
+    # the routing by layout, on a corpus that has all the layouts we know of; not timed
+    routing_errors = 0
+    for file_name, html, expected in make_synthetic_corpus(n_pages, seed, chrome, variety=True):
+        routed = pl_table.extract_parliamentarian_info(html, template=pl_table.page_fingerprint(html)[0])
+        routing_errors += routed != pl_table.extract_parliamentarian_info(html) or routed != expected
+
+    # the whole legislature-table build off a zip archive; timed, then run again under tracemalloc for the peak memory
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        zip_path = os.path.join(tmpdirname, "profiles.zip")
+        write_synthetic_archive(zip_path, n_pages, seed, chrome)
+        out_dir = tmpdirname + os.sep
+        build_time = best_time(lambda: pl_table.make_parliamentarians_legislature_table(zip_path, out_dir), 1)
+        tracemalloc.start()
+        pl_table.make_parliamentarians_legislature_table(zip_path, out_dir)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    # the link listing, streamed and as a tree
+    with open(link_listing_path, "r") as in_f:
+        listing = in_f.read()
+    n_links = sum(1 for _ in link_manifest.listing_links([listing]))
+    listing_time = best_time(lambda: list(link_manifest.listing_links([listing])), repeats)
+    listing_soup_time = best_time(lambda: [a.get("href") for a in BeautifulSoup(listing, 'html.parser').find_all('a')],
+                                  repeats)
+
+    return {"n_pages": n_pages, "seed": seed, "chrome": chrome,
+            "pages_per_second": round(n_pages / extract_time, 1),
+            "strained_pages_per_second": round(n_pages / strained_time, 1),
+            "fast_pages_per_second": round(n_pages / fast_time, 1),
+            "parse_only_pages_per_second": round(n_pages / parse_time, 1),
+            "extractor_us_per_page": extractor_times,
+            "table_build_seconds": round(build_time, 3),
+            "table_build_peak_mb": round(peak_memory / 2 ** 20, 2),
+            "parse_errors": errors,
+            "routing_errors": routing_errors,
+            "link_listing_links_per_second": round(n_links / listing_time, 1),
+            "link_listing_soup_links_per_second": round(n_links / listing_soup_time, 1)}
+
+
+def compare_to_baseline(results, baseline, tolerance=0.15):
+    """
+    Flag the results that got worse than the baseline by more than the tolerance, e.g. 0.15 means 15% slower.
+
+    NB: parse and routing errors are flagged whenever there are more than in the baseline, however few.
+
+    :param results: dict, as made by run_parser_benchmark
+    :param baseline: dict, results of an earlier run, on the same corpus
+    :param tolerance: float, the relative slack before something counts as a regression
+    :return: list of str, one line per regression; empty if there are none
+    """
+    if (results["n_pages"], results["seed"], results["chrome"]) != \
+            (baseline["n_pages"], baseline["seed"], baseline.get("chrome", False)):
+        raise ValueError("BASELINE WAS MADE ON A DIFFERENT CORPUS")
+
+    regressions = []
+    for key in ["pages_per_second", "strained_pages_per_second", "fast_pages_per_second",
+                "parse_only_pages_per_second", "link_listing_links_per_second"]:
+        if key in baseline and results[key] < baseline[key] * (1 - tolerance):
+            regressions.append(key + ": " + str(results[key]) + " vs baseline " + str(baseline[key]))
+    for key in lower_is_better:
+        current, base = results[key], baseline[key]
+        # the per-extractor times are a dict, the others are single numbers
+        pairs = [(key + "." + k, current[k], base[k]) for k in current if k in base] if isinstance(current, dict) \
+            else [(key, current, base)]
+        for name, current_val, base_val in pairs:
+            if current_val > base_val * (1 + tolerance):
+                regressions.append(name + ": " + str(current_val) + " vs baseline " + str(base_val))
+    if results["parse_errors"] > baseline["parse_errors"]:
+        regressions.append("parse_errors: " + str(results["parse_errors"]) + " vs baseline " +
+                           str(baseline["parse_errors"]))
+    if results["routing_errors"] > baseline.get("routing_errors", 0):
+        regressions.append("routing_errors: " + str(results["routing_errors"]) + " vs baseline " +
+                           str(baseline.get("routing_errors", 0)))
+    return regressions
+
+
+def load_baseline(path=baseline_path):
+    """Return the stored baseline, or None if there is none yet."""
+    if not os.path.isfile(path):
+        return None
+    with open(path, "r") as in_f:
+        return json.load(in_f)
+
+
+def save_baseline(results, path=baseline_path):
+    """Store benchmark results as the baseline that later runs are compared to."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as out_f:
+        json.dump(results, out_f, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    with_chrome = "--chrome" in sys.argv
+    bench_baseline_path = chrome_baseline_path if with_chrome else baseline_path
+    bench_results = run_parser_benchmark(chrome=with_chrome)
+    print(json.dumps(bench_results, indent=2))
+
+    if "--save-baseline" in sys.argv:
+        save_baseline(bench_results, bench_baseline_path)
+        print("SAVED BASELINE TO " + bench_baseline_path)
+    else:
+        stored_baseline = load_baseline(bench_baseline_path)
+        if stored_baseline is None:
+            print("NO BASELINE YET; RUN WITH --save-baseline TO STORE ONE")
+        else:
+            found_regressions = compare_to_baseline(bench_results, stored_baseline)
+            for regression in found_regressions:
+                print("REGRESSION " + regression)
+            if found_regressions:
+                sys.exit(1)
@@ -0,0 +1,222 @@
+"""
+Benchmark the stages downstream of the parser on synthetic person-legislature tables (see synthetic_tables) of 1, 10
+and 100 times the size of the real data, to see which stages scale worse than linearly before we add more countries
+or decades.
+
+For each stage and scale it reports the wall time, the rows per second, and the peak resident memory. Each stage runs
+in a fresh process: that way the peak memory is that of the stage alone (plus the interpreter and its input), and a
+stage that blows up at a large scale can be stopped without taking the whole benchmark down with it.
+
+Between scales, each stage gets scaling exponents for its time and its peak memory: 1 means they grow linearly with
+the data, 2 quadratically. If the time exponent so far says that the next scale would take longer than the time
+budget, I skip it rather than wait.
+
+NB: rank changes are no longer computed in a separate pass over the table (get_rank_change is called as person-years
+    are made); the "rank_change" stage times that same computation as a pass over the person-year table.
+
+Run it as "python -m benchmarks.pipeline_benchmark" from the repo root, optionally followed by the scales, e.g.
+"python -m benchmarks.pipeline_benchmark 1 10".
+"""
+
+import csv
+import json
+import math
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+import helpers
+from data_tables import person_year_table
+from data_tables.dicts import party_colleagues
+from benchmarks.synthetic_tables import write_synthetic_person_legislature_table, real_table_people
+
+# the stages, in the order in which they run, and the file (made by the synthetic generator or by an earlier stage)
+# that each stage reads
+stage_inputs = {"deduplicate_list_of_lists": "person_legislature.csv",
+                "make_person_year_table": "person_legislature.csv",
+                "rank_change": "person_year.csv",
+                "first_switch_risk_set": "person_year.csv",
+                "colleagues_person_bins": "risk_set.csv"}
+
+# the exponent above which I flag a stage as scaling super-linearly; a bit of slack for noise and fixed costs
+superlinear_exponent = 1.2
+
+
+def load_table(path):
+    """Read a csv table, return the header and the rows."""
+    with open(path, "r") as in_f:
+        table = list(csv.reader(in_f))
+    return table[0], table[1:]
+
+
+def rank_changes(pers_yr_table, header):
+    """Compute the rank change of every person-year, mandate by mandate, as the old table-wide rank_change did."""
+    pid_col_idx, leg_col_idx = header.index("person_id"), header.index("legis")
+    rank_col_idx = header.index("pre_switch_rank")
+    changes, previous_key, previous_rank = [], None, None
+    for pers_yr in pers_yr_table:
+        key = (pers_yr[pid_col_idx], pers_yr[leg_col_idx])
+        if key != previous_key:
+            previous_key, previous_rank = key, None
+        changes.append(person_year_table.get_rank_change(pers_yr[rank_col_idx], previous_rank))
+        previous_rank = pers_yr[rank_col_idx]
+    return changes
+
+
+def run_stage(stage, work_dir):
+    """
+    Run one stage on the inputs in the work directory, and time it. Input loading is not timed, except for
+    make_person_year_table, which reads and writes its own files.
+
+    :param stage: str, one of the keys of stage_inputs
+    :param work_dir: str, directory with the inputs, where outputs also go
+    :return: 2-tuple of (seconds, number of input rows)
+    """
+    in_path = os.path.join(work_dir, stage_inputs[stage])
+
+    if stage == "make_person_year_table":
+        with open(in_path, "r") as in_f:
+            n_rows = sum(1 for _ in in_f) - 1
+        start = time.perf_counter()
+        person_year_table.make_person_year_table(in_path, os.path.join(work_dir, "person_year.csv"),
+                                                 os.path.join(work_dir, "risk_set.csv"))
+        return time.perf_counter() - start, n_rows
+
+    header, table = load_table(in_path)
+    start = time.perf_counter()
+    if stage == "deduplicate_list_of_lists":
+        # NB: the parser build deduplicates rows before the person IDs are assigned, so drop those and throw in some
+        #     duplicates for the function to find
+        table = [row[2:] for row in table] + [row[2:] for row in table[::20]]
+        start = time.perf_counter()
+        helpers.deduplicate_list_of_lists(table)
+    elif stage == "rank_change":
+        rank_changes(table, header)
+    elif stage == "first_switch_risk_set":
+        person_year_table.first_switch_risk_set(table, os.path.join(work_dir, "risk_set_only.csv"), header)
+    elif stage == "colleagues_person_bins":
+        party_colleagues.colleagues_person_bins(table, header)
+    return time.perf_counter() - start, len(table)
+
+
+def stage_worker(stage, work_dir, memory_budget, conn):
+    """Run a stage in a child process and send back (seconds, rows, peak rss in MB), or the error."""
+    if memory_budget:
+        # NB: this caps the address space, not the resident memory, so it should leave some room; but a MemoryError
+        #     we can report beats having the whole machine grind to a halt
+        limit = int(memory_budget * 2 ** 20)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    try:
+        seconds, n_rows = run_stage(stage, work_dir)
+        # NB: on linux ru_maxrss is in kilobytes
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        conn.send({"seconds": round(seconds, 4), "rows": n_rows, "rows_per_second": round(n_rows / seconds, 1),
+                   "peak_rss_mb": round(peak_rss, 1)})
+    except Exception as e:
+        conn.send({"error": type(e).__name__ + ": " + str(e)})
+    finally:
+        conn.close()
+
+
+def run_stage_in_child(stage, work_dir, time_budget, memory_budget):
+    """
+    Run a stage in a fresh (spawned, not forked, so it doesn't inherit our memory) process, and kill it if it takes
+    longer than the time budget, in seconds; the memory budget, in MB, is passed on to stage_worker.
+
+    :return: dict of results, as sent by stage_worker
+    """
+    context = multiprocessing.get_context("spawn")
+    parent_conn, child_conn = context.Pipe(duplex=False)
+    process = context.Process(target=stage_worker, args=(stage, work_dir, memory_budget, child_conn))
+    process.start()
+    child_conn.close()
+    if not parent_conn.poll(time_budget):
+        process.terminate()
+        process.join()
+        return {"error": "over the time budget of " + str(time_budget) + " seconds"}
+    try:
+        result = parent_conn.recv()
+    except EOFError:  # the child died without a word, e.g. killed for running out of memory
+        result = {"error": "stage process died"}
+    process.join()
+    return result
+
+
+def scaling_exponent(small, big, scale_ratio, key="seconds"):
+    """How time (or, with key="peak_rss_mb", memory) grows with size between two runs: 1 is linear, 2 quadratic."""
+    return round(math.log(big[key] / small[key]) / math.log(scale_ratio), 2)
+
+
+def run_pipeline_benchmark(scales=(1, 10, 100), base_people=real_table_people, seed=0, time_budget=600,
+                           memory_budget=None):
+    """
+    Run every stage at every scale, from the smallest scale up.
+
+    :param scales: iterable of int, multiples of the base size
+    :param base_people: int, the number of people at scale 1
+    :param seed: int, seed of the synthetic tables
+    :param time_budget: int, seconds that any one stage may take at any one scale
+    :param memory_budget: int, MB of address space that any one stage may take; None for no limit
+    :return: dict of form {stage: {"runs": {scale: results},
+                                   "exponents": {"1-10": {"seconds": exponent, "peak_rss_mb": exponent}, ...}}}
+    """
+    scales = sorted(scales)
+    results = {stage: {"runs": {}, "exponents": {}} for stage in stage_inputs}
+
+    for scale in scales:
+        with tempfile.TemporaryDirectory() as work_dir:
+            n_rows = write_synthetic_person_legislature_table(os.path.join(work_dir, "person_legislature.csv"),
+                                                              base_people * scale, seed)
+            print("SCALE " + str(scale) + ": " + str(n_rows) + " PERSON-LEGISLATURES")
+
+            for stage in stage_inputs:
+                runs = results[stage]["runs"]
+                done_scales = [s for s in scales if s < scale and "seconds" in runs.get(s, {})]
+
+                # skip if we know this would run over the budget: the stage failed at a smaller scale, or its growth
+                # so far says so
+                if any("error" in runs[s] or "skipped" in runs[s] for s in runs):
+                    runs[scale] = {"skipped": "failed or skipped at a smaller scale"}
+                elif len(done_scales) >= 2:
+                    last, before_last = done_scales[-1], done_scales[-2]
+                    exponent = scaling_exponent(runs[before_last], runs[last], last / before_last)
+                    predicted = runs[last]["seconds"] * (scale / last) ** max(exponent, 1)
+                    if predicted > time_budget:
+                        runs[scale] = {"skipped": "predicted to take " + str(round(predicted)) + " seconds"}
+                if scale not in runs:
+                    if not os.path.isfile(os.path.join(work_dir, stage_inputs[stage])):
+                        runs[scale] = {"skipped": "no input, an earlier stage failed"}
+                    else:
+                        runs[scale] = run_stage_in_child(stage, work_dir, time_budget, memory_budget)
+                print("    " + stage + ": " + json.dumps(runs[scale]))
+
+    for stage in results:
+        runs = results[stage]["runs"]
+        timed = [s for s in scales if "seconds" in runs[s]]
+        for small, big in zip(timed, timed[1:]):
+            results[stage]["exponents"][str(small) + "-" + str(big)] = \
+                {key: scaling_exponent(runs[small], runs[big], big / small, key) for key in ["seconds", "peak_rss_mb"]}
+    return results
+
+
+def superlinear_stages(results):
+    """
+    Return the stages whose time or memory grows faster than linearly between any two scales, with their exponents.
+
+    NB: the peak memory includes the interpreter and the modules, so its exponent understates the growth of the
+        stage's own memory; a memory exponent above the threshold is all the more telling.
+    """
+    return {stage: res["exponents"] for stage, res in results.items()
+            if any(exponent > superlinear_exponent for pair in res["exponents"].values() for exponent in pair.values())}
+
+
+if __name__ == "__main__":
+    bench_scales = [int(arg) for arg in sys.argv[1:]] or [1, 10, 100]
+    # NB: cap each stage at three quarters of the machine's memory, so a stage that blows up fails with a MemoryError
+    physical_memory_mb = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 2 ** 20
+    bench_results = run_pipeline_benchmark(bench_scales, memory_budget=int(physical_memory_mb * 0.75))
+    print(json.dumps(bench_results, indent=2))
+    for slow_stage, stage_exponents in superlinear_stages(bench_results).items():
+        print("SUPER-LINEAR " + slow_stage + ": " + json.dumps(stage_exponents))
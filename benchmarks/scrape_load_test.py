@@ -0,0 +1,134 @@
+"""
+Load-test the scraper against the local stand-in for cdep.ro (see standin_server), serving a synthetic archive (see
+synthetic_profiles), under a few scenarios of latency and faults.
+
+For each scenario it reports
+    - the wall time of the scrape and the pages per second
+    - how many pages made it into the archive, and how many of those are intact, i.e. the same as the ones served
+    - how it recovered: how many requests failed (as counted by the server), how many urls went on the recalcitrant
+      list, and how much of the wall time went on waiting after failures
+    - what the server made of it all: requests, pages served, and faults injected
+    - what the scraper's own metrics (see scrape/crawl_metrics.py) made of it: the percentiles of the latency, the bytes
+      fetched and the retries
+    - with "--adaptive", i.e. with the scraper under AIMD rate control (see scrape/rate_control.py): the rate and
+      concurrency it ended on, the highest rate it got to, and how many times it backed off
+
+Run it as "python -m benchmarks.scrape_load_test" from the repo root, optionally followed by the names of the
+scenarios, e.g. "python -m benchmarks.scrape_load_test clean resets", and by "--adaptive".
+"""
+
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from zipfile import ZipFile
+from benchmarks.standin_server import start_standin_server, url_prefix
+from benchmarks.synthetic_profiles import write_synthetic_archive
+from scrape.scrape import scrape_parliamentarians
+from scrape.rate_control import new_rate_controller
+
+# the scenarios, as keyword arguments to standin_server.make_standin_server
+scenarios = {"clean": {},
+             "slow": {"latency": ("lognormal", 0.02, 0.75)},
+             "resets": {"reset_rate": 0.05},
+             "chunked errors": {"chunked_error_rate": 0.05},
+             "rate limited": {"rate_limit": 50},
+             "everything": {"latency": ("exponential", 0.01), "reset_rate": 0.02, "chunked_error_rate": 0.02,
+                            "rate_limit": 50}}
+
+
+def run_scenario(scenario, archive_path, work_dir, pause=0.0, failure_pause=0.1, seed=0, adaptive=False):
+    """
+    Scrape all the pages of an archive off a stand-in server set up as the scenario says.
+
+    :param scenario: str, one of the keys of scenarios
+    :param archive_path: str, the archive that the server serves
+    :param work_dir: str, directory for the links file, the scraped archive and the recalcitrant list
+    :param pause: float, seconds the scraper waits before each request
+    :param failure_pause: float, seconds the scraper waits after a failed request
+    :param seed: int, seed of the faults of the server
+    :param adaptive: bool, whether the scraper runs under a rate controller rather than with fixed pauses
+    :return: dict of results, see the module docstring
+    """
+    with ZipFile(archive_path, "r") as zip_archive:
+        served_pages = {name: zip_archive.read(name).decode("utf-8") for name in zip_archive.namelist()}
+    links_path = os.path.join(work_dir, "links.txt")
+    with open(links_path, "w") as out_f:
+        out_f.write("".join('<a href="' + url_prefix + name[:-len("_.html")] + '">' + name + "</a>\n"
+                            for name in served_pages))
+    recalcitrant_path = os.path.join(work_dir, "recalcitrant.txt")
+    out_dir = os.path.join(work_dir, "scraped")
+    os.makedirs(out_dir, exist_ok=True)
+
+    controller = new_rate_controller() if adaptive else None
+    server, url_base = start_standin_server(archive_path, seed=seed, **scenarios[scenario])
+    start = time.perf_counter()
+    try:
+        # NB: the scraper prints every url, which we don't need to see
+        with contextlib.redirect_stdout(io.StringIO()):
+            summary = scrape_parliamentarians(out_dir, url_base=url_base, pause=pause, failure_pause=failure_pause,
+                                              links_path=links_path, recalcitrant_path=recalcitrant_path,
+                                              rate_controller=controller,
+                                              metrics_path=os.path.join(work_dir, "scrape_metrics.prom"),
+                                              summary_path=os.path.join(work_dir, "scrape_summary.json"))
+        seconds = time.perf_counter() - start
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    with ZipFile(os.path.join(out_dir, "parliamentarian_legislature_profile_site_htmls.zip"), "r") as zip_archive:
+        scraped_pages = {name: zip_archive.read(name).decode("utf-8") for name in zip_archive.namelist()}
+    recalcitrant = 0
+    if os.path.isfile(recalcitrant_path):
+        with open(recalcitrant_path, "r") as in_f:
+            recalcitrant = sum(1 for line in in_f if line.strip())
+
+    failed_requests = server.stats["requests"] - server.stats.get("served", 0)
+    results = {"pages": len(served_pages), "seconds": round(seconds, 3),
+               "pages_per_second": round(len(scraped_pages) / seconds, 1),
+               "archived": len(scraped_pages),
+               "intact": sum(1 for name, html in scraped_pages.items() if served_pages.get(name) == html),
+               "failed_requests": failed_requests, "recalcitrant": recalcitrant,
+               "seconds_waiting_after_failures": round(failed_requests * failure_pause, 3) if not adaptive else 0.0,
+               "server": server.stats, "latency_seconds": summary["latency_seconds"], "bytes": summary["bytes"],
+               "retries": summary["retries"]}
+    if adaptive:
+        results.update({"final_rate": round(controller["rate"], 2), "final_concurrency": controller["concurrency"],
+                        "peak_rate": max((rate for _, rate, _ in controller["history"]), default=controller["rate"]),
+                        "back_offs": controller["decreases"]})
+    return results
+
+
+def run_load_test(scenario_names=None, n_pages=300, seed=0, pause=0.0, failure_pause=0.1, adaptive=False):
+    """
+    Run the scraper under each of the scenarios, on the same synthetic archive.
+
+    :param scenario_names: list of str, keys of scenarios; None for all of them
+    :param n_pages: int, how many synthetic pages the server serves
+    :param seed: int, seed of the synthetic pages and of the faults
+    :param pause: float, seconds the scraper waits before each request
+    :param failure_pause: float, seconds the scraper waits after a failed request
+    :param adaptive: bool, whether the scraper runs under a rate controller rather than with fixed pauses
+    :return: dict of form {scenario: results}
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        archive_path = os.path.join(tmpdirname, "served.zip")
+        write_synthetic_archive(archive_path, n_pages, seed)
+        for scenario in scenario_names or scenarios:
+            work_dir = os.path.join(tmpdirname, scenario.replace(" ", "_"))
+            os.makedirs(work_dir)
+            results[scenario] = run_scenario(scenario, archive_path, work_dir, pause, failure_pause, seed, adaptive)
+            print(scenario + ": " + json.dumps(results[scenario]))
+    return results
+
+
+if __name__ == "__main__":
+    names = [arg for arg in sys.argv[1:] if arg != "--adaptive"]
+    unknown = [name for name in names if name not in scenarios]
+    if unknown:
+        raise ValueError("UNKNOWN SCENARIOS " + str(unknown) + ", PICK FROM " + str(list(scenarios)))
+    run_load_test(names or None, adaptive="--adaptive" in sys.argv)
@@ -0,0 +1,162 @@
+"""
+A local stand-in for cdep.ro, to tune the scraper against without hammering the real site. It serves the profile pages
+of an archive (as made by scrape.scrape_parliamentarians, or by synthetic_profiles.write_synthetic_archive) at the urls
+that the scraper asks for, i.e. "/pls/parlam/" + the name of the file in the archive, minus its "_.html".
+
+Like the real site on a bad day, it can be made to
+    - answer late, with the latency drawn from a distribution, see latency_distributions
+    - reset the connection before answering, which the scraper sees as a ConnectionError
+    - break off a chunked answer halfway, which the scraper sees as a ChunkedEncodingError
+    - answer "429 Too Many Requests" to whatever comes in above a rate limit
+The faults are drawn from a seeded random generator, and counted in the stats of the server.
+
+Run it as "python -m benchmarks.standin_server ARCHIVE [PORT]" from the repo root; see scrape_load_test for running the
+scraper against it.
+"""
+
+import http.server
+import math
+import random
+import socket
+import struct
+import sys
+import threading
+import time
+from zipfile import ZipFile
+
+url_prefix = "/pls/parlam/"
+
+# the latencies the server can draw from, by name, and how, given the random generator and the parameters
+latency_distributions = {"constant": lambda rng, seconds: seconds,
+                         "uniform": lambda rng, low, high: rng.uniform(low, high),
+                         "exponential": lambda rng, mean: rng.expovariate(1 / mean),
+                         "lognormal": lambda rng, median, sigma: rng.lognormvariate(math.log(median), sigma)}
+
+
+class StandinHandler(http.server.BaseHTTPRequestHandler):
+    """Answer a request for a profile page, with whatever fault the server draws for it."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        page = server.pages.get(self.path[len(url_prefix):] + "_.html") if self.path.startswith(url_prefix) else None
+        with server.lock:
+            latency = latency_distributions[server.latency[0]](server.rng, *server.latency[1:])
+            draw = server.rng.random()
+            rate_limited = not take_token(server)
+        time.sleep(latency)
+
+        if rate_limited:
+            count(server, "rate limited")
+            self.send_answer(429, b"Too Many Requests", {"Retry-After": "1"})
+        elif draw < server.reset_rate:
+            count(server, "resets")
+            # NB: lingering for zero seconds makes the close send a RST rather than a FIN
+            self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+            self.connection.close()
+            self.close_connection = True
+        elif page is None:
+            count(server, "not found")
+            self.send_answer(404, b"Not Found")
+        elif draw < server.reset_rate + server.chunked_error_rate:
+            count(server, "chunked errors")
+            # send half the page as one chunk, then hang up without the last (empty) chunk
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            half = page[:len(page) // 2]
+            self.wfile.write(format(len(half), "x").encode() + b"\r\n" + half + b"\r\n")
+            self.wfile.flush()
+            self.connection.shutdown(socket.SHUT_RDWR)
+            self.close_connection = True
+        else:
+            count(server, "served")
+            self.send_answer(200, page)
+
+    def send_answer(self, status, body, headers=None):
+        """Send a whole answer, with its length, so that the connection can be kept alive."""
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Keep quiet: the scraper prints every url it asks for already."""
+        pass
+
+
+def take_token(server):
+    """
+    Take a token from the rate limit bucket of the server, which fills up at rate_limit tokens a second, and holds at
+    most a second's worth; call with the lock of the server held.
+
+    :return: bool, False if the bucket is empty, i.e. the request is over the rate limit
+    """
+    if server.rate_limit is None:
+        return True
+    now = time.monotonic()
+    server.tokens = min(server.rate_limit, server.tokens + (now - server.last_fill) * server.rate_limit)
+    server.last_fill = now
+    if server.tokens < 1:
+        return False
+    server.tokens -= 1
+    return True
+
+
+def count(server, outcome):
+    """Count the outcome of a request in the stats of the server."""
+    with server.lock:
+        server.stats[outcome] = server.stats.get(outcome, 0) + 1
+        server.stats["requests"] += 1
+
+
+def make_standin_server(archive_path, port=0, latency=("constant", 0), reset_rate=0.0, chunked_error_rate=0.0,
+                        rate_limit=None, seed=0):
+    """
+    Make a stand-in server for the pages in an archive; it only answers once it's served, e.g. by start_standin_server.
+
+    :param archive_path: str, the zip archive of profile pages
+    :param port: int, port on localhost to listen on; 0 for any free one (see server.server_address)
+    :param latency: tuple, the name of a distribution in latency_distributions followed by its parameters, e.g.
+                    ("lognormal", 0.2, 0.5) for a median of 200ms
+    :param reset_rate: float, share of the requests whose connection is reset
+    :param chunked_error_rate: float, share of the requests whose answer is broken off halfway
+    :param rate_limit: float, requests per second above which the server answers 429; None for no limit
+    :param seed: int, seed of the random generator of the latencies and faults
+    :return: http.server.ThreadingHTTPServer
+    """
+    if latency[0] not in latency_distributions:
+        raise ValueError("UNKNOWN LATENCY DISTRIBUTION " + str(latency[0]))
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", port), StandinHandler)
+    server.daemon_threads = True
+    with ZipFile(archive_path, "r") as zip_archive:
+        server.pages = {name: zip_archive.read(name) for name in zip_archive.namelist()}
+    server.latency, server.reset_rate, server.chunked_error_rate = latency, reset_rate, chunked_error_rate
+    server.rate_limit, server.tokens, server.last_fill = rate_limit, rate_limit or 0, time.monotonic()
+    server.rng, server.lock = random.Random(seed), threading.Lock()
+    server.stats = {"requests": 0}
+    return server
+
+
+def start_standin_server(archive_path, **kwargs):
+    """
+    Make a stand-in server (see make_standin_server, which takes the same keyword arguments) and serve it in a
+    background thread.
+
+    :param archive_path: str, the zip archive of profile pages
+    :return: 2-tuple of (server, its url base, e.g. "http://127.0.0.1:8765"); stop it with server.shutdown()
+    """
+    server = make_standin_server(archive_path, **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://127.0.0.1:" + str(server.server_address[1])
+
+
+if __name__ == "__main__":
+    standin = make_standin_server(sys.argv[1], port=int(sys.argv[2]) if len(sys.argv) > 2 else 8765)
+    print("SERVING " + str(len(standin.pages)) + " PAGES AT http://127.0.0.1:" + str(standin.server_address[1]))
+    standin.serve_forever()
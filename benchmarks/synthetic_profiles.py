@@ -0,0 +1,306 @@
+"""
+Make synthetic parliamentarian-legislature profile pages that look, as far as the getters in person_legislature_table
+are concerned, like the ones scraped from cdep.ro: the "cale-right" breadcrumb with the legislature, the "boxTitle"
+name, the "boxDep clearfix" boxes with the chamber, constituency and mandate, and the party and parliamentary group
+tables. Everything is drawn from a seeded random generator, so the same seed always gives the same corpus.
+
+Along with each page comes what extract_parliamentarian_info should get out of it, so that a benchmark can also check
+that a faster parser still gets things right.
+
+By default the pages are all of one layout, from 1996 onward, with the mandate, party and parliamentary group boxes.
+With variety=True the corpus also has pages from 1990-1992 and 1992-1996, some of which have no parliamentary group
+box, and pages with a box of permanent committees, which the getters skip over; this is the corpus on which to check
+that the routing of pages by layout (see page_fingerprint) gets the same out of them as the generic extractors.
+"""
+
+import random
+from io import BytesIO
+from zipfile import ZipFile, ZIP_DEFLATED
+from data_tables.person_legislature_table import party_codes
+
+# NB: constituency codes 1 to 24 (ALBA to IAŞI) mean the same county in every legislature, since the renumbering from
+#     the creation of Ilfov only starts after IAŞI; so I only draw from these, and don't need the per-era maps
+counties = ["ALBA", "ARAD", "ARGEŞ", "BACĂU", "BIHOR", "BISTRIŢA-NĂSĂUD", "BOTOŞANI", "BRAŞOV", "BRĂILA", "BUZĂU",
+            "CARAŞ-SEVERIN", "CĂLĂRAŞI", "CLUJ", "CONSTANŢA", "COVASNA", "DÂMBOVIŢA", "DOLJ", "GALAŢI", "GIURGIU",
+            "GORJ", "HARGHITA", "HUNEDOARA", "IALOMIŢA", "IAŞI"]
+
+# only legislatures with the regular December-to-November mandate defaults, see get_mandate
+legislatures = ["1996-2000", "2000-2004", "2004-2008", "2008-2012", "2012-2016", "2016-2020"]
+# and the first two, with their own defaults: the month in which mandates started, and the date on which they ended
+early_mandate_defaults = {"1990-1992": (6, "1992-08-01"), "1992-1996": (10, "1996-01-01")}
+
+committees = ["Comisia pentru buget, finanţe şi bănci", "Comisia juridică, de disciplină şi imunităţi",
+              "Comisia pentru învăţământ, ştiinţă, tineret şi sport", "Comisia pentru sănătate şi familie"]
+
+# parties whose codes the getters pick out of the text without any of the ad-hoc corrections
+parties = ["PSD", "PNL", "PDL", "UDMR", "PC", "PRM", "USR", "PMP", "ALDE", "UNPR"]
+
+ro_month_names = ["ianuarie", "februarie", "martie", "aprilie", "mai", "iunie", "iulie", "august", "septembrie",
+                  "octombrie", "noiembrie", "decembrie"]
+short_month_names = ["ian.", "feb.", "mar.", "apr.", "mai", "iun.", "iul.", "aug.", "sep.", "oct.", "noi.", "dec."]
+
+surname_stems = ["POPESCU", "IONESCU", "POPA", "RADU", "DUMITRU", "STAN", "STOICA", "GHEORGHE", "MATEI", "CIOBANU",
+                 "ŢURCANU", "ROŞU", "MUREŞAN", "NEAGU", "BĂLAN", "CONSTANTIN", "DRĂGHICI", "ŞERBAN", "LUPU", "VLAD"]
+given_name_pool = ["Ion", "Maria", "Gheorghe", "Elena", "Vasile", "Ana", "Mihai", "Ioana", "Dan", "Cristina",
+                   "Adrian", "Mihaela", "Ştefan", "Gabriela", "Florin", "Doina", "Sorin", "Alina", "Cătălin", "Lucian"]
+
+ranks = ["Secretar", "Vicelider", "Lider"]
+
+# what the real pages have around the profile: a menu, a sidebar, scripts and a footer, some 30kB in all; none of it
+# matters to the getters, but all of it has to be parsed into the tree, unless one only parses the profile regions
+menu_sections = ["Camera Deputaţilor", "Structura Camerei", "Legislaţie", "Comisii", "Informaţii publice", "Media",
+                 "Relaţii externe", "Documente", "Vizite", "Arhiva"]
+page_chrome_header = '<script type="text/javascript">' + "var menu = {};\n" * 300 + "</script>" + \
+    '<div id="menu"><ul class="menu">' + "".join(
+        '<li><a href="/pls/' + str(s_idx) + '.htm">' + section + "</a><ul>" +
+        "".join('<li><a href="/pls/' + str(s_idx) + "/" + str(l_idx) + '.htm">' + section + " " + str(l_idx) +
+                "</a></li>" for l_idx in range(40)) + "</ul></li>"
+        for s_idx, section in enumerate(menu_sections)) + "</ul></div>" + \
+    '<div class="sidebar"><table>' + "".join('<tr><td><a href="/pls/lista.htm?leg=' + str(yr) + '">Legislatura ' +
+                                             str(yr) + "</a></td></tr>" for yr in range(1990, 2021)) + "</table></div>"
+page_chrome_footer = '<div class="footer">' + "".join("<p>Camera Deputaţilor, Palatul Parlamentului, str. Izvor nr." +
+                                                      str(idx) + ", Bucureşti</p>" for idx in range(30)) + \
+    '<script type="text/javascript">' + "track(document);\n" * 200 + "</script></div>"
+
+
+def letter_code(number):
+    """Spell a number in capital letters, A, B, ..., Z, BA, BB, ..., so that it can go in an all-caps surname."""
+    code = ""
+    while True:
+        number, remainder = divmod(number, 26)
+        code = chr(ord("A") + remainder) + code
+        if not number:
+            return code
+
+
+def random_profile(rng, pers_idx, variety=False):
+    """
+    Draw one person-legislature at random.
+
+    :param rng: random.Random, the seeded generator
+    :param pers_idx: int, makes the name unique, so that each page is a different person
+    :param variety: bool, whether to also draw early legislatures, pages without a parliamentary group box and pages
+                    with a committee box, see the module docstring
+    :return: dict describing the person-legislature; see profile_html for how it is laid out on the page
+    """
+    legislature = rng.choice(list(early_mandate_defaults) + legislatures if variety else legislatures)
+    leg_start, leg_end = int(legislature[:4]), int(legislature[5:])
+    start_month = early_mandate_defaults[legislature][0] if legislature in early_mandate_defaults else 12
+    minorities = rng.random() < 0.03
+
+    # mandates mostly start and end with the legislature, but some come in late or leave early
+    start = (leg_start, start_month, rng.randint(10, 28))
+    if rng.random() < 0.1:
+        start = (rng.randint(leg_start + 1, leg_end - 1), rng.randint(1, 12), rng.randint(1, 28))
+    end = None
+    if rng.random() < 0.15:
+        end = (rng.randint(start[0] + 1, leg_end), rng.randint(1, 12), rng.randint(1, 28))
+
+    # the party history: an entry party, then maybe a switch, directly or by way of being independent
+    entry_party = rng.choice(parties)
+    history = [entry_party]
+    switch_roll = rng.random()
+    if not minorities and switch_roll < 0.2:
+        history.append(rng.choice([p for p in parties if p != entry_party]))
+    elif not minorities and switch_roll < 0.25:
+        history.extend(["independent", rng.choice([p for p in parties if p != entry_party])])
+    elif not minorities and switch_roll < 0.28:
+        history.append("independent")
+    # the months at which each stint after the first began
+    first_switch = (rng.randint(leg_start + 1, leg_end - 1), rng.randint(1, 12))
+    stint_starts = [first_switch]
+    for _ in history[2:]:
+        stint_starts.append((min(stint_starts[-1][0] + rng.randint(0, 1), leg_end), rng.randint(1, 12)))
+
+    # a few legislators from 1990-1996 were never in a parliamentary group, so their pages don't have its box; and some
+    # pages list the committees the legislator sat on, in a box of their own
+    caucus = not (variety and legislature in early_mandate_defaults and rng.random() < 0.3)
+    committee_box = variety and rng.random() < 0.3
+
+    # rank in the first parliamentary group, if any, and when it was held: from, until, both, or the whole time
+    rank, rank_from, rank_until = None, None, None
+    if caucus and rng.random() < 0.2:
+        rank = rng.choice(ranks)
+        span = rng.choice(["whole", "from", "until", "both"])
+        if span in {"from", "both"}:
+            rank_from = (rng.randint(leg_start + 1, leg_end - 1), rng.randint(1, 12))
+        if span in {"until", "both"}:
+            rank_until = (rng.randint(rank_from[0] if rank_from else leg_start + 1, leg_end), rng.randint(1, 12))
+
+    surnames = surname_stems[pers_idx % len(surname_stems)] + " " + letter_code(pers_idx // len(surname_stems))
+
+    return {"legislature": legislature, "chamber": rng.choice(["DEPUTAT", "DEPUTAT", "SENATOR"]),
+            "constituency code": rng.randint(1, len(counties)), "minorities": minorities, "surnames": surnames,
+            "given names": " ".join(rng.sample(given_name_pool, rng.choice([1, 1, 2]))),
+            "start": start, "validated": start[:2] != (leg_start, start_month) or rng.random() < 0.8, "end": end,
+            "deceased": end is not None and rng.random() < 0.1,
+            "history": ["MIN"] if minorities else history, "stint starts": stint_starts,
+            "rank": rank, "rank from": rank_from, "rank until": rank_until,
+            "caucus": caucus, "committees": rng.sample(committees, rng.randint(1, 2)) if committee_box else []}
+
+
+def profile_html(profile, chrome=False):
+    """
+    Lay out a profile as a cdep.ro profile page.
+
+    :param profile: dict, as made by random_profile
+    :param chrome: bool, whether to put the menu, sidebar and footer of the real pages around the profile
+    :return: str, the html
+    """
+    leg, chamber = profile["legislature"], profile["chamber"]
+    display_name = profile["given names"] + " " + profile["surnames"]
+    chamber_name = "Camera Deputatilor" if chamber == "DEPUTAT" else "Senat"
+
+    # the mandate box: the chamber, then the constituency and the mandate dates in one paragraph
+    if profile["minorities"]:
+        mandate_lines = ["ales la nivel naţional, pe listele organizaţiilor minorităţilor naţionale"]
+    else:
+        mandate_lines = ["ales în circumscripţia electorală nr." + str(profile["constituency code"]) + " " +
+                         counties[profile["constituency code"] - 1]]
+    if profile["validated"]:
+        yr, mo, day = profile["start"]
+        mandate_lines.append("data validarii: " + str(day) + " " + ro_month_names[mo - 1] + " " + str(yr) +
+                             " - HCD nr." + str(day + mo) + "/" + str(yr))
+    if profile["end"]:
+        yr, mo, day = profile["end"]
+        reason = "decedat" if profile["deceased"] else "demisie"
+        mandate_lines.append("data încetarii mandatului: " + str(day) + " " + ro_month_names[mo - 1] + " " + str(yr) +
+                             " - " + reason)
+    mandate_box = '<div class="boxDep clearfix"><h3>' + chamber + " " + "ales în " + leg[:4] + "</h3>\n" + \
+                  '<div class="boxInfo"><p>' + "<br>".join(mandate_lines) + "</p></div></div>"
+
+    # the party box: one row per party stint
+    if profile["history"] == ["MIN"]:
+        party_box = '<div class="boxDep clearfix"><h3>Organizaţia cetăţenilor aparţinând minoritatilor nationale' + \
+                    "</h3></div>"
+    else:
+        rows = []
+        for idx, party in enumerate(profile["history"]):
+            cells = [party] if party == "independent" else [party, party_codes[party]]
+            if idx > 0:
+                yr, mo = profile["stint starts"][idx - 1]
+                cells.append("din " + short_month_names[mo - 1] + " " + str(yr))
+            if idx < len(profile["history"]) - 1:
+                yr, mo = profile["stint starts"][idx]
+                cells.append("până în " + short_month_names[mo - 1] + " " + str(yr))
+            rows.append("<tr>" + "".join("<td> " + c + " </td>" for c in cells) + "</tr>")
+        party_box = '<div class="boxDep clearfix"><h3>Formatiunea politica:</h3><table>' + "".join(rows) + \
+                    "</table></div>"
+
+    # the parliamentary group box; only the first row (i.e. group) matters to the getters
+    group_party = profile["history"][0]
+    rank_text = ""
+    if profile["rank"]:
+        rank_text = profile["rank"]
+        if profile["rank from"]:
+            rank_text += " din " + short_month_names[profile["rank from"][1] - 1] + " " + str(profile["rank from"][0])
+        if profile["rank until"]:
+            rank_text += " până în " + short_month_names[profile["rank until"][1] - 1] + " " + \
+                         str(profile["rank until"][0])
+    group_box = '<div class="boxDep clearfix"><h3>Grupul parlamentar:</h3><table><tr><td>Grupul parlamentar ' + \
+                group_party + "</td><td>" + rank_text + "</td></tr><tr><td>Grupul parlamentar al " + \
+                "independenţilor</td><td></td></tr></table></div>" if profile.get("caucus", True) else ""
+
+    # the committee box, which the getters don't read; it goes after the mandate box, like every box but the first
+    committee_box = ""
+    if profile.get("committees"):
+        committee_box = '<div class="boxDep clearfix"><h3>Comisii permanente</h3><table>' + \
+                        "".join("<tr><td>" + committee + "</td></tr>" for committee in profile["committees"]) + \
+                        "</table></div>"
+
+    return '<html><head><meta charset="utf-8"><title>' + display_name + "</title></head><body>" + \
+           (page_chrome_header if chrome else "") + \
+           '<table><tr><td class="cale-right">Prima pagina &gt; Legislatura ' + leg + " / " + chamber_name + \
+           " &gt; " + display_name + "</td></tr></table>" + \
+           '<div class="boxTitle"><h1>' + display_name + "</h1></div>" + \
+           mandate_box + party_box + committee_box + group_box + (page_chrome_footer if chrome else "") + \
+           "</body></html>"
+
+
+def expected_info(profile):
+    """
+    What extract_parliamentarian_info should get out of the page of a profile.
+
+    :param profile: dict, as made by random_profile
+    :return: dict, laid out like the output of extract_parliamentarian_info
+    """
+    leg = profile["legislature"]
+    start_month, mandate_end = early_mandate_defaults.get(leg, (12, leg[5:] + "-11-30"))
+    start = profile["start"] if profile["validated"] else (int(leg[:4]), start_month, "01")
+    mandate_start = str(start[0]) + "-" + str(start[1]).zfill(2) + "-" + str(start[2])
+    if profile["end"]:
+        mandate_end = str(profile["end"][0]) + "-" + str(profile["end"][1]).zfill(2) + "-" + str(profile["end"][2])
+
+    history = profile["history"]
+    switch_month, switch_year, dest_party = "", "", ""
+    if len(history) > 1:
+        switch_year, switch_month = str(profile["stint starts"][0][0]), str(profile["stint starts"][0][1]).zfill(2)
+        dest_party = "IND" if history[1:] == ["independent"] else [p for p in history[1:] if p != "independent"][0]
+
+    # rank dates come as MO.YR-MO.YR, where the defaults are the mandate bounds
+    m_start = mandate_start.split("-")[1] + "." + mandate_start.split("-")[0]
+    m_end = mandate_end.split("-")[1] + "." + mandate_end.split("-")[0]
+    rank, rank_dates = "membru", m_start + "-" + m_end
+    if profile["rank"]:
+        rank = profile["rank"].lower()
+        rank_from, rank_until = m_start, m_end
+        if profile["rank from"]:
+            rank_from = str(profile["rank from"][1]).zfill(2) + "." + str(profile["rank from"][0])
+        if profile["rank until"]:
+            rank_until = str(profile["rank until"][1]).zfill(2) + "." + str(profile["rank until"][0])
+        rank_dates = rank_from + "-" + rank_until
+
+    return {"legislature": leg, "chamber": profile["chamber"],
+            "constituency": "MINORITĂŢI" if profile["minorities"] else counties[profile["constituency code"] - 1],
+            "surnames": profile["surnames"], "given names": profile["given names"],
+            "mandate start": mandate_start, "mandate end": mandate_end,
+            "deceased in office": "deceased in office" if profile["deceased"] else "no death in office",
+            "entry party name": "minorities" if history == ["MIN"] else party_codes[history[0]],
+            "entry party code": history[0],
+            "entry ppg rank": rank, "entry ppg rank dates": rank_dates,
+            "destination party code": dest_party,
+            "first party switch month": switch_month, "first party switch year": switch_year}
+
+
+def make_synthetic_corpus(n_pages, seed=0, chrome=False, variety=False):
+    """
+    Make a corpus of synthetic profile pages.
+
+    :param n_pages: int, how many pages to make
+    :param seed: int, seed of the random generator; the same seed gives the same corpus
+    :param chrome: bool, whether the pages have the menu, sidebar and footer of the real ones, see profile_html
+    :param variety: bool, whether the corpus has the early legislatures and the less common layouts too, see the
+                    module docstring
+    :return: list of 3-tuples of form (file name in the style of the scraped archive, html, expected info)
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for idx in range(n_pages):
+        profile = random_profile(rng, idx, variety)
+        cam = "2" if profile["chamber"] == "DEPUTAT" else "1"
+        file_name = "structura2015.mp?idm=" + str(idx + 1) + "&cam=" + cam + "&leg=" + profile["legislature"][:4] + \
+                    "_.html"
+        corpus.append((file_name, profile_html(profile, chrome), expected_info(profile)))
+    return corpus
+
+
+def write_synthetic_archive(zip_archive_path, n_pages, seed=0, chrome=False, variety=False):
+    """
+    Write a synthetic corpus to a zip archive laid out like the one that scrape.scrape_parliamentarians makes, so that
+    it can be fed straight to make_parliamentarians_legislature_table.
+
+    :param zip_archive_path: str, where to write the archive
+    :param n_pages: int, how many pages to make
+    :param seed: int, seed of the random generator
+    :param chrome: bool, whether the pages have the menu, sidebar and footer of the real ones, see profile_html
+    :param variety: bool, see make_synthetic_corpus
+    :return: list of the expected infos, in page order
+    """
+    corpus = make_synthetic_corpus(n_pages, seed, chrome, variety)
+    in_memory_file = BytesIO()
+    with ZipFile(in_memory_file, mode='w') as zip_archive:
+        for file_name, html, expected in corpus:
+            zip_archive.writestr(file_name, html, compress_type=ZIP_DEFLATED)
+    with open(zip_archive_path, 'wb') as out_f:
+        out_f.write(in_memory_file.getvalue())
+    return [expected for file_name, html, expected in corpus]
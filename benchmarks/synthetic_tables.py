@@ -0,0 +1,82 @@
+"""
+Make synthetic person-legislature tables, laid out like the one that make_parliamentarians_legislature_table writes,
+for benchmarking the stages downstream of the parser at sizes far beyond the real data.
+
+Values are drawn (with a seed) only from what the hand-coded dicts cover, so that make_person_year_table runs through
+without key errors: post-2000 legislatures, parties that are in every year of govt_parties and ppg_size, counties that
+are in county_polit_dict, and a handful of real convicted names, so that the conviction columns aren't all zero.
+"""
+
+import csv
+import random
+from data_tables.dicts.corruption_dicts import final_guilty_verdict
+from benchmarks.synthetic_profiles import letter_code
+
+person_legislature_header = ["PersID", "PersLegID", "legislature", "chamber", "constituency", "surnames",
+                             "given names", "mandate start", "mandate end", "death status", "entry party name",
+                             "entry party code", "entry ppg rank", "entry ppg rank dates", "destination party code",
+                             "first party switch month", "first party switch year", "seniority", "former switcher"]
+
+legislatures = ["2000-2004", "2004-2008", "2008-2012", "2012-2016", "2016-2020"]
+parties = ["PSD", "PNL", "UDMR"]
+counties = ["ALBA", "ARAD", "BIHOR", "BRAŞOV", "CLUJ", "CONSTANŢA", "DOLJ", "GALAŢI", "IAŞI", "PRAHOVA", "SIBIU",
+            "SUCEAVA", "TIMIŞ", "BUCUREŞTI"]
+ranks = ["membru", "membru", "membru", "secretar", "vicelider", "lider"]
+
+# the number of people in the real table, 1990-2020; scale 1 is about this big
+real_table_people = 2800
+
+
+def write_synthetic_person_legislature_table(out_path, n_people, seed=0):
+    """
+    Write a synthetic person-legislature table, sorted by person ID and legislature like the real one.
+
+    :param out_path: str, where to write the table, as csv
+    :param n_people: int, how many people (i.e. careers) to make; each serves in one to three legislatures in a row
+    :param seed: int, seed of the random generator; the same seed gives the same table
+    :return: int, the number of rows (person-legislatures) written
+    """
+    rng = random.Random(seed)
+    convicted = sorted(final_guilty_verdict)[:10]
+
+    table = []
+    pers_leg_id = 0
+    for pid in range(n_people):
+        if pid < len(convicted):
+            surnames, given_names = convicted[pid].split(" ", 1)
+        else:
+            surnames, given_names = "SUR " + letter_code(pid), "Given" + " Name" * (pid % 3)
+
+        first_leg = rng.randrange(len(legislatures))
+        n_legs = rng.randint(1, 3)
+        previous_switch = 0
+        for senior_idx, leg in enumerate(legislatures[first_leg:first_leg + n_legs]):
+            leg_start, leg_end = leg.split("-")
+            mandate_start = leg_start + "-12-01" if rng.random() < 0.85 else str(int(leg_start) + 2) + "-03-15"
+            mandate_end = leg_end + "-11-30" if rng.random() < 0.9 else str(int(leg_end) - 1) + "-04-10"
+
+            party = rng.choice(parties)
+            dest_party, switch_month, switch_year = "", "", ""
+            if rng.random() < 0.2:
+                # NB: the UDMR only ever switches to independent in the switch cost dicts
+                dest_party = "IND" if party == "UDMR" else rng.choice([p for p in ["PSD", "PNL", "IND"] if p != party])
+                switch_year = str(rng.randint(int(mandate_start[:4]) + 1, int(mandate_end[:4])))
+                switch_month = str(rng.randint(1, 12)).zfill(2)
+
+            rank_year = int(mandate_start[:4]) + rng.randint(0, 2)
+            rank_end_year = min(rank_year + rng.randint(0, 3), int(mandate_end[:4]))
+            rank_dates = str(rng.randint(1, 12)).zfill(2) + "." + str(rank_year) + "-" + \
+                str(rng.randint(1, 12)).zfill(2) + "." + str(rank_end_year)
+            died = "deceased in office" if rng.random() < 0.02 else "no death in office"
+
+            table.append([pid, pers_leg_id, leg, rng.choice(["DEPUTAT", "SENATOR"]), rng.choice(counties), surnames,
+                          given_names, mandate_start, mandate_end, died, "", party, rng.choice(ranks), rank_dates,
+                          dest_party, switch_month, switch_year, senior_idx + 1, previous_switch])
+            pers_leg_id += 1
+            previous_switch = 1 if dest_party else 0
+
+    with open(out_path, "w") as out_f:
+        writer = csv.writer(out_f)
+        writer.writerow(person_legislature_header)
+        writer.writerows(table)
+    return len(table)
@@ -0,0 +1,256 @@
+"""
+Build the whole pipeline, from the scraped profile htmls to the risk sets, with one command. Each script that used to
+be run by hand is a stage with declared inputs: the files it reads (e.g. the html archive, the person-legislature
+table), the dict modules it reads, and its own code. A stage is rerun only if the content of one of those inputs changed
+since its last run, or if one of its outputs is missing or was changed by hand; otherwise it is skipped.
+
+Since the outputs of one stage are inputs of the next, a rerun only carries downstream if it actually changed the
+output. E.g. editing corruption_dicts.py reruns the person-year stage, but not the person-legislature or person-month
+stages, which never read it. And since the person-year stage knows which dict entries each of its rows read, when only
+its dicts or input table changed it patches the affected rows instead of starting over.
+
+The hashes of the last successful run of each stage live in a json manifest next to the data.
+"""
+
+import hashlib
+import importlib
+import json
+import os
+import sys
+from data_tables import dict_snapshot
+from local import root
+
+code_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def pipeline_stages(data_dir):
+    """
+    Declare the stages of the pipeline, in the order in which they have to run.
+
+    NB: the dict_snapshot stage writes its output among the code, not the data, see data_tables/dict_snapshot.py
+
+    NB: the scrape stage has no inputs that we track (it reads the links file from the working directory and then the
+        live website), so it only runs if the html archive is missing or if it's forced. That goes for its code too:
+        a change to the scraper is no reason to crawl the whole site again, so it's not in "code". Nor is a manifest
+        that has never heard of it: the first build over an archive that is already there takes it as it is.
+
+    NB: "dicts" are the dict modules that the stage actually reads, not everything that its modules happen to import;
+        e.g. person_month_table imports person_year_table, which imports corruption_dicts, but the person-month risk
+        set doesn't depend on any conviction data.
+
+    :param data_dir: str, directory where all the data lives, e.g. root + "data/parliamentarians/"
+    :return: list of dicts, one per stage, with keys "name", "code", "dicts", "inputs", "outputs", "run"; "code" and
+             "dicts" are paths relative to the code directory, "inputs" and "outputs" are full paths, and "run" is a
+             3-tuple of (module name, function name, tuple of arguments); stages that can update their outputs in
+             place also have a "patch", laid out like "run", see stage_can_patch
+    """
+    archive_path = data_dir + "raw_htmls/parliamentarian_legislature_profile_site_htmls.zip"
+    pers_leg_path = data_dir + "parliamentarians_person_legislature_table.csv"
+    pers_year_path = data_dir + "parliamentarians_person_year_table.csv"
+    risk_set_path = data_dir + "parliamentarians_first_party_switch_risk_set.csv"
+    multi_year_risk_set_path = data_dir + "parliamentarians_first_party_switch_risk_set_multi_year_only.csv"
+    pers_month_path = data_dir + "parliamentarians_first_party_switch_person_month_risk_set.csv"
+    graph_path = data_dir + "party_colleague_graph.npz"
+
+    dicts_dir = "data_tables/dicts/"
+
+    return [{"name": "dict_snapshot",
+             "code": ["data_tables/dict_snapshot.py", "data_tables/dates.py"],
+             "dicts": [dicts_dir + module_name + ".py" for module_name in dict_snapshot.snapshot_modules],
+             "inputs": [],
+             "outputs": [dict_snapshot.snapshot_path],
+             "run": ("data_tables.dict_snapshot", "build_dict_snapshot", (dict_snapshot.snapshot_path,))},
+
+            {"name": "scrape",
+             # NB: no scraper modules (scrape.py, http_cache.py, rate_control.py, ...) here, see the docstring
+             "code": [],
+             "dicts": [],
+             "inputs": [],
+             "outputs": [archive_path],
+             "run": ("scrape.scrape", "scrape_parliamentarians", (data_dir + "raw_htmls",))},
+
+            {"name": "person_legislature",
+             "code": ["data_tables/person_legislature_table.py", "data_tables/dates.py", "helpers.py"],
+             "dicts": [dicts_dir + "destination_dict.py"],
+             "inputs": [archive_path],
+             "outputs": [pers_leg_path],
+             "run": ("data_tables.person_legislature_table", "make_parliamentarians_legislature_table",
+                     (archive_path, data_dir))},
+
+            {"name": "person_year",
+             "code": ["data_tables/person_year_table.py", "data_tables/dict_dependencies.py", "data_tables/dates.py",
+                      dicts_dir + "party_colleagues.py"],
+             "dicts": [dicts_dir + "idealogical_switch_cost.py", dicts_dir + "govt_member.py",
+                       dicts_dir + "party_leaders.py", dicts_dir + "county_politics.py",
+                       dicts_dir + "corruption_dicts.py", dicts_dir + "reference_dicts.py"],
+             "inputs": [pers_leg_path],
+             "outputs": [pers_year_path, risk_set_path, multi_year_risk_set_path],
+             "run": ("data_tables.person_year_table", "make_person_year_table",
+                     (pers_leg_path, pers_year_path, risk_set_path)),
+             "patch": ("data_tables.person_year_table", "patch_person_year_table",
+                       (pers_leg_path, pers_year_path, risk_set_path))},
+
+            {"name": "person_month",
+             "code": ["data_tables/person_month_table.py", "data_tables/person_year_table.py", "data_tables/dates.py"],
+             "dicts": [dicts_dir + "idealogical_switch_cost.py", dicts_dir + "govt_member.py",
+                       dicts_dir + "party_leaders.py", dicts_dir + "county_politics.py",
+                       dicts_dir + "reference_dicts.py"],
+             "inputs": [pers_leg_path],
+             "outputs": [pers_month_path],
+             "run": ("data_tables.person_month_table", "make_person_month_risk_set", (pers_leg_path, pers_month_path))},
+
+            {"name": "colleague_graph",
+             "code": [dicts_dir + "party_colleagues.py", "data_tables/dates.py"],
+             "dicts": [],
+             "inputs": [risk_set_path],
+             "outputs": [graph_path],
+             "run": ("data_tables.dicts.party_colleagues", "build_colleague_graph", (risk_set_path, graph_path))}]
+
+
+def file_hash(path):
+    """
+    Return the sha256 hex digest of a file's contents, or None if the file does not exist.
+
+    :param path: str, path to the file
+    :return: str or None
+    """
+    if not os.path.isfile(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as in_f:
+        for chunk in iter(lambda: in_f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stage_input_hashes(stage):
+    """
+    Hash everything a stage depends on.
+
+    :param stage: dict, as made by pipeline_stages
+    :return: dict of form {path: hash}
+    """
+    hashes = {}
+    for rel_path in stage["code"] + stage["dicts"]:
+        hashes[rel_path] = file_hash(os.path.join(code_dir, rel_path))
+    for path in stage["inputs"]:
+        hashes[path] = file_hash(path)
+    return hashes
+
+
+def stage_is_fresh(stage, input_hashes, manifest):
+    """
+    A stage is fresh if its inputs hash to what they did the last time it ran, and its outputs are still there
+    and unchanged since. A stage that tracks no inputs at all (i.e. the scrape stage) is fresh as long as its outputs
+    are as it left them, whatever inputs an older manifest recorded for it.
+
+    :param stage: dict, as made by pipeline_stages
+    :param input_hashes: dict, as made by stage_input_hashes
+    :param manifest: dict, the build manifest
+    :return: bool
+    """
+    if stage["name"] not in manifest:
+        return False
+    last_run = manifest[stage["name"]]
+    if input_hashes and last_run["inputs"] != input_hashes:
+        return False
+    return all(file_hash(path) is not None and file_hash(path) == last_run["outputs"].get(path)
+               for path in stage["outputs"])
+
+
+def stage_can_patch(stage, input_hashes, manifest):
+    """
+    A stage that has a patch function (e.g. the person-year stage, see person_year_table.patch_person_year_table) can
+    update its last outputs in place, instead of being rerun from scratch, if only its dicts or input files changed
+    since: its code must be the same, and its outputs must be just as it left them.
+
+    :param stage: dict, as made by pipeline_stages
+    :param input_hashes: dict, as made by stage_input_hashes
+    :param manifest: dict, the build manifest
+    :return: bool
+    """
+    if "patch" not in stage or stage["name"] not in manifest:
+        return False
+    last_run = manifest[stage["name"]]
+    if any(last_run["inputs"].get(rel_path) != input_hashes[rel_path] for rel_path in stage["code"]):
+        return False
+    return all(file_hash(path) == last_run["outputs"].get(path) for path in stage["outputs"])
+
+
+def load_manifest(manifest_path):
+    """Return the build manifest, or an empty one if we've never built before."""
+    if not os.path.isfile(manifest_path):
+        return {}
+    with open(manifest_path, "r") as in_f:
+        return json.load(in_f)
+
+
+def save_manifest(manifest, manifest_path):
+    """Write the build manifest; write then rename, so that a crash mid-write can't leave a corrupt manifest."""
+    temp_path = manifest_path + ".tmp"
+    with open(temp_path, "w") as out_f:
+        json.dump(manifest, out_f, indent=2, sort_keys=True)
+    os.replace(temp_path, manifest_path)
+
+
+def build(data_dir, force=()):
+    """
+    Run every stage of the pipeline whose inputs changed since it last ran, in order, and skip all the others.
+
+    NB: I update the manifest after each stage, so that if a later stage crashes the earlier ones are not redone.
+
+    :param data_dir: str, directory where all the data lives, e.g. root + "data/parliamentarians/"
+    :param force: iterable of stage names that should be rerun regardless
+    :return: list of the names of the stages that were (re)run
+    """
+    stages = pipeline_stages(data_dir)
+    stage_names = {stage["name"] for stage in stages}
+    for name in force:
+        if name not in stage_names:
+            raise ValueError("UNKNOWN BUILD STAGE: " + name)
+
+    manifest_path = data_dir + "build_manifest.json"
+    manifest = load_manifest(manifest_path)
+
+    rerun = []
+    for stage in stages:
+        input_hashes = stage_input_hashes(stage)
+
+        # NB: a stage that tracks no inputs (i.e. the scrape stage) and has never run under the build has nothing to be
+        #     stale against, so if its outputs are all there (e.g. an archive scraped by hand) I take them as they are,
+        #     and only note their hashes, so that later builds can tell if they change
+        if stage["name"] not in force and stage["name"] not in manifest and not input_hashes \
+                and all(os.path.isfile(path) for path in stage["outputs"]):
+            print("ADOPTING " + stage["name"])
+            manifest[stage["name"]] = {"inputs": input_hashes,
+                                       "outputs": {path: file_hash(path) for path in stage["outputs"]}}
+            save_manifest(manifest, manifest_path)
+            continue
+
+        if stage["name"] not in force and stage_is_fresh(stage, input_hashes, manifest):
+            print("SKIPPING " + stage["name"])
+            continue
+
+        missing = [path for path in stage["inputs"] if input_hashes[path] is None]
+        if missing:
+            raise ValueError("MISSING INPUTS FOR STAGE " + stage["name"] + ": " + ", ".join(missing))
+
+        if stage["name"] not in force and stage_can_patch(stage, input_hashes, manifest):
+            print("PATCHING " + stage["name"])
+            module_name, function_name, args = stage["patch"]
+        else:
+            print("RUNNING " + stage["name"])
+            module_name, function_name, args = stage["run"]
+        getattr(importlib.import_module(module_name), function_name)(*args)
+
+        manifest[stage["name"]] = {"inputs": input_hashes,
+                                   "outputs": {path: file_hash(path) for path in stage["outputs"]}}
+        save_manifest(manifest, manifest_path)
+        rerun.append(stage["name"])
+
+    return rerun
+
+
+if __name__ == "__main__":
+    # any command line arguments are names of stages to rerun regardless, e.g. "python build.py person_legislature"
+    build(root + "data/parliamentarians/", force=sys.argv[1:])
@@ -0,0 +1,118 @@
+"""
+Turn the dates we get from the profile pages, the person-legislature table and the hand-coded dicts into integers, so
+that comparing dates downstream is integer arithmetic rather than splitting strings over and over.
+
+The formats are
+    - "12 decembrie 2004", with full Romanian month names, in the mandate info of the profile pages
+    - "iun. 2001", with short Romanian month names, in the party and parliamentary party group info of the profile pages
+    - "2004-12-12", i.e. YR-MO-DAY, for mandate boundaries in the person-legislature table
+    - "28.12.2000", "12.2000", "2000" and the run-together "122000", in the tables and the hand-coded dicts
+
+The regexes are compiled once, and the results memoised: the same few thousand date strings come up again and again
+(e.g. each person-year of a mandate has the same mandate boundaries), so after the first time a date is just a lookup.
+"""
+
+import datetime
+import functools
+import re
+
+ro_months = {"ianuarie": 1, "februarie": 2, "martie": 3, "aprilie": 4, "mai": 5, "iunie": 6, "iulie": 7, "august": 8,
+             "septembrie": 9, "octombrie": 10, "noiembrie": 11, "decembrie": 12}
+
+short_ro_months = {'ian': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'mai': 5, 'iun': 6, 'iul': 7, 'aug': 8, 'sep': 9, 'oct': 10,
+                   'noi': 11, 'dec': 12}
+
+# e.g. "12 decembrie 2004"; NB: the year may run into the text after it, e.g. "2004 - prezent"
+long_ro_date_regex = re.compile(r"(\d{1,2})\s+(" + "|".join(ro_months) + r")\s+(\d{4})")
+
+# e.g. "iun. 2001", "iun.2001" or "mai 2016"; NB: the year may run into the party name after it, e.g. "iun. 2001PSD"
+short_ro_date_regex = re.compile(r"\b(" + "|".join(short_ro_months) + r")\.?\s*(\d{4})")
+
+iso_date_regex = re.compile(r"(\d{4})-(\d{1,2})-(\d{1,2})")
+
+# the first date in a string, with or without day and month, e.g. "28.12.2000", "02.2011", "2005"; the separators
+# are lenient since the hand-coded dicts have typos like "28.06,1997" or "28.05-2012"
+numeric_date_regex = re.compile(r"(?:(\d{1,2})[.,-])?(?:(\d{1,2})[.,-])?(\d{4})")
+
+# month and year with no separator, e.g. "052016"
+run_together_date_regex = re.compile(r"(\d{2})(\d{4})")
+
+
+def month_index(year, month):
+    """Turn a year and month into an integer month index, so that consecutive months are consecutive integers."""
+    return int(year) * 12 + int(month) - 1
+
+
+def day_ordinal(year, month, day):
+    """Turn a date into an integer day ordinal (days since 1 January of year 1), as in datetime.date.toordinal."""
+    return datetime.date(int(year), int(month), int(day)).toordinal()
+
+
+def month_year_text(year, month):
+    """Write a year and month in the MO.YR format of the person-legislature table, e.g. "06.2001"."""
+    return str(month).zfill(2) + "." + str(year)
+
+
+@functools.lru_cache(maxsize=None)
+def long_ro_date(date_text):
+    """
+    Get the first date with a full Romanian month name out of a string.
+
+    :param date_text: str, e.g. "data validarii: 12 decembrie 2004"
+    :return: 3-tuple of int: year, month, day
+    """
+    match = long_ro_date_regex.search(date_text)
+    if not match:
+        raise ValueError("NO DATE IN " + date_text)
+    day, month, year = match.groups()
+    return int(year), ro_months[month], int(day)
+
+
+@functools.lru_cache(maxsize=None)
+def short_ro_dates(date_text):
+    """
+    Get all the dates with a short Romanian month name out of a string.
+
+    :param date_text: str, e.g. "din iun. 2001 până în aug. 2003"
+    :return: tuple of 2-tuples of int (year, month), in the order they appear in the string; empty if there are none
+    """
+    return tuple((int(year), short_ro_months[month]) for month, year in short_ro_date_regex.findall(date_text))
+
+
+@functools.lru_cache(maxsize=None)
+def iso_date(date_text):
+    """
+    Split a date in the YR-MO-DAY format of the person-legislature table.
+
+    :param date_text: str, e.g. "2004-12-12"
+    :return: 3-tuple of int: year, month, day
+    """
+    match = iso_date_regex.match(date_text)
+    if not match:
+        raise ValueError("NO DATE IN " + date_text)
+    year, month, day = match.groups()
+    return int(year), int(month), int(day)
+
+
+@functools.lru_cache(maxsize=None)
+def numeric_date(date_text):
+    """
+    Get the first date in "DAY.MO.YR", "MO.YR", "YR" or run-together "MOYR" format out of a string.
+
+    :param date_text: str, e.g. "28.12.2000", "02.2011" or "052016"
+    :return: 3-tuple of year, month, day, where the month and day are None if the string doesn't have them (all int);
+             None if there is no date in the string
+    """
+    match = run_together_date_regex.fullmatch(date_text)
+    if match:
+        month, year = match.groups()
+        return int(year), int(month), None
+    match = numeric_date_regex.search(date_text)
+    if not match:
+        return None
+    first, second, year = match.groups()
+    if second:  # DAY.MO.YR
+        return int(year), int(second), int(first)
+    if first:  # MO.YR
+        return int(year), int(first), None
+    return int(year), None, None
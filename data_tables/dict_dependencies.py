@@ -0,0 +1,137 @@
+"""
+Keep track of which entries of the hand-coded dicts each row of the person-year table depends on, so that when I edit
+one entry (e.g. the county council president of one county, or the conviction date of one person) I can find and
+recompute just the rows that read it, instead of rebuilding the whole table.
+
+Each dict that the person-year table reads is declared below with the axes along which it is indexed, e.g. govt_parties
+is indexed by year, then by party. Every person-year records its value on each axis (its year, party, county, etc.).
+An edit to a dict is found by diffing a snapshot of the dict entries taken at the last build against the current
+entries; a row is affected if, for every axis of the changed entry, the row has that value.
+"""
+
+import importlib
+
+# the dicts read when making the person-year table: {dict name: (module, axes of the nested keys, outermost first)}
+# NB: "*" marks an axis that the rows do not record (e.g. the period of an ideological switch cost), which matches
+#     any row
+# NB: where I'm not sure which key a row reads I stop the axes early, which errs on the side of recomputing too much;
+#     e.g. get_ppg_size may look up the caucus of an allied small party, so any ppg_size change in a year touches the
+#     whole year
+tracked_dicts = {"ideological_pswitch_costs": ("data_tables.dicts.idealogical_switch_cost", ("*", "edge")),
+                 "govt_parties": ("data_tables.dicts.govt_member", ("year", "party")),
+                 "party_leader_changes": ("data_tables.dicts.party_leaders", ("year", "party")),
+                 "county_polit_dict": ("data_tables.dicts.county_politics", ("legis", "county")),
+                 "leader_conv_one_year": ("data_tables.dicts.corruption_dicts", ("year", "party")),
+                 "leader_conv_multi_year": ("data_tables.dicts.corruption_dicts", ("year", "party")),
+                 "legis_guilty_count": ("data_tables.dicts.corruption_dicts", ("year", "party")),
+                 "first_conviction_appeal_possible": ("data_tables.dicts.corruption_dicts", ("person",)),
+                 "final_guilty_verdict": ("data_tables.dicts.corruption_dicts", ("person",)),
+                 "conv_min_info": ("data_tables.dicts.corruption_dicts", ("person",)),
+                 "party_name_changes": ("data_tables.dicts.reference_dicts", ("entry_party",)),
+                 "historical_regions_dict": ("data_tables.dicts.reference_dicts", ("county",)),
+                 "election_years": ("data_tables.dicts.reference_dicts", ("year",)),
+                 "ppg_size": ("data_tables.dicts.reference_dicts", ("year",)),
+                 "ethnic_parties": ("data_tables.dicts.reference_dicts", ("party",)),
+                 "personality_parties": ("data_tables.dicts.reference_dicts", ("party",))}
+
+# the axes that every person-year records, in the order in which they are stored
+dependency_axes = ["year", "legis", "county", "entry_party", "party", "edge", "person"]
+
+
+def person_year_dependencies(pers_yr, header, entry_party):
+    """
+    Record the keys along which a person-year reads the tracked dicts.
+
+    :param pers_yr: list, one row of the person-year table
+    :param header: list, the header of the person-year table
+    :param entry_party: str, the entry party code as it is in the person-legislature table, i.e. before the
+                        party_name_changes
+    :return: list, the row's value on each of the dependency_axes
+    """
+    s_party, dest_party = pers_yr[header.index("start_party")], pers_yr[header.index("destination_party")]
+    fullname = pers_yr[header.index("surnames")] + " " + pers_yr[header.index("given names")]
+    edge = s_party + "-" + dest_party if dest_party else None
+    return [int(pers_yr[header.index("year")]), pers_yr[header.index("legis")], pers_yr[header.index("constit")],
+            entry_party, s_party, edge, fullname]
+
+
+def canonical(value):
+    """
+    Return a string representation of a dict value that is the same across runs.
+
+    NB: plain repr won't do, since the order of a set of strings changes from one python process to the next.
+    """
+    if isinstance(value, dict):
+        return "{" + ", ".join(sorted(canonical(k) + ": " + canonical(v) for k, v in value.items())) + "}"
+    if isinstance(value, (set, frozenset)):
+        return "{" + ", ".join(sorted(canonical(v) for v in value)) + "}"
+    if isinstance(value, (list, tuple)):
+        return "(" + ", ".join(canonical(v) for v in value) + ")"
+    return repr(value)
+
+
+def flatten_entries(value, depth, path=()):
+    """
+    Flatten a nested dict into entries of form [key, ..., key, canonical value], going down at most depth levels.
+    The members of a set are keys whose value is True, so that adding e.g. one party to the leader changes of one year
+    only touches that party.
+
+    :param value: the dict (or set) to flatten
+    :param depth: int, how many levels of keys to go down
+    :param path: tuple, the keys above this level
+    :return: list of lists
+    """
+    if depth > 0 and isinstance(value, dict):
+        return [entry for k, v in value.items() for entry in flatten_entries(v, depth - 1, path + (k,))]
+    if depth > 0 and isinstance(value, (set, frozenset)):
+        return [list(path) + [member, "True"] for member in value]
+    return [list(path) + [canonical(value)]]
+
+
+def dict_snapshot():
+    """
+    Take a snapshot of the current entries of all the tracked dicts, see flatten_entries.
+
+    :return: dict of form {dict name: list of entries}
+    """
+    snapshot = {}
+    for dict_name, (module_name, axes) in tracked_dicts.items():
+        tracked = getattr(importlib.import_module(module_name), dict_name)
+        snapshot[dict_name] = flatten_entries(tracked, len(axes))
+    return snapshot
+
+
+def changed_dict_keys(old_snapshot, new_snapshot):
+    """
+    Find the dict entries that were added, removed or changed between two snapshots.
+
+    :param old_snapshot: dict, as made by dict_snapshot
+    :param new_snapshot: dict, as made by dict_snapshot
+    :return: set of tuples of form (dict name, key, ..., key)
+    """
+    changed = set()
+    for dict_name in tracked_dicts:
+        # NB: json turns tuples into lists, so entries are compared as tuples
+        old_entries = {tuple(entry) for entry in old_snapshot.get(dict_name, [])}
+        new_entries = {tuple(entry) for entry in new_snapshot.get(dict_name, [])}
+        for entry in old_entries ^ new_entries:
+            changed.add((dict_name,) + entry[:-1])  # drop the value, keep the keys
+    return changed
+
+
+def affected_rows(dependencies, changed_keys):
+    """
+    Find the rows that read any of the changed dict entries.
+
+    :param dependencies: list of lists, the dependencies of each row, as made by person_year_dependencies
+    :param changed_keys: set of tuples, as made by changed_dict_keys
+    :return: set of row indexes
+    """
+    # for each changed entry, the (axis index, key) pairs that a row must match
+    conditions = []
+    for dict_name, *keys in changed_keys:
+        axes = tracked_dicts[dict_name][1]
+        conditions.append([(dependency_axes.index(axis), key) for axis, key in zip(axes, keys) if axis != "*"])
+
+    return {row_idx for row_idx, row_deps in enumerate(dependencies)
+            if any(all(row_deps[axis_idx] == key for axis_idx, key in condition) for condition in conditions)}
@@ -0,0 +1,170 @@
+"""
+A compiled snapshot of the hand-coded dicts in data_tables/dicts, so that importing them is one unpickling instead of
+running the source of every dict module, which every analysis notebook and every spawned worker process would
+otherwise do again.
+
+build_dict_snapshot runs the source of the dict modules, checks that what they hold is plain data (and that the dates
+in them parse), and pickles it all to one file, along with a format version and a hash of each module's source; each
+module's dicts are pickled apart within it, so that they can be unpickled apart.
+When data_tables.dicts is first imported, install_dict_snapshot puts a finder (see SnapshotFinder) on sys.meta_path,
+which doesn't touch the snapshot yet. The first time a dict module is imported, the finder makes it out of the snapshot,
+if the module's source is unchanged since the snapshot was made; otherwise (i.e. it was edited since) the module is
+left to be imported from source as usual. So one only pays for the dict modules one imports, e.g. the
+person-legislature table reads nothing but destination_dict. No snapshot, or one of another version, means everything
+comes from source.
+"""
+
+import hashlib
+import importlib.abc
+import importlib.machinery
+import os
+import pickle
+import runpy
+import sys
+from data_tables.dates import numeric_date
+
+# bump this whenever the layout of the snapshot changes, so that old snapshots are ignored instead of misread
+snapshot_version = 2
+
+dicts_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dicts")
+snapshot_path = os.path.join(dicts_dir, "dicts_snapshot.pickle")
+
+# the modules that only hold data; NB: party_colleagues lives among the dicts but is code, so it is not in here
+snapshot_modules = ["corruption_dicts", "county_politics", "destination_dict", "explanations", "govt_member",
+                    "idealogical_switch_cost", "party_leaders", "reference_dicts", "switch_cost"]
+
+# the dicts whose values are dates in DAY.MO.YR format
+day_date_dicts = {"corruption_dicts": ["first_conviction_appeal_possible", "final_guilty_verdict"]}
+
+plain_types = (dict, list, tuple, set, frozenset, str, int, float, bool, type(None))
+
+
+def source_hash(module_name):
+    """Return the sha256 of the source of a dict module."""
+    with open(os.path.join(dicts_dir, module_name + ".py"), "rb") as in_f:
+        return hashlib.sha256(in_f.read()).hexdigest()
+
+
+def is_plain_data(value):
+    """Whether a value is made only of dicts, lists, tuples, sets, strings and numbers, i.e. can be snapshot as is."""
+    if not isinstance(value, plain_types):
+        return False
+    if isinstance(value, dict):
+        return all(is_plain_data(k) and is_plain_data(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return all(is_plain_data(v) for v in value)
+    return True
+
+
+def validate_dicts(module_dicts):
+    """
+    Check the contents of the dict modules before they go in a snapshot; raise a ValueError at the first problem.
+
+    :param module_dicts: dict of form {module name: {variable name: value}}
+    :return: None
+    """
+    for module_name, variables in module_dicts.items():
+        for name, value in variables.items():
+            if not is_plain_data(value):
+                raise ValueError("NOT PLAIN DATA: " + module_name + "." + name)
+    for module_name, dict_names in day_date_dicts.items():
+        for name in dict_names:
+            for key, date in module_dicts[module_name][name].items():
+                parsed = numeric_date(date)
+                if parsed is None or None in parsed:
+                    raise ValueError("BAD DATE IN " + module_name + "." + name + " FOR " + key + ": " + date)
+
+
+def build_dict_snapshot(out_path=snapshot_path):
+    """
+    Run the source of every dict module, validate what they hold, and write the snapshot.
+
+    :param out_path: str, where to write the snapshot
+    :return: None
+    """
+    module_dicts, docs = {}, {}
+    for module_name in snapshot_modules:
+        # NB: run the source itself, so that we never snapshot a module that was itself made from an old snapshot
+        variables = runpy.run_path(os.path.join(dicts_dir, module_name + ".py"))
+        docs[module_name] = variables.get("__doc__")
+        module_dicts[module_name] = {name: value for name, value in variables.items() if not name.startswith("__")}
+    validate_dicts(module_dicts)
+
+    snapshot = {"version": snapshot_version, "python": list(sys.version_info[:2]),
+                "source hashes": {module_name: source_hash(module_name) for module_name in snapshot_modules},
+                "docs": docs, "dicts": {module_name: pickle.dumps(variables, protocol=pickle.HIGHEST_PROTOCOL)
+                                        for module_name, variables in module_dicts.items()}}
+    # write to a temporary file first, so that a crash midway never leaves a half-written snapshot
+    with open(out_path + ".tmp", "wb") as out_f:
+        pickle.dump(snapshot, out_f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(out_path + ".tmp", out_path)
+
+
+def read_dict_snapshot(in_path=snapshot_path):
+    """
+    Read the snapshot, if there is one of this version, made under this version of python.
+
+    :param in_path: str, where the snapshot is
+    :return: dict, laid out as build_dict_snapshot writes it; empty if there is no usable snapshot
+    """
+    if not os.path.isfile(in_path):
+        return {}
+    with open(in_path, "rb") as in_f:
+        snapshot = pickle.load(in_f)
+    if snapshot.get("version") != snapshot_version or snapshot.get("python") != list(sys.version_info[:2]):
+        return {}
+    return snapshot
+
+
+class SnapshotFinder(importlib.abc.MetaPathFinder, importlib.abc.Loader):
+    """
+    Import hook that makes the dict modules of a package out of the snapshot, each one when it's first imported. The
+    snapshot file is only read at the first such import, and a module's dicts are only unpickled (and its source only
+    hashed, to check that it's still the one in the snapshot) when that module is imported.
+    """
+
+    def __init__(self, package_name, in_path):
+        self.package_name, self.in_path, self.snapshot = package_name, in_path, None
+
+    def find_spec(self, fullname, path=None, target=None):
+        """Return the spec of a dict module that is fresh in the snapshot, or None to leave it to the other finders."""
+        package_name, _, module_name = fullname.rpartition(".")
+        if package_name != self.package_name or module_name not in snapshot_modules:
+            return None
+        if self.snapshot is None:
+            self.snapshot = read_dict_snapshot(self.in_path)
+        if module_name not in self.snapshot.get("dicts", {}):
+            return None
+        source_path = os.path.join(dicts_dir, module_name + ".py")
+        if not os.path.isfile(source_path) or source_hash(module_name) != self.snapshot["source hashes"][module_name]:
+            return None
+        spec = importlib.machinery.ModuleSpec(fullname, self, origin=source_path)
+        spec.has_location = True  # NB: so that the module gets a __file__, as if it came from source
+        return spec
+
+    def create_module(self, spec):
+        """Use the default module creation."""
+        return None
+
+    def exec_module(self, module):
+        """Fill the module with the docstring and the dicts that its source would have made."""
+        module_name = module.__name__.rpartition(".")[2]
+        module.__doc__ = self.snapshot["docs"][module_name]
+        module.__dict__.update(pickle.loads(self.snapshot["dicts"][module_name]))
+
+
+def install_dict_snapshot(package_name="data_tables.dicts", in_path=snapshot_path):
+    """
+    Make the dict modules that are fresh in the snapshot importable straight from it, by putting a SnapshotFinder in
+    front of the other finders on sys.meta_path. Modules that are already imported are left as they are.
+
+    :param package_name: str, the package the dict modules belong to
+    :param in_path: str, where the snapshot is
+    :return: SnapshotFinder, the one that was installed, or the one that already was (e.g. if the package is reloaded)
+    """
+    for finder in sys.meta_path:
+        if isinstance(finder, SnapshotFinder) and (finder.package_name, finder.in_path) == (package_name, in_path):
+            return finder
+    finder = SnapshotFinder(package_name, in_path)
+    sys.meta_path.insert(0, finder)
+    return finder
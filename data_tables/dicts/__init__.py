@@ -0,0 +1,8 @@
+"""
+The hand-coded dicts. If there is an up-to-date snapshot of them (see data_tables/dict_snapshot.py), the dict modules
+are made from it instead of from their source, each one when it's first imported.
+"""
+
+from data_tables.dict_snapshot import install_dict_snapshot
+
+install_dict_snapshot()
@@ -1,5 +1,6 @@
 """
-Script that makes a json edge list of all legislators who were party colleagues.
+Script that makes a weighted edge list (stored as a compressed .npz adjacency) of all legislators who were party
+colleagues.
 
 The idea: for each legislator-year, compare against a list of people convicted in said year. If the
 legislator and a person from that list were at any point in time party colleagues, mark it.
@@ -8,7 +9,9 @@ legislator and a person from that list were at any point in time party colleague
 
 import csv
 from local import root
+from data_tables.dates import numeric_date
 from data_tables.dicts.party_leaders import party_leaders
+from data_tables.dicts.corruption_dicts import conv_min_info, final_guilty_verdict
 
 
 def colleagues_party_bins(risk_set_py_table, table_header):
@@ -79,17 +82,354 @@ def colleagues_person_bins(risk_set_py_table, table_header):
     return colleague_dict
 
 
-if __name__ == "__main__":
+def party_year_memberships(person_year_table, table_header):
+    """
+    Return the party-years in which each legislator counts as a member of their start party, as a list of tuples of
+    form (person ID, fullname, party, year).
+
+    NB: as in colleagues_party_bins, party membership only counts up to (and including) the year of the first party
+        switch within a legislature, since after that the start party is no longer the legislator's party. This lets
+        me pass either the full person-year table or the risk set.
+
+    :param person_year_table: table of person years as list of lists, (no header)
+    :param table_header: list, the header of the person_year_table
+    :return: list of 4-tuples
+    """
+
+    surnames_col_idx, given_names_col_idx = table_header.index("surnames"), table_header.index("given names")
+    pid_col_idx, leg_col_idx = table_header.index("person_id"), table_header.index("legis")
+    yr_col_idx, s_party_col_idx = table_header.index("year"), table_header.index("start_party")
+    pswitch1_col_idx = table_header.index("p_switch1")
+
+    # year of first party switch for each person-legislature, to cut off post-switch years
+    switch_years = {(py[pid_col_idx], py[leg_col_idx]): int(py[yr_col_idx]) for py in person_year_table
+                    if int(py[pswitch1_col_idx]) == 1}
+
+    memberships = []
+    for py in person_year_table:
+        switch_yr = switch_years.get((py[pid_col_idx], py[leg_col_idx]))
+        if switch_yr and int(py[yr_col_idx]) > switch_yr:
+            continue
+        fullname = py[surnames_col_idx] + " " + py[given_names_col_idx]
+        memberships.append((str(py[pid_col_idx]), fullname, str(py[s_party_col_idx]), int(py[yr_col_idx])))
+    return memberships
+
+
+def first_conviction_years():
+    """
+    Return the year of first conviction of each convicted legislator (final guilty verdicts) and minister.
+
+    NB: for people with several convictions (e.g. Năstase) I only keep the first, since I assume that further
+        convictions of the same person send no new signal.
+
+    :return: dict of form {fullname: int, year}
+    """
+    # final verdict dates come in "DAY.MO.YR" format
+    conviction_years = {name: numeric_date(date)[0] for name, date in final_guilty_verdict.items()}
+    for minister, info in conv_min_info.items():
+        conv_date = info['conviction date']
+        conviction_years[minister] = min(conv_date) if isinstance(conv_date, tuple) else conv_date
+    return conviction_years
+
+
+def convicted_names():
+    """Return the set of fullnames of everyone in first_conviction_years."""
+    return set(final_guilty_verdict) | set(conv_min_info)
+
+
+def minister_party_years():
+    """
+    Return the party-years of convicted ministers while they were in ministerial office, as a list of tuples of form
+    (fullname, party, year).
+    """
+    party_years = []
+    for minister, info in conv_min_info.items():
+        # NB: single-year mandates are stored as plain ints, e.g. (2007) == 2007
+        min_years = info['min mandate'] if isinstance(info['min mandate'], tuple) else (info['min mandate'],)
+        for yr in min_years:
+            party_years.append((minister, info['party during min mandate'], yr))
+    return party_years
+
+
+def convicted_colleague_exposure(person_year_table, table_header):
+    """
+    For each legislator-year, count how many people who were at any point their party colleagues were convicted in
+    that year. Convictions are final guilty verdicts for legislators (final_guilty_verdict) and the convictions of
+    ministers (conv_min_info).
+
+    Rather than loop over every pair of legislators, I build three sparse matrices and multiply them:
+        membership (people x party-years): 1 if the person was in that party in that year
+        colleagues (people x people): membership * membership^T, i.e. shared party-years, binarised, diagonal zeroed
+        convictions (people x years): 1 if the person was convicted in that year
+    so that exposure = colleagues * convictions gives (people x years) counts of convicted colleagues.
+
+    NB: party membership is cut off at the first party switch, see party_year_memberships.
+    NB: for ministers colleague-ship means being in the same party while the minister was in ministerial office, so
+        they enter the membership matrix with their party during their ministerial mandate; this also covers the
+        convicted ministers who were never legislators.
+    NB: only first convictions count, see first_conviction_years. One cannot be one's own colleague, so
+        self-convictions are not counted here; they are handled by the "pconv" columns.
+
+    :param person_year_table: table of person years as list of lists, (no header)
+    :param table_header: list, the header of the person_year_table
+    :return: dict of form {(fullname, year): int, count of colleagues convicted in that year}
+    """
+    # NB: numpy and scipy take far longer to import than everything else that person_year_table needs, so I only
+    #     import them in the functions that use them, rather than have every worker process and notebook pay for them
+    import numpy as np
+    from scipy import sparse
+
+    # collect (fullname, party, year) memberships, for legislators and for convicted ministers
+    memberships = [(fullname, party, yr) for pid, fullname, party, yr
+                   in party_year_memberships(person_year_table, table_header)]
+    memberships.extend(minister_party_years())
+    conviction_years = first_conviction_years()
+
+    # index people, party-years and calendar years
+    names = sorted({m[0] for m in memberships} | set(conviction_years))
+    people = {name: idx for idx, name in enumerate(names)}
+    party_years = {p_yr: idx for idx, p_yr in enumerate(sorted({(m[1], m[2]) for m in memberships}))}
+    all_years = {m[2] for m in memberships} | set(conviction_years.values())
+    first_year = min(all_years)
+    n_years = max(all_years) - first_year + 1
+
+    person_idxs = [people[m[0]] for m in memberships]
+    party_yr_idxs = [party_years[(m[1], m[2])] for m in memberships]
+    membership = sparse.csr_matrix((np.ones(len(memberships), dtype=np.int32), (person_idxs, party_yr_idxs)),
+                                   shape=(len(people), len(party_years)))
+    membership.data[:] = 1  # duplicate (person, party-year) entries get summed on construction; undo that
+
+    colleagues = (membership @ membership.T).tocsr()
+    colleagues.setdiag(0)
+    colleagues.eliminate_zeros()
+    colleagues.data[:] = 1
+
+    convictions = sparse.csr_matrix((np.ones(len(conviction_years), dtype=np.int32),
+                                     ([people[name] for name in conviction_years],
+                                      [yr - first_year for yr in conviction_years.values()])),
+                                    shape=(len(people), n_years))
+
+    exposure = (colleagues @ convictions).tocoo()
+
+    exposure_dict = {}
+    for person_idx, yr_idx, count in zip(exposure.row, exposure.col, exposure.data):
+        exposure_dict[(names[person_idx], first_year + int(yr_idx))] = int(count)
+    return exposure_dict
+
+
+def convicted_colleague_index(person_year_table, table_header):
+    """
+    Make an index of the party-years of everyone who was convicted, so that the convicted colleagues of a legislator
+    can be found from that legislator's own person-years alone, see indexed_colleague_exposure. There are only a few
+    dozen convicted people, so the index is small even when the person-year table is not.
+
+    :param person_year_table: table of person years as list of lists, (no header); only the person-years of convicted
+                              people are used, so it is enough to pass just those
+    :param table_header: list, the header of the person_year_table
+    :return: dict of form {fullname: (year of first conviction, set of (party, year) tuples)}
+    """
+    conviction_years = first_conviction_years()
+    index = {name: (yr, set()) for name, yr in conviction_years.items()}
+    for pid, fullname, party, yr in party_year_memberships(person_year_table, table_header):
+        if fullname in index:
+            index[fullname][1].add((party, yr))
+    for minister, party, yr in minister_party_years():
+        index[minister][1].add((party, yr))
+    return index
 
-    trunk = "data/parliamentarians/"
-    risk_set_py_table_path = root + trunk + "parliamentarians_first_party_switch_risk_set.csv"
 
-    with open(risk_set_py_table_path, "r") as in_f:
+def indexed_colleague_exposure(person_year_table, table_header, convicted_index):
+    """
+    Same counts as convicted_colleague_exposure, but looking colleagues up in a convicted_colleague_index, so that the
+    table can hold just some of the legislators, e.g. one career at a time.
+
+    :param person_year_table: table of person years as list of lists, (no header)
+    :param table_header: list, the header of the person_year_table
+    :param convicted_index: dict, as made by convicted_colleague_index
+    :return: dict of form {(fullname, year): int, count of colleagues convicted in that year}
+    """
+    surnames_col_idx, given_names_col_idx = table_header.index("surnames"), table_header.index("given names")
+    yr_col_idx = table_header.index("year")
+
+    party_years = {}
+    for pid, fullname, party, yr in party_year_memberships(person_year_table, table_header):
+        party_years.setdefault(fullname, set()).add((party, yr))
+
+    exposure_dict = {}
+    for py in person_year_table:
+        fullname, yr = py[surnames_col_idx] + " " + py[given_names_col_idx], int(py[yr_col_idx])
+        if (fullname, yr) in exposure_dict:
+            continue
+        # NB: convicted people's party-years in the index may go beyond the table, e.g. their time as ministers
+        own_party_years = party_years.get(fullname, set()) | convicted_index.get(fullname, (None, set()))[1]
+        count = sum(1 for name, (conv_yr, conv_party_years) in convicted_index.items()
+                    if conv_yr == yr and name != fullname and not own_party_years.isdisjoint(conv_party_years))
+        if count:
+            exposure_dict[(fullname, yr)] = count
+    return exposure_dict
+
+
+def make_colleague_graph(person_year_table, table_header):
+    """
+    Make a weighted co-membership graph, where nodes are legislators (by PersID) and the weight of the edge between
+    two legislators is the number of party-years that they shared.
+
+    The graph is a dict of form
+        {"names": {PersID: fullname},
+         "bins": {(party, year): set of PersIDs},
+         "adjacency": {PersID: {PersID: weight}}}
+    where the party-year bins are kept so that new person-years can later be added without rebuilding the graph, see
+    update_colleague_graph.
+
+    :param person_year_table: table of person years as list of lists, (no header)
+    :param table_header: list, the header of the person_year_table
+    :return: the graph, as a dict
+    """
+    graph = {"names": {}, "bins": {}, "adjacency": {}}
+    update_colleague_graph(graph, person_year_table, table_header)
+    return graph
+
+
+def update_colleague_graph(graph, new_person_years, table_header):
+    """
+    Add person-years to the co-membership graph, in place. Each new (person, party-year) adds one unit of weight to the
+    edges between that person and everyone already in that party-year, so appending one legislature only costs as
+    much as that legislature's party-years, not as much as the whole graph.
+
+    NB: person-years that are already in the graph are ignored, so it's safe to pass overlapping tables.
+
+    :param graph: dict, as made by make_colleague_graph
+    :param new_person_years: table of person years as list of lists, (no header)
+    :param table_header: list, the header of the person_year_table
+    :return: set of PersIDs whose edges changed, i.e. the nodes whose network covariates need recomputing
+    """
+    names, bins, adjacency = graph["names"], graph["bins"], graph["adjacency"]
+    touched = set()
+
+    for pid, fullname, party, yr in party_year_memberships(new_person_years, table_header):
+        names[pid] = fullname
+        adjacency.setdefault(pid, {})
+        members = bins.setdefault((party, yr), set())
+        if pid in members:
+            continue
+        for colleague in members:
+            adjacency[pid][colleague] = adjacency[pid].get(colleague, 0) + 1
+            adjacency[colleague][pid] = adjacency[colleague].get(pid, 0) + 1
+            touched.add(colleague)
+        members.add(pid)
+        touched.add(pid)
+
+    return touched
+
+
+def save_colleague_graph(graph, out_path):
+    """
+    Write the co-membership graph to disk in compressed sparse row form (as .npz): node IDs and names, then the
+    adjacency as indptr/indices/weights arrays, then the party-year bins in the same row-pointer form.
+
+    :param graph: dict, as made by make_colleague_graph
+    :param out_path: str, path where we want the graph to live; should end in .npz
+    :return: None
+    """
+    import numpy as np  # NB: imported here, see convicted_colleague_exposure
+
+    node_ids = sorted(graph["adjacency"])
+    node_idx = {pid: idx for idx, pid in enumerate(node_ids)}
+
+    indptr, indices, weights = [0], [], []
+    for pid in node_ids:
+        neighbours = sorted(graph["adjacency"][pid], key=node_idx.get)
+        indices.extend(node_idx[n] for n in neighbours)
+        weights.extend(graph["adjacency"][pid][n] for n in neighbours)
+        indptr.append(len(indices))
+
+    bin_keys = sorted(graph["bins"])
+    bin_indptr, bin_members = [0], []
+    for key in bin_keys:
+        bin_members.extend(sorted(node_idx[pid] for pid in graph["bins"][key]))
+        bin_indptr.append(len(bin_members))
+
+    np.savez_compressed(out_path,
+                        node_ids=np.array(node_ids, dtype=str),
+                        names=np.array([graph["names"][pid] for pid in node_ids], dtype=str),
+                        indptr=np.array(indptr, dtype=np.int64), indices=np.array(indices, dtype=np.int32),
+                        weights=np.array(weights, dtype=np.int32),
+                        bin_parties=np.array([k[0] for k in bin_keys], dtype=str),
+                        bin_years=np.array([k[1] for k in bin_keys], dtype=np.int32),
+                        bin_indptr=np.array(bin_indptr, dtype=np.int64),
+                        bin_members=np.array(bin_members, dtype=np.int32))
+
+
+def load_colleague_graph(in_path):
+    """
+    Read a co-membership graph written by save_colleague_graph back into its dict form.
+
+    :param in_path: str, path to the .npz file
+    :return: the graph, as a dict
+    """
+    import numpy as np  # NB: imported here, see convicted_colleague_exposure
+
+    with np.load(in_path, allow_pickle=False) as arrays:
+        node_ids = [str(pid) for pid in arrays["node_ids"]]
+        names = {pid: str(name) for pid, name in zip(node_ids, arrays["names"])}
+        indptr, indices, weights = arrays["indptr"], arrays["indices"], arrays["weights"]
+        adjacency = {pid: {node_ids[n]: int(w) for n, w in zip(indices[indptr[i]:indptr[i + 1]],
+                                                               weights[indptr[i]:indptr[i + 1]])}
+                     for i, pid in enumerate(node_ids)}
+        bin_indptr, bin_members = arrays["bin_indptr"], arrays["bin_members"]
+        bins = {(str(party), int(yr)): {node_ids[m] for m in bin_members[bin_indptr[i]:bin_indptr[i + 1]]}
+                for i, (party, yr) in enumerate(zip(arrays["bin_parties"], arrays["bin_years"]))}
+    return {"names": names, "bins": bins, "adjacency": adjacency}
+
+
+def colleague_network_covariates(graph, year, pids=None):
+    """
+    Compute network covariates from the co-membership graph: degree (number of distinct colleagues), strength (the
+    sum of edge weights, i.e. shared party-years) and the share of colleagues with a final guilty verdict in or before
+    the given year.
+
+    NB: the graph holds every party-year it has seen, so for a given year the degree also counts colleagues from later
+        years. When the graph is only ever extended with the newest legislature this is not a problem.
+
+    :param graph: dict, as made by make_colleague_graph
+    :param year: int, the year up to which (inclusive) we count convictions
+    :param pids: iterable of PersIDs to compute covariates for, e.g. the set returned by update_colleague_graph; if
+                 None, compute for everyone in the graph
+    :return: dict of form {PersID: {"degree": int, "strength": int, "conv_neighbour_share": float}}
+    """
+    convicted = {name for name, date in final_guilty_verdict.items() if numeric_date(date)[0] <= int(year)}
+    pids = graph["adjacency"] if pids is None else pids
+
+    covariates = {}
+    for pid in pids:
+        neighbours = graph["adjacency"].get(pid, {})
+        n_convicted = sum(1 for n in neighbours if graph["names"][n] in convicted)
+        covariates[pid] = {"degree": len(neighbours), "strength": sum(neighbours.values()),
+                           "conv_neighbour_share": n_convicted / len(neighbours) if neighbours else 0}
+    return covariates
+
+
+def build_colleague_graph(risk_set_path, graph_path):
+    """
+    Build the party colleague graph from scratch, off the first party switch risk set, and save it to disk.
+
+    :param risk_set_path: str, path to the first party switch risk set
+    :param graph_path: str, where to save the graph, as .npz
+    :return: None
+    """
+    with open(risk_set_path, "r") as in_f:
         pers_year_table = list(csv.reader(in_f))  # load up the table
         header = pers_year_table[0]
         pers_year_table = pers_year_table[1:]  # skip the header
 
     #colls = colleagues_person_bins(pers_year_table, header)
 
+    colleague_graph = make_colleague_graph(pers_year_table, header)
+    save_colleague_graph(colleague_graph, graph_path)
 
 
+if __name__ == "__main__":
+
+    trunk = "data/parliamentarians/"
+    risk_set_py_table_path = root + trunk + "parliamentarians_first_party_switch_risk_set.csv"
+    build_colleague_graph(risk_set_py_table_path, root + trunk + "party_colleague_graph.npz")
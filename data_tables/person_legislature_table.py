@@ -3,16 +3,24 @@ Extract relevant information from the htmls of parliamentarian-legislature profi
 in one big csv table, that we then write to disk.
 """
 
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 from zipfile import ZipFile
 import tempfile
 import os
 import csv
+import functools
+import html
+import random
 import re
 import operator
 import itertools
+import json
+import multiprocessing
+import time
+import traceback
 import helpers
-from data_tables.dicts.destination_ind_dict import destination_ind_dict
+from data_tables.dicts.destination_dict import destination_dict
+from data_tables.dates import long_ro_date, short_ro_dates, iso_date, month_year_text
 from local import root
 
 party_codes = {"FSN": "Frontul Salvării Naţionale", "PSD": "Partidul Social Democrat",
@@ -33,11 +41,80 @@ party_codes = {"FSN": "Frontul Salvării Naţionale", "PSD": "Partidul Social De
                "PAR": "Partidul Alternativa României", "UNPR": "Uniunea Națională pentru Progresul României",
                "FC": "Forţa Civică"}
 
-short_month_codes = {'ian': '01', 'feb': '02', 'mar': '03', 'apr': '04', 'mai': '05', 'iun': '06', 'iul': '07',
-                     'aug': '08', 'sep': '09', 'oct': '10', 'noi': '11', 'dec': '12'}
-
-
-def make_parliamentarians_legislature_table(zip_archive_path, outdir):
+# the counties, in the order of their constituency codes (which start at 1); due to the gradual introduction of Ilfov
+# county in the 1990s the numbering of counties differs in 1990-1992, 1992-1996 & 1996-2000, and 2000 onward
+counties_1990 = ("ALBA", "ARAD", "ARGEŞ", "BACĂU", "BIHOR", "BISTRIŢA-NĂSĂUD", "BOTOŞANI", "BRAŞOV", "BRĂILA", "BUZĂU",
+                 "CARAŞ-SEVERIN", "CĂLĂRAŞI", "CLUJ", "CONSTANŢA", "COVASNA", "DÂMBOVIŢA", "DOLJ", "GALAŢI", "GIURGIU",
+                 "GORJ", "HARGHITA", "HUNEDOARA", "IALOMIŢA", "IAŞI", "MARAMUREŞ", "MEHEDINŢI", "MUREŞ", "NEAMŢ", "OLT",
+                 "PRAHOVA", "SATU MARE", "SĂLAJ", "SIBIU", "SUCEAVA", "TELEORMAN", "TIMIŞ", "TULCEA", "VASLUI",
+                 "VÂLCEA", "VRANCEA", "BUCUREŞTI")
+counties_1992_96 = counties_1990 + ("ILFOV",)
+# Ilfov county was created in 1997, so the numbers after "Iaşi" incremented by one thereafter
+counties_2000 = counties_1990[:24] + ("ILFOV",) + counties_1990[24:] + ("DIASPORA",)
+
+# constituency names by legislature, indexed by constituency code; legislatures not in here use counties_2000
+# NB: index 0 is a placeholder, since codes start at 1
+constituency_names = {"1990-1992": (None,) + counties_1990,
+                      "1992-1996": (None,) + counties_1992_96, "1996-2000": (None,) + counties_1992_96}
+constituency_names_2000 = (None,) + counties_2000
+
+# the constituency code is the first occurence in the string of the form "nr.DIGITS"
+constituency_code_regex = re.compile(r"(?<=nr\.)[0-9]+")
+
+# the only parts of a profile page that the get_* extractors read: the "cale-right" breadcrumb, the "boxTitle" name and
+# the "boxDep clearfix" boxes; NB: the first <p> of the page, which get_constituency and get_deceased_in_office read,
+# is in the first of these boxes
+profile_regions = SoupStrainer(class_=["cale-right", "boxTitle", "boxDep clearfix"])
+
+# the regions of the raw html that the fast path (see fast_path_fields) reads; each is lazy, so it stops at the first
+# closing tag, and the fast path gives up on a region that turns out to have the same tag nested in it
+breadcrumb_regex = re.compile(r'<td[^>]*\sclass="cale-right"[^>]*>(.*?)</td>', re.S)
+title_regex = re.compile(r'<div[^>]*\sclass="boxTitle"[^>]*>(.*?)</div>', re.S)
+# the first "boxDep clearfix" box: its heading (the chamber), then everything up to the next such box (the mandate info)
+first_box_regex = re.compile(r'<div[^>]*\sclass="boxDep clearfix"[^>]*>\s*<h3[^>]*>(.*?)</h3>(.*?)'
+                             r'(?=<div[^>]*\sclass="boxDep clearfix"|\Z)', re.S)
+first_paragraph_regex = re.compile(r'<p(?:\s[^>]*)?>(.*?)</p>', re.S)
+tag_regex = re.compile(r'<[^>]*>')
+
+# the fields that the fast path gets, and the getters that get them from the soup otherwise
+fast_path_getters = {"names": "get_names", "legislature": "get_legislature", "chamber": "get_chamber",
+                     "constituency": "get_constituency", "mandate": "get_mandate",
+                     "deceased in office": "get_deceased_in_office"}
+
+# when the fast path got all its fields, the soup need only hold the boxes that the party and rank getters read; so we
+# skip the html before the first of them (i.e. the menus and the header), and strain what's left
+box_start_regex = re.compile(r'<div[^>]*\sclass="boxDep clearfix"')
+party_regions = SoupStrainer(class_="boxDep clearfix")
+
+# the headings of the "boxDep clearfix" boxes, which page_fingerprint sorts into the kinds of box below
+box_heading_regex = re.compile(r'<div[^>]*\sclass="boxDep clearfix"[^>]*>\s*<h3[^>]*>(.*?)</h3>', re.S)
+box_kinds = (("mandate", ("DEPUTAT", "SENATOR")), ("party", ("Formatiunea politica", "minoritatilor nationale")),
+             ("caucus", ("Grupul parlamentar",)))
+early_legislatures = ("1990-1992", "1992-1996")
+
+# the page layouts (as fingerprinted by page_fingerprint) that we know, and the get_* extractors that are specific to
+# each; a layout gets the generic extractor for whatever is not in here. NB: the constituency numbering and the mandate
+# defaults also differ by era, but those are lookups by legislature (see constituency_names, mandate_from_text), so
+# the eras share their getters
+# NB: for now this is only scaffolding: the one specific extractor, rank_without_caucus, gives what the generic one
+#     gives on such pages anyway, so routing changes nothing in the output. What it buys us is the per-layout build
+#     report, and a place to put the getters of a layout once they do need to differ
+page_templates = {"1990-1996: mandate+party+caucus": {},
+                  "1990-1996: mandate+party": {"get_rank_in_first_ppg": "rank_without_caucus"},
+                  "1996 onward: mandate+party+caucus": {}}
+
+# how many files the build report keeps per unknown page layout
+report_template_samples = 5
+
+# the ranks in a parliamentary party group that are above simple member
+high_ranks = ("Secretar", "Vicelider", "Lider")
+
+# how many failing files (with their error messages) the build report keeps per extractor
+report_failure_samples = 5
+
+
+def make_parliamentarians_legislature_table(zip_archive_path, outdir, workers=1, quarantine=False, strained=False,
+                                            fast=False, differential_sample=0):
     """
     This code generates a table of person-legislatures (i.e. one row for each legislature) and with each person
     legislature associates the following data:
@@ -50,15 +127,20 @@ def make_parliamentarians_legislature_table(zip_archive_path, outdir):
 
     :param zip_archive_path = path to zip archive where the htmls from the profile sites are stored
     :param outdir: directory in which we dump the parliamentarian-legislature table
+    :param workers: int, number of processes that parse pages; 1 parses them in this process
+    :param quarantine: bool, if True pages that fail to parse are left out of the table; if False (default) any such
+                       page means that the table is not written at all
+    :param strained: bool, if True only parse the regions of each page that the extractors read, see profile_regions
+    :param fast: bool, if True get the simple fields straight from the raw html with regexes, see fast_path_fields
+    :param differential_sample: int, number of pages (picked at random) on which to check that the fast path and the
+                                soup agree; their disagreements go in the build report
     :return: None
-    """
 
-    header = ["PersID", "PersLegID", "legislature", "chamber", "constituency", "surnames", "given names",
-              "mandate start", "mandate end", "death status", "entry party name", "entry party code",
-              "entry ppg rank", "entry ppg rank dates", "destination party code", "first party switch month",
-              "first party switch year", "seniority", "former switcher"]
-
-    parliamentarians = []
+    NB: every get_* extractor is timed, and its failures counted, in a build report written next to the table. Pages
+        that fail to parse go, with their stack trace, into a quarantine list, also written next to the table. Either
+        way we go through all the pages, so that one run lists every bad page; without quarantine we raise at the end.
+    """
+    report = new_build_report()
 
     # work in memory: unzip data files into tempdir, extract data, temp directory gone after use
     with tempfile.TemporaryDirectory() as tmpdirname:
@@ -67,11 +149,64 @@ def make_parliamentarians_legislature_table(zip_archive_path, outdir):
             zip_ref.extractall(tmpdirname)
 
         # iterate over htmls, extracting relevant date ;  NB: they are html.text from requests, not request object
-        for rootdir, subdirs, files in os.walk(tmpdirname):
-            for file in files:
-                file_path = rootdir + os.sep + file
-                with open(file_path, 'r') as in_f:
-                    parliamentarians.append(extract_parliamentarian_info(in_f))
+        pages = [(rootdir + os.sep + file, os.path.relpath(rootdir + os.sep + file, tmpdirname))
+                 for rootdir, subdirs, files in os.walk(tmpdirname) for file in files]
+
+        if differential_sample:
+            report["fast path disagreements"] = fast_path_disagreements(pages, differential_sample)
+
+        # NB: imap hands back the pages in the order we gave them, so the table comes out the same whatever the workers
+        page_parser = functools.partial(parse_page, strained=strained, fast=fast)
+        if workers > 1:
+            with multiprocessing.Pool(workers) as pool:
+                parsed_pages = list(pool.imap(page_parser, pages, chunksize=16))
+        else:
+            parsed_pages = map(page_parser, pages)
+
+        write_parliamentarians_legislature_table(parsed_pages, outdir, quarantine, report)
+
+
+def write_parliamentarians_legislature_table(parsed_pages, outdir, quarantine=False, report=None):
+    """
+    Make the table of person-legislatures (see make_parliamentarians_legislature_table) out of the parsed pages, and
+    write it to disk, along with the build report and the quarantine list.
+
+    :param parsed_pages: iterable of what parse_page returns, in the order in which the rows should go in the table
+    :param outdir: directory in which we dump the parliamentarian-legislature table
+    :param quarantine: bool, if True pages that failed to parse are left out of the table; if False (default) any such
+                       page means that the table is not written at all
+    :param report: dict, build report (see new_build_report) to which the reports of the pages are added; None for a
+                   new one
+    :return: None
+    """
+
+    header = ["PersID", "PersLegID", "legislature", "chamber", "constituency", "surnames", "given names",
+              "mandate start", "mandate end", "death status", "entry party name", "entry party code",
+              "entry ppg rank", "entry ppg rank dates", "destination party code", "first party switch month",
+              "first party switch year", "seniority", "former switcher"]
+
+    parliamentarians, quarantined = [], []
+    if report is None:
+        report = new_build_report()
+
+    for parl, page_report, failure in parsed_pages:
+        merge_build_reports(report, page_report)
+        if failure is None:
+            parliamentarians.append(parl)
+        else:
+            quarantined.append(failure)
+
+    report_path = outdir + 'parliamentarians_legislature_table_build_report.json'
+    write_build_report(report, report_path)
+    quarantine_path = outdir + 'parliamentarians_legislature_table_quarantine.json'
+    if quarantined:
+        with open(quarantine_path, 'w') as out_f:
+            json.dump(quarantined, out_f, indent=2, ensure_ascii=False)
+        print(str(len(quarantined)) + " PAGES QUARANTINED, SEE " + quarantine_path)
+        if not quarantine:
+            raise ValueError(str(len(quarantined)) + " PAGES FAILED TO PARSE, SEE " + quarantine_path)
+    elif os.path.isfile(quarantine_path):  # don't leave the quarantine list of an earlier build lying around
+        os.remove(quarantine_path)
 
     # build the output table
     parl_leg_table = []
@@ -99,25 +234,215 @@ def make_parliamentarians_legislature_table(zip_archive_path, outdir):
             writer.writerow(parl_leg)
 
 
-def extract_parliamentarian_info(html_text):
+def new_build_report():
+    """
+    Return an empty build report, which run_extractor fills in as pages are parsed. Per extractor, it holds the number
+    of calls, the total and the slowest time (and the file that took it), and the number of failures, with a sample of
+    the failing files and their errors. Per field, it also counts the pages on which the fast path missed it; per
+    page layout (see page_fingerprint), the pages, their failures, the time taken to parse them, and how many other
+    boxes (i.e. of none of box_kinds) they had.
+    """
+    return {"pages": 0, "failed pages": 0, "fast path misses": {}, "templates": {}, "extractors": {}}
+
+
+def new_extractor_stats():
+    """Return the empty entry of one extractor in the build report."""
+    return {"calls": 0, "seconds": 0.0, "slowest seconds": 0.0, "slowest file": None, "failures": 0,
+            "failure samples": []}
+
+
+def new_template_stats(template):
+    """Return the empty entry of one page layout in the build report."""
+    return {"known": template in page_templates, "pages": 0, "failed pages": 0, "seconds": 0.0,
+            "pages with other boxes": 0, "other boxes": 0, "sample files": []}
+
+
+def run_extractor(report, file_name, extractor, *args, **kwargs):
+    """
+    Call an extractor on a page and, if we're keeping a build report, log in it how long the call took and whether it
+    failed.
+
+    :param report: dict, as made by new_build_report; None to just call the extractor
+    :param file_name: str, name of the file that the page comes from
+    :param extractor: function, e.g. get_names
+    :param args: the arguments of the extractor
+    :param kwargs: the keyword arguments of the extractor
+    :return: whatever the extractor returns; its errors are logged, then raised again
+    """
+    if report is None:
+        return extractor(*args, **kwargs)
+
+    stats = report["extractors"].setdefault(extractor.__name__, new_extractor_stats())
+    start = time.perf_counter()
+    try:
+        return extractor(*args, **kwargs)
+    except Exception as e:
+        stats["failures"] += 1
+        if len(stats["failure samples"]) < report_failure_samples:
+            stats["failure samples"].append({"file": file_name, "error": type(e).__name__ + ": " + str(e)})
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        stats["calls"] += 1
+        stats["seconds"] += seconds
+        if seconds > stats["slowest seconds"]:
+            stats["slowest seconds"], stats["slowest file"] = seconds, file_name
+
+
+def merge_build_reports(report, other_report):
+    """Add the counts and times of one build report (e.g. that of a single page) into another, in place."""
+    report["pages"] += other_report["pages"]
+    report["failed pages"] += other_report["failed pages"]
+    for field, misses in other_report["fast path misses"].items():
+        report["fast path misses"][field] = report["fast path misses"].get(field, 0) + misses
+    for template, other_stats in other_report["templates"].items():
+        stats = report["templates"].setdefault(template, new_template_stats(template))
+        for key in ["pages", "failed pages", "seconds", "pages with other boxes", "other boxes"]:
+            stats[key] += other_stats[key]
+        free_samples = report_template_samples - len(stats["sample files"])
+        stats["sample files"].extend(other_stats["sample files"][:max(free_samples, 0)])
+    for name, other_stats in other_report["extractors"].items():
+        stats = report["extractors"].setdefault(name, new_extractor_stats())
+        for key in ["calls", "seconds", "failures"]:
+            stats[key] += other_stats[key]
+        if other_stats["slowest seconds"] > stats["slowest seconds"]:
+            stats["slowest seconds"] = other_stats["slowest seconds"]
+            stats["slowest file"] = other_stats["slowest file"]
+        free_samples = report_failure_samples - len(stats["failure samples"])
+        stats["failure samples"].extend(other_stats["failure samples"][:max(free_samples, 0)])
+
+
+def write_build_report(report, out_path):
+    """Dump the build report to disk as json, and print a one-line summary per extractor."""
+    with open(out_path, 'w') as out_f:
+        json.dump(report, out_f, indent=2, ensure_ascii=False)
+
+    print("PARSED " + str(report["pages"] - report["failed pages"]) + " OF " + str(report["pages"]) + " PAGES")
+    for name, stats in report["extractors"].items():
+        print("    " + name + ": " + str(round(stats["seconds"] / max(stats["calls"], 1) * 1e6, 1)) + " us/page, " +
+              "slowest " + str(round(stats["slowest seconds"] * 1e3, 1)) + " ms (" + str(stats["slowest file"]) +
+              "), " + str(stats["failures"]) + " failures")
+    for template, stats in report["templates"].items():
+        line = "    " + template + ": " + str(stats["pages"]) + " pages, " + \
+            str(round(stats["pages"] / max(stats["seconds"], 1e-9), 1)) + " pages/s, " + str(stats["failed pages"]) + \
+            " failed"
+        if stats["other boxes"]:
+            line += ", " + str(stats["pages with other boxes"]) + " pages with " + str(stats["other boxes"]) + \
+                " other boxes"
+        print(line if stats["known"] else "    NEW PAGE LAYOUT" + line[3:] + ", e.g. " + str(stats["sample files"]))
+    for field, misses in report["fast path misses"].items():
+        print("    fast path missed " + field + " on " + str(misses) + " pages")
+    if "fast path disagreements" in report:
+        print(str(len(report["fast path disagreements"])) + " FAST PATH DISAGREEMENTS WITH THE SOUP")
+
+
+def parse_page(page, strained=False, fast=False, html_text=None):
+    """
+    Parse one profile page, catching whatever goes wrong; this is what each worker of the build runs.
+
+    :param page: 2-tuple of (path to the html file, name of the file as it goes in the reports)
+    :param strained: bool, whether to only parse the regions of the page that the extractors read
+    :param fast: bool, whether to get the simple fields with regexes, see fast_path_fields
+    :param html_text: str, the html of the page if we already have it in memory, in which case the file isn't read
+    :return: 3-tuple of (dict of extracted data or None, build report of this page, failure or None), where the
+             failure is a dict with the file name, the extractor that failed, the error and its stack trace
+    """
+    file_path, file_name = page
+    report = new_build_report()
+    report["pages"] = 1
+    start, template, other_boxes = time.perf_counter(), None, 0
+    try:
+        if html_text is None:
+            with open(file_path, 'r') as in_f:
+                html_text = in_f.read()
+        template, other_boxes = page_fingerprint(html_text)
+        return extract_parliamentarian_info(html_text, report, file_name, strained, fast, template), report, None
+    except Exception as e:
+        report["failed pages"] = 1
+        failed = [name for name, stats in report["extractors"].items() if stats["failures"]]
+        return None, report, {"file": file_name, "extractor": failed[0] if failed else None, "template": template,
+                              "error": type(e).__name__ + ": " + str(e), "traceback": traceback.format_exc()}
+    finally:
+        # NB: runs before the return above hands the report back, so the page is logged under its layout either way
+        stats = report["templates"].setdefault(str(template), new_template_stats(template))
+        stats["pages"], stats["failed pages"] = 1, report["failed pages"]
+        stats["seconds"] = time.perf_counter() - start
+        stats["pages with other boxes"], stats["other boxes"] = int(other_boxes > 0), other_boxes
+        if not stats["known"]:
+            stats["sample files"].append(file_name)
+
+
+def parse_page_worker(page_queue, result_queue, strained=False, fast=False):
+    """
+    Parse the pages that come down a queue until a None comes, putting each result on another queue; this is what each
+    parser process of the scrape-and-parse pipeline runs, see scrape.scrape.scrape_and_parse_parliamentarians.
+
+    :param page_queue: multiprocessing.Queue of 3-tuples of (number of the page, name of the file, html text)
+    :param result_queue: multiprocessing.Queue, on which go 2-tuples of (number of the page, what parse_page returns),
+                         and then a None once the worker is done
+    :param strained: bool, whether to only parse the regions of the page that the extractors read
+    :param fast: bool, whether to get the simple fields with regexes, see fast_path_fields
+    :return: None
+    """
+    for page_number, file_name, html_text in iter(page_queue.get, None):
+        result_queue.put((page_number, parse_page((None, file_name), strained, fast, html_text)))
+    result_queue.put(None)
+
+
+def extract_parliamentarian_info(html_text, report=None, file_name=None, strained=False, fast=False,
+                                 template=None):
     """
     Get the parliamentarian's legislature, chamber, name, mandate boundaries (i.e start and end), the name of the
     party with which they entered parliament, and the date of the the first time they switched parties (if this
     occurred).
 
     :param html_text: str, html.text of parliamentarian profile site
+    :param report: dict, build report (see new_build_report) in which to log the time and failures of each extractor;
+                   None to not keep one
+    :param file_name: str, name of the file that the page comes from, for the build report
+    :param strained: bool, if True only build the parts of the tree that the extractors read (see profile_regions),
+                     rather than the whole page with its menus, scripts and footer
+    :param fast: bool, if True get the names, legislature, chamber, constituency, mandate and death in office straight
+                 from the raw html (see fast_path_fields), and only go to the soup for those the fast path misses
+    :param template: str, the layout of the page (see page_fingerprint), which picks the extractors specific to it from
+                     page_templates; None, or a layout we don't know, gets the generic extractors
     :return: dict with desired data per parliamentarian-legislature
     """
-    soup = BeautifulSoup(html_text, 'html.parser')
-
-    surnames, given_names = get_names(soup)
-    legislature = get_legislature(soup)
-    chamber = get_chamber(soup)
-    constituency = get_constituency(soup)
-    mandate_start, mandate_end = get_mandate(soup)
-    deceased_in_office = get_deceased_in_office(soup)
-    entry_party, entry_party_code, first_party_switch, dest_party_code = get_party_and_first_switch(soup)
-    ppg1_rank, ppg1_dates = get_rank_in_first_ppg(soup, mandate_start, mandate_end, surnames, given_names)
+    extractors = {name: globals()[extractor_name] for name, extractor_name in page_templates.get(template, {}).items()}
+    fields, parse_only = {}, profile_regions if strained else None
+    if fast:
+        if not isinstance(html_text, str):  # a file
+            html_text = html_text.read()
+        fields = run_extractor(report, file_name, fast_path_fields, html_text)
+        if report is not None:
+            for field in fast_path_getters:
+                if field not in fields:
+                    report["fast path misses"][field] = report["fast path misses"].get(field, 0) + 1
+        if len(fields) == len(fast_path_getters):
+            html_text, parse_only = html_text[box_start_regex.search(html_text).start():], party_regions
+
+    # NB: the parse itself is logged under "BeautifulSoup"
+    soup = run_extractor(report, file_name, BeautifulSoup, html_text, 'html.parser', parse_only=parse_only)
+
+    # whatever the fast path didn't get, get from the soup
+    for field, getter_name in fast_path_getters.items():
+        if field not in fields:
+            fields[field] = run_extractor(report, file_name, globals()[getter_name], soup)
+    surnames, given_names = fields["names"]
+    legislature, chamber, constituency = fields["legislature"], fields["chamber"], fields["constituency"]
+    mandate_start, mandate_end = fields["mandate"]
+    deceased_in_office = fields["deceased in office"]
+    entry_party, entry_party_code, first_party_switch, dest_party_code = run_extractor(report, file_name,
+                                                                                       get_party_and_first_switch,
+                                                                                       soup, surnames, given_names,
+                                                                                       legislature)
+    rank_extractor = extractors.get("get_rank_in_first_ppg", get_rank_in_first_ppg)
+    ppg1_rank, ppg1_dates = run_extractor(report, file_name, rank_extractor, soup, mandate_start, mandate_end,
+                                          surnames, given_names)
+
+    # NB: the tree is full of references between parents, children and siblings, so it would otherwise only be freed
+    #     whenever the garbage collector gets round to it; everything we keep from it is plain strings
+    soup.decompose()
 
     return {"legislature": legislature, "chamber": chamber, "constituency": constituency, "surnames": surnames,
             "given names": given_names, "mandate start": mandate_start, "mandate end": mandate_end,
@@ -129,6 +454,107 @@ def extract_parliamentarian_info(html_text):
             "first party switch year": first_party_switch["year"]}
 
 
+def page_fingerprint(html_text):
+    """
+    Sort a page into a layout, cheaply (a couple of regexes over the raw html, no soup), so that the build can route it
+    to the extractors for its layout, and flag the pages of a layout we haven't seen before, rather than have them fail
+    somewhere deep in a getter.
+
+    NB: real pages carry other boxes too (e.g. "Comisii permanente"), in no fixed order, which the getters skip over by
+        their headings; so the layout only says which of box_kinds the page has, in the order of box_kinds, and the
+        boxes of any other kind are just counted.
+
+    :param html_text: str, html.text of parliamentarian profile site
+    :return: 2-tuple of (str, of the form "ERA: BOX KINDS", e.g. "1996 onward: mandate+party+caucus", where the era is
+             "?" if there is no legislature in the breadcrumb; int, how many boxes are of none of box_kinds)
+    """
+    breadcrumb = breadcrumb_regex.search(html_text)
+    try:
+        legislature = legislature_from_text(region_text(breadcrumb[1])) if breadcrumb else None
+    except IndexError:
+        legislature = None
+    era = "?" if legislature is None else "1990-1996" if legislature in early_legislatures else "1996 onward"
+
+    kinds, other_boxes = set(), 0
+    for heading in box_heading_regex.findall(html_text):
+        kind = next((kind for kind, markers in box_kinds if any(marker in heading for marker in markers)), None)
+        if kind is None:
+            other_boxes += 1
+        else:
+            kinds.add(kind)
+    return era + ": " + "+".join(kind for kind, _ in box_kinds if kind in kinds), other_boxes
+
+
+def region_text(region_html):
+    """Strip the tags out of a region of raw html and unescape its entities, i.e. what the soup would give as .text"""
+    return html.unescape(tag_regex.sub('', region_html))
+
+
+def fast_path_fields(html_text):
+    """
+    Get the names, legislature, chamber, constituency, mandate boundaries and death in office of a profile page with
+    regexes over the raw html, without building a soup. Each field is got from its region of the page by the same
+    *_from_text function that the get_* extractor uses, so the two agree as long as the region is found.
+
+    A field is left out if its region isn't there, or isn't laid out as we expect (e.g. it has the same tag nested in
+    it), or the *_from_text function can't make sense of it; extract_parliamentarian_info then gets it from the soup.
+
+    :param html_text: str, html.text of parliamentarian profile site
+    :return: dict with (some of) the keys of fast_path_getters, valued as the matching get_* extractors would return
+    """
+    fields = {}
+
+    def fast_field(field, pattern, from_text, *args, nested=None):
+        match = pattern.search(html_text)
+        if match and (nested is None or nested not in match[1]):
+            try:
+                fields[field] = from_text(region_text(match[1]), *args)
+            except Exception:  # NB: leave it to the soup, which then fails (and gets logged) in its own extractor
+                pass
+
+    fast_field("names", title_regex, names_from_text, nested="<div")
+    fast_field("legislature", breadcrumb_regex, legislature_from_text, nested="<td")
+    fast_field("deceased in office", first_paragraph_regex, deceased_from_text, nested="<p")
+    if "legislature" in fields:
+        fast_field("constituency", first_paragraph_regex, constituency_from_text, fields["legislature"], nested="<p")
+
+    first_box = first_box_regex.search(html_text)
+    if first_box and "<h3" not in first_box[1]:
+        fields["chamber"] = chamber_from_text(region_text(first_box[1]))
+        if "legislature" in fields:
+            try:
+                fields["mandate"] = mandate_from_text(region_text(first_box[2]), fields["legislature"])
+            except Exception:
+                pass
+    return fields
+
+
+def fast_path_disagreements(pages, sample_size, seed=0):
+    """
+    Run both the fast path and the get_* extractors on a random sample of pages, and list where they disagree.
+
+    :param pages: list of 2-tuples of (path to the html file, name of the file as it goes in the reports)
+    :param sample_size: int, number of pages to check
+    :param seed: int, seed of the random sample, so that a check can be repeated
+    :return: list of dicts, each with the file, the field, and what the fast path and the soup made of it; a field that
+             the fast path missed is not a disagreement (the build counts those separately)
+    """
+    disagreements = []
+    for file_path, file_name in random.Random(seed).sample(pages, min(sample_size, len(pages))):
+        with open(file_path, 'r') as in_f:
+            html_text = in_f.read()
+        soup = BeautifulSoup(html_text, 'html.parser')
+        for field, fast_value in fast_path_fields(html_text).items():
+            try:
+                soup_value = globals()[fast_path_getters[field]](soup)
+            except Exception as e:
+                soup_value = type(e).__name__ + ": " + str(e)
+            if fast_value != soup_value:
+                disagreements.append({"file": file_name, "field": field, "fast": fast_value, "soup": soup_value})
+        soup.decompose()
+    return disagreements
+
+
 def get_names(soup):
     """
     Get the surnames and given names of the parliamentarian-legislature.
@@ -136,7 +562,12 @@ def get_names(soup):
     :param soup: a BeautifulSoup object
     :return: a tuple of strings, first string is surnames (all uppercase) second string is given names
     """
-    names = soup.find('div', class_="boxTitle").text.replace('-', ' ').split()
+    return names_from_text(soup.find('div', class_="boxTitle").text)
+
+
+def names_from_text(title_text):
+    """Split the text of the "boxTitle" of a profile page into surnames and given names, see get_names."""
+    names = title_text.replace('-', ' ').split()
     surnames, given_names = ' '.join([n for n in names if n.isupper()]), ' '.join([n for n in names if not n.isupper()])
     surnames, given_names = ad_hoc_name_corrector(surnames, given_names)
     return surnames, given_names
@@ -187,9 +618,14 @@ def get_legislature(soup):
     :return: a string in format START YEAR- END YEAR, e.g. 1992-1996
     """
 
+    return legislature_from_text(soup.find('td', class_="cale-right").text)
+
+
+def legislature_from_text(breadcrumb_text):
+    """Get the legislature out of the text of the "cale-right" breadcrumb of a profile page, see get_legislature."""
     # get legislature; all the filters there are to extract just the year from the text below
     # Prima pagina > Legislatura 1990-1992 / Camera Deputatilor > Viorica Edelhauser
-    leg = soup.find('td', class_="cale-right").text.split('>')[1].split('/')[0].replace('Legislatura', '').strip()
+    leg = breadcrumb_text.split('>')[1].split('/')[0].replace('Legislatura', '').strip()
     leg = leg.replace("prezent", "2020")
     return leg
 
@@ -203,9 +639,13 @@ def get_chamber(soup):
     :return: str, "DEPUTAT" or "SENATOR"
     """
 
+    return chamber_from_text(soup.find('div', class_="boxDep clearfix").h3.text)
+
+
+def chamber_from_text(chamber_text):
+    """Get the chamber out of the heading of the first "boxDep clearfix" box of a profile page, see get_chamber."""
     # chamber text always includes "DEPUTAT" or "SENATOR" but sometimes other info too, such as whether the
     # parliamentarian was speaker or secretary of the chamber. Code below excludes all that other info
-    chamber_text = soup.find('div', class_="boxDep clearfix").h3.text
     if "DEPUTAT" in chamber_text:
         chamber = "DEPUTAT"
     elif "SENATOR" in chamber_text:
@@ -222,53 +662,28 @@ def get_constituency(soup):
     :param soup: a BeautifulSoup object
     :return: str, the name of the constituency
     """
+    return constituency_from_text(soup.find('p').text, get_legislature(soup))
+
+
+def constituency_from_text(constituency_text, legislature):
+    """
+    Get the constituency out of the text of the first <p> of a profile page, see get_constituency.
 
-    # due to the gradual introduction of Ilfov county in the 1990s the numbering of counties differs in 1990-1992,
-    # 1992-1996 & 1996-2000, and 2000 onward
-    const_dict_1990 = {1: "ALBA", 2: "ARAD", 3: "ARGEŞ", 4: "BACĂU", 5: "BIHOR", 6: "BISTRIŢA-NĂSĂUD", 7: "BOTOŞANI",
-                       8: "BRAŞOV", 9: "BRĂILA", 10: "BUZĂU", 11: "CARAŞ-SEVERIN", 12: "CĂLĂRAŞI", 13: "CLUJ",
-                       14: "CONSTANŢA", 15: "COVASNA", 16: "DÂMBOVIŢA", 17: "DOLJ", 18: "GALAŢI", 19: "GIURGIU",
-                       20: "GORJ", 21: "HARGHITA", 22: "HUNEDOARA", 23: "IALOMIŢA", 24: "IAŞI",
-                       25: "MARAMUREŞ", 26: "MEHEDINŢI", 27: "MUREŞ", 28: "NEAMŢ", 29: "OLT", 30: "PRAHOVA",
-                       31: "SATU MARE", 32: "SĂLAJ", 33: "SIBIU", 34: "SUCEAVA", 35: "TELEORMAN", 36: "TIMIŞ",
-                       37: "TULCEA", 38: "VASLUI", 39: "VÂLCEA", 40: "VRANCEA", 41: "BUCUREŞTI"}
-
-    const_dict_1992_96 = {1: "ALBA", 2: "ARAD", 3: "ARGEŞ", 4: "BACĂU", 5: "BIHOR", 6: "BISTRIŢA-NĂSĂUD", 7: "BOTOŞANI",
-                          8: "BRAŞOV", 9: "BRĂILA", 10: "BUZĂU", 11: "CARAŞ-SEVERIN", 12: "CĂLĂRAŞI", 13: "CLUJ",
-                          14: "CONSTANŢA", 15: "COVASNA", 16: "DÂMBOVIŢA", 17: "DOLJ", 18: "GALAŢI", 19: "GIURGIU",
-                          20: "GORJ", 21: "HARGHITA", 22: "HUNEDOARA", 23: "IALOMIŢA", 24: "IAŞI",
-                          25: "MARAMUREŞ", 26: "MEHEDINŢI", 27: "MUREŞ", 28: "NEAMŢ", 29: "OLT", 30: "PRAHOVA",
-                          31: "SATU MARE", 32: "SĂLAJ", 33: "SIBIU", 34: "SUCEAVA", 35: "TELEORMAN", 36: "TIMIŞ",
-                          37: "TULCEA", 38: "VASLUI", 39: "VÂLCEA", 40: "VRANCEA", 41: "BUCUREŞTI", 42: "ILFOV"}
-
-    # Ilfov county was created in 1997, so the numbers after "Iaşi" incremented by one thereafter
-    const_dict_2000 = {1: "ALBA", 2: "ARAD", 3: "ARGEŞ", 4: "BACĂU", 5: "BIHOR", 6: "BISTRIŢA-NĂSĂUD", 7: "BOTOŞANI",
-                       8: "BRAŞOV", 9: "BRĂILA", 10: "BUZĂU", 11: "CARAŞ-SEVERIN", 12: "CĂLĂRAŞI", 13: "CLUJ",
-                       14: "CONSTANŢA", 15: "COVASNA", 16: "DÂMBOVIŢA", 17: "DOLJ", 18: "GALAŢI", 19: "GIURGIU",
-                       20: "GORJ", 21: "HARGHITA", 22: "HUNEDOARA", 23: "IALOMIŢA", 24: "IAŞI", 25: "ILFOV",
-                       26: "MARAMUREŞ", 27: "MEHEDINŢI", 28: "MUREŞ", 29: "NEAMŢ", 30: "OLT", 31: "PRAHOVA",
-                       32: "SATU MARE", 33: "SĂLAJ", 34: "SIBIU", 35: "SUCEAVA", 36: "TELEORMAN", 37: "TIMIŞ",
-                       38: "TULCEA", 39: "VASLUI", 40: "VÂLCEA", 41: "VRANCEA", 42: "BUCUREŞTI", 43: "DIASPORA"}
-
-    constituency_text = soup.find('p').text
+    :param constituency_text: str, the text of the first <p>
+    :param legislature: str, e.g. "2004-2008", since constituency codes changed over time
+    :return: str, the name of the constituency
+    """
     if "la nivel" in constituency_text:
         # these are national minority representatives in the lower house, who are voted for one, national constituency
         return "MINORITĂŢI"
     else:
-        # the constituency code is the first occurence in the string of the form "nr.DIGITS", where the digits range
-        # from 1 to 43. Codes uniquely map to constituency names
-        constituency_code = int(re.search("(?<=nr\.)[0-9]+", constituency_text)[0])
+        # the digits of the constituency code range from 1 to 43. Codes uniquely map to constituency names
+        constituency_code = int(constituency_code_regex.search(constituency_text)[0])
         # error out if getting nonsensical codes
         if not 1 <= constituency_code <= 43:
             print(constituency_text)
             raise ValueError("NONSENSICAL CODE ERROR")
-        legislature = get_legislature(soup)
-        if legislature == "1990-1992":
-            return const_dict_1990[constituency_code]
-        elif legislature in {"1992-1996", "1996-2000"}:
-            return const_dict_1992_96[constituency_code]
-        else:
-            return const_dict_2000[constituency_code]
+        return constituency_names.get(legislature, constituency_names_2000)[constituency_code]
 
 
 def get_deceased_in_office(soup):
@@ -278,8 +693,11 @@ def get_deceased_in_office(soup):
     :param soup: a BeautifulSoup object
     :return: str, "deceased in office" or "no death in office"
     """
+    return deceased_from_text(soup.find('p').text)
+
 
-    mandate_text = soup.find('p').text
+def deceased_from_text(mandate_text):
+    """Whether the text of the first <p> of a profile page says that they died in office, see get_deceased_in_office."""
     if "decedat" in mandate_text:
         return "deceased in office"
     else:
@@ -294,12 +712,17 @@ def get_mandate(soup):
     :param soup: a BeautifulSoup object
     :return: a tuple of two strings, first is mandate start, second is mandate end, each in format YEAR-MONTH-DAY
     """
+    return mandate_from_text(soup.find('div', class_="boxDep clearfix").contents[2].text, get_legislature(soup))
+
 
-    ro_months = {"ianuarie": '01', "februarie": '02', "martie": '03', "aprilie": "04", "mai": '05', "iunie": '06',
-                 "iulie": '07', "august": '08', "septembrie": "09", "octombrie": "10", "noiembrie": '11',
-                 "decembrie": '12'}
+def mandate_from_text(mandate_info, legislature):
+    """
+    Get the mandate boundaries out of the mandate info of a profile page, see get_mandate.
 
-    legislature = get_legislature(soup)
+    :param mandate_info: str, text that holds the "data validarii" and "data încetarii" of the mandate, if any
+    :param legislature: str, e.g. "2004-2008", for the default mandate boundaries
+    :return: a tuple of two strings, mandate start and end, each in format YEAR-MONTH-DAY
+    """
     leg_start, leg_end = int(legislature.split('-')[0]), legislature.split('-')[1]
 
     # by default mandates end in December of election year and begin in January of subsequent year; set day to November
@@ -311,22 +734,18 @@ def get_mandate(soup):
     else:
         mandate_start, mandate_end = str(leg_start) + "-12-01", leg_end + "-11-30"
 
-    mandate_info = soup.find('div', class_="boxDep clearfix").contents[2].text
+    # NB: dates here come as e.g. "data validarii: 12 decembrie 2004"
     if "validarii:" in mandate_info:
-        start_date = ' '.join(mandate_info.split("validarii:")[1].split(' - ')[0].split())
-        day, month, year = start_date.split()[0], start_date.split()[1], start_date.split()[2][:4]
-        month = ro_months[month]
-        mandate_start = '-'.join([year, month, day])
+        year, month, day = long_ro_date(mandate_info.split("validarii:")[1].split(' - ')[0])
+        mandate_start = '-'.join([str(year), str(month).zfill(2), str(day)])
     if "încetarii" in mandate_info:
-        end_date = ' '.join(mandate_info.split("încetarii")[1].split(' - ')[0].split())
-        day, month, year = end_date.split()[1], end_date.split()[2], end_date.split()[3][:4]
-        month = ro_months[month]
-        mandate_end = '-'.join([year, month, day])
+        year, month, day = long_ro_date(mandate_info.split("încetarii")[1].split(' - ')[0])
+        mandate_end = '-'.join([str(year), str(month).zfill(2), str(day)])
 
     return mandate_start, mandate_end
 
 
-def get_party_and_first_switch(soup):
+def get_party_and_first_switch(soup, surnames=None, given_names=None, legislature=None):
     """
     Identifies the party on whose ticket a legislator was elected, and if that legislator switches parties, it also
     identifies the month and year of that switch and receiving party.
@@ -334,6 +753,9 @@ def get_party_and_first_switch(soup):
     NB: this only considers the first party switch, NOT multiple switches.
 
     :param soup: a BeautifulSoup object
+    :param surnames: str; if None (as with given_names and legislature) it is got from the soup
+    :param given_names: str
+    :param legislature: str
     :return: a 4-tuple of strings: entry party name, entry party code, first switch date, and destination party code
     """
 
@@ -358,14 +780,8 @@ def get_party_and_first_switch(soup):
                     # sometimes parties simply change names -- ignore these; the form of the text string from which
                     # we extract the date is "  iun. 2001PSD Partidul Social Democrat  din  iun. 2001"
                     if len(split_by_departures) > 1 and 'se transforma' not in split_by_departures[1]:
-                        departure_date = split_by_departures[1].strip()
-
-                        departure_month = departure_date.split()[0].replace('.', '').strip()
-                        departure_month = short_month_codes[departure_month]
-
-                        departure_year = departure_date.split()[1][:4]
-
-                        first_switch_date = {'month': departure_month, 'year': departure_year}
+                        departure_year, departure_month = short_ro_dates(split_by_departures[1])[0]
+                        first_switch_date = {'month': str(departure_month).zfill(2), 'year': str(departure_year)}
 
                         dest_party_name, dest_party_code = destination_party_name(split_by_departures)
 
@@ -398,8 +814,10 @@ def get_party_and_first_switch(soup):
             first_switch_date, dest_party_code = {"month": '', "year": ''}, ""
 
     # run the data past the ad-hoc party name and switch corrector
-    surnames, given_names = get_names(soup)
-    legislature = get_legislature(soup)
+    if surnames is None or given_names is None:
+        surnames, given_names = get_names(soup)
+    if legislature is None:
+        legislature = get_legislature(soup)
     corrected_switch_data = adhoc_party_and_switches(surnames, given_names, legislature, entry_party_name,
                                                      entry_party_code, dest_party_code, first_switch_date)
     entry_party_name, entry_party_code, first_switch_date, dest_party_code = corrected_switch_data
@@ -564,10 +982,10 @@ def adhoc_party_and_switches(surnames, given_names, legislature, entry_party_nam
                                                                 {"month": "02", "year": "2015"}
 
     # correct "independent" party destinations that are actually transfers to other caucauses
-    if legislature in destination_ind_dict:
+    if legislature in destination_dict:
         fullname = surnames + " " + given_names
-        if fullname in destination_ind_dict[legislature]:
-            destination_party_code = destination_ind_dict[legislature][fullname]
+        if fullname in destination_dict[legislature]:
+            destination_party_code = destination_dict[legislature][fullname]
 
     return entry_party_name, entry_party_code, first_switch_date, destination_party_code
 
@@ -611,8 +1029,8 @@ def get_rank_in_first_ppg(soup, mandate_start, mandate_end, surnames, given_name
     #       only the first occurence. NEED TO FIX THIS
 
     # mandate boundaries come in YR-MO-DAY format, but we need MO.YR
-    m_start = mandate_start.split("-")[1] + "." + mandate_start.split("-")[0]
-    m_end = mandate_end.split("-")[1] + "." + mandate_end.split("-")[0]
+    m_start = month_year_text(*iso_date(mandate_start)[:2])
+    m_end = month_year_text(*iso_date(mandate_end)[:2])
 
     # the default rank is a simple member, and the default date range is start and end of mandate
     # NB: somewhat deceptive default since the rank is only first rank of first party, but mandate may include mutiple
@@ -634,48 +1052,57 @@ def get_rank_in_first_ppg(soup, mandate_start, mandate_end, surnames, given_name
             ppg1_info = i.find_all('tr')[0]  # focus only on first PPG, hence 0 index
             ppg1_text = ppg1_info.text.replace('\xa0', '').replace('\r', '').replace('\n', '').replace('-', ' ')  # tidy
 
-            high_ranks = {"Secretar", "Vicelider", "Lider"}
 
             for hr in high_ranks:
                 if hr in ppg1_text:  # isolate higher ranks
 
                     # since date range information is after the rank name, split the string on the rank
 
+                    rank_text = ppg1_text.split(hr)[-1]
+                    # the dates in the rest of the string, e.g. "din iun. 2001 până în aug. 2003", in MO.YR format
+                    rank_dates = [month_year_text(year, month) for year, month in short_ro_dates(rank_text)]
+
                     # if the last entry is empty, then the person had high rank for all of their time in said party,
-                    if not ppg1_text.split(hr)[-1]:
-                        dates = m_start + "-" + m_end
-
-                    else:  # else their rank for only a portion of their time in the first party
-                        # case 1: they had the rank from one date until another
-                        if "din" in ppg1_text.split(hr)[-1] and "până" in ppg1_text.split(hr)[-1]:
-                            dates = ppg1_text.split(hr)[-1].replace("din", '').replace("până în", "-").replace(" ", "")
-                        # case 2: held the rank from a certain date until the end of their stay in the first party
-                        elif "din" in ppg1_text.split(hr)[-1]:
-                            dates = ppg1_text.split(hr)[-1].replace("din", '').replace(" ", "") + "-" + m_end
-                        #  case 3: held the rank from the start of their time in the first party until a certain date
-                        else:
-                            dates = m_start + "-" + ppg1_text.split(hr)[-1].replace("până în", '').replace(" ", "")
-
-                    # replace the short month code (e.g. "aug") with its number correspondent (e.g. "08")
-                    for smc in short_month_codes:
-                        if smc in dates:
-                            dates = dates.replace(smc, short_month_codes[smc])
-
-                    # the base data don't always put a period between month and year, so you can get"052016"; fix this
-                    # for the start period
-                    dates = dates[:2] + "." + dates[2:] if "." not in dates[:3] else dates
-                    # for the end period
-                    dates = dates[:-4] + "." + dates[-4:] if dates[-5] != "." else dates
+                    if not rank_text:
+                        rank_dates = [m_start, m_end]
+                    # else their rank for only a portion of their time in the first party; if they had the rank from
+                    # one date until another ("din" and "până") both dates are in the string, otherwise:
+                    # held the rank from a certain date until the end of their stay in the first party
+                    elif "din" in rank_text and "până" not in rank_text:
+                        rank_dates = rank_dates + [m_end]
+                    # held the rank from the start of their time in the first party until a certain date
+                    elif "din" not in rank_text:
+                        rank_dates = [m_start] + rank_dates
 
                     rank = hr.lower()  # set the rank
 
-                    # ensure that missing period issue is solved: format MO.YR-MO.YR must have two periods
-                    if dates.count(".") != 2:
+                    # ensure that we found both ends of the range, so we end up with format MO.YR-MO.YR
+                    if len(rank_dates) != 2:
                         raise ValueError("INCORRENT DATE RANGE FORMAT")
+                    dates = "-".join(rank_dates)
 
     return rank, dates
 
 
+def rank_without_caucus(soup, mandate_start, mandate_end, surnames, given_names):
+    """
+    The rank of a legislator whose page has no parliamentary party group box (as with a few from 1990-1996, who were
+    never registered in one): a simple member for the whole mandate, as get_rank_in_first_ppg has it for them.
+
+    NB: this is the same as what get_rank_in_first_ppg falls back to when it finds no such box; it only spares us the
+        search for it. The legislators it names as never having been in a caucus stay in get_rank_in_first_ppg, since
+        their pages may well have the box (we can't tell from the layout), so they can't be routed here.
+
+    :param soup: a BeautifulSoup object; unused, but here so that this takes what get_rank_in_first_ppg takes
+    :param mandate_start: str, the beginning of a mandate, comes in YR-MO-DAY format
+    :param mandate_end: str, the end of a mandate, comes in YR-MO-DAY format
+    :param surnames: str; unused, as soup
+    :param given_names: str; unused, as soup
+    :return: a 2-tuple of string (rank, date range the rank was held)
+    """
+    return "membru", month_year_text(*iso_date(mandate_start)[:2]) + "-" + month_year_text(*iso_date(mandate_end)[:2])
+
+
 def assign_unique_person_ids(parl_leg_table, header):
     """
     Goes through a table of parliamentarian-legislatures and assigns each person (and their associated mandates)
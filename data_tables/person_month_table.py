@@ -0,0 +1,273 @@
+"""
+Make a person-month first party switch risk set of legislators in Romanian parliament, for survival models at monthly
+resolution. Mandate boundaries, party switches, government coalitions and party leader tenures are all known to the
+month, so here I keep that resolution instead of collapsing it to years as in person_year_table.py.
+
+To keep this fast despite having ~12 times as many rows as the person-year table, all dates are turned into integer
+month indexes (year * 12 + month - 1) once, and the monthly covariates (government membership, leadership changes) are
+precomputed as lists indexed by month, so that making a row is just list lookups.
+"""
+
+import csv
+import functools
+import io
+from data_tables.dates import month_index, iso_date, numeric_date
+from data_tables.dicts.govt_member import gov_coalition_senior_partner, gov_coalition_junior_partner
+from data_tables.dicts.party_leaders import party_leaders, party_leader_changes
+from data_tables.dicts.reference_dicts import party_name_changes, historical_regions_dict, election_years, \
+    ethnic_parties, personality_parties
+from data_tables.person_year_table import get_seniority_cat, get_ppg_size, get_local_govt_parties, \
+    ad_hoc_ppg_changes, ideological_switch_cost, get_rank_change
+from local import root
+
+# the legislatures we have full data for, and the months they cover
+legislatures = {"2000-2004", "2004-2008", "2008-2012", "2012-2016", "2016-2020"}
+first_month, last_month = 2000 * 12, 2020 * 12 + 11
+
+# NB: columns that are fixed for the whole mandate come first and those that change by month come after, so that the
+#     fixed part of a row only needs to be formatted once per mandate, see mandate_person_months
+person_month_table_header = ["person_id", "surnames", "given names", "legis", "multi_legis_parl", "senate", "constit",
+                             "h_region", "senior", "senior_cat", "start_party", "p_ethnic", "p_pers",
+                             "local_party_overlap", "former_switcher",
+                             "legis_clock", "year", "month", "p_size", "p_govt", "pre_switch_rank", "rank_change",
+                             "p_switch1", "destination_party", "idlgcl_switch_cost", "elect_year", "lead_change",
+                             "left_early"]
+
+# "YR,MO" labels of every month, indexed by month index minus first_month
+month_labels = [str(m // 12) + "," + str(m % 12 + 1) for m in range(first_month, last_month + 1)]
+
+
+@functools.lru_cache(maxsize=None)
+def date_month_index(date_text, mid_month_cutoff=None):
+    """
+    Turn the first date in a string into a month index.
+
+    :param date_text: str, in "DAY.MO.YR", "MO.YR" or "YR" format; "prezent" (with no date before it) means the last
+                      month we have data for
+    :param mid_month_cutoff: str, "start" or "end" or None; if the date is a range boundary, the month only counts as
+                             part of the range if the range covers the middle of the month (the 15th), so a start date
+                             after the 15th gives the next month, and an end date before the 15th the previous month
+    :return: int, month index; None if there is no date in the string
+    """
+    date = numeric_date(date_text)
+    if date is None:
+        return last_month if "prezent" in date_text else None
+    year, month, day = date
+    idx = month_index(year, month or 1)  # YR only, take January
+    if day is not None and mid_month_cutoff == "start" and day > 15:
+        idx += 1
+    if day is not None and mid_month_cutoff == "end" and day < 15:
+        idx -= 1
+    return idx
+
+
+def monthly_govt_status():
+    """
+    Make lists (indexed by month index minus first_month) of whether each party was senior coalition partner, junior
+    coalition partner, or in opposition, from the coalition date ranges in govt_member.py.
+
+    NB: a party counts as in government in a month if it was in government on the 15th of that month.
+    NB: if a party is listed as both senior and junior partner in a month (because a coalition changed mid-month) I
+        mark it as senior.
+
+    :return: dict of form {party code: list of "senior", "junior" or "opposition"}
+    """
+    n_months = last_month - first_month + 1
+    status = {}
+    for coalition_dict, label in ((gov_coalition_junior_partner, "junior"), (gov_coalition_senior_partner, "senior")):
+        for legislature, parties in coalition_dict.items():
+            for party, date_ranges in parties.items():
+                party = party.replace("-", " ")  # the coalition dicts write "PP-DD" for "PP DD"
+                months = status.setdefault(party, ["opposition"] * n_months)
+                date_ranges = date_ranges if isinstance(date_ranges, tuple) else (date_ranges,)
+                for date_range in date_ranges:
+                    if not date_range:
+                        continue
+                    start_date, end_date = date_range.split("-")
+                    start = date_month_index(start_date, mid_month_cutoff="start")
+                    end = date_month_index(end_date, mid_month_cutoff="end")
+                    for m in range(max(start, first_month), min(end, last_month) + 1):
+                        months[m - first_month] = label
+    return status
+
+
+def monthly_leader_changes():
+    """
+    Make lists (indexed by month index minus first_month) marking the months in which a party changed leaders.
+
+    I only count the leadership changes in party_leader_changes, since that dict holds my judgement calls about which
+    changes were real (e.g. that the PMP never really changed leaders). The month is the start month of the new
+    leader's tenure in party_leaders; failing that, a tenure starting in December of the previous year (e.g. Boc in
+    18.12.2004) counts for January, much like December mandate starts do in the person-year table. Where the real
+    change has no tenure start in that year (e.g. when the real, unofficial leader went to jail) I only know the year,
+    so, as in the person-year table, the whole year is marked.
+
+    :return: dict of form {party code: list of "0" or "1"}; strings, since they go straight into the csv
+    """
+    n_months = last_month - first_month + 1
+    tenure_starts = {}
+    for party, leaders in party_leaders.items():
+        for tenures in leaders.values():
+            tenures = tenures if isinstance(tenures, tuple) else (tenures,)
+            for tenure in tenures:
+                start = date_month_index(tenure)
+                if start is not None:
+                    tenure_starts.setdefault(party, set()).add(start)
+
+    changes = {}
+    for yr, parties in party_leader_changes.items():
+        if not first_month <= month_index(yr, 1) <= last_month:
+            continue
+        for party in parties:
+            months = changes.setdefault(party, ["0"] * n_months)
+            starts = [m for m in tenure_starts.get(party, ()) if m // 12 == yr] \
+                or [month_index(yr, 1) for m in tenure_starts.get(party, ()) if m == month_index(yr - 1, 12)]
+            for m in starts or range(month_index(yr, 1), month_index(yr, 12) + 1):
+                months[m - first_month] = "1"
+    return changes
+
+
+def make_person_month_risk_set(person_legislature_table_path, risk_set_table_out_path):
+    """
+    Starting from a person-legislature table make a first party switch risk set of person-months: each row is one
+    legislator in one month, and a legislator's months are included only up to (and including) the month of their
+    first party switch in that legislature.
+
+    Compared to the person-year table:
+        - mandates starting in December of the election year keep that month, instead of the whole year being dropped
+        - the crude "leave_early" cut (leaving by May of the last year) is replaced by "left_early", which marks the
+          last month of a mandate that ended before November of the election year, i.e. a right-censored spell
+        - government membership and leadership changes are monthly, see monthly_govt_status and
+          monthly_leader_changes; PPG size is still only known at the start of each year
+        - the conviction covariates are yearly to begin with, so I leave them out: they can be merged in from the
+          person-year table on person ID and year
+
+    NB: as in the person-year table, I ignore those who died in office and the pre-2000 legislatures.
+
+    :param person_legislature_table_path: str, path to the person-legislature table
+    :param risk_set_table_out_path: str, path where we want the person-month risk set to live
+    :return: None
+    """
+
+    with open(person_legislature_table_path, 'r') as in_f:
+        pers_leg_table = list(csv.reader(in_f))
+        header = pers_leg_table[0]
+        pers_leg_table = pers_leg_table[1:]  # skip the header
+
+    pid_col_idx = header.index("PersID")
+
+    # see how many legislatures each person was ultimately in, i.e. how long their political career was across elections
+    career_lens = {pers_leg[pid_col_idx]: 0 for pers_leg in pers_leg_table}
+    for pers_leg in pers_leg_table:
+        career_lens[pers_leg[pid_col_idx]] += 1
+
+    govt_status, leader_changes = monthly_govt_status(), monthly_leader_changes()
+
+    with open(risk_set_table_out_path, 'w', newline='') as out_f:
+        csv.writer(out_f).writerow(person_month_table_header)
+        for pers_leg in pers_leg_table:
+            multi_legis_parl = 1 if career_lens[pers_leg[pid_col_idx]] > 1 else 0
+            out_f.writelines(mandate_person_months(pers_leg, header, multi_legis_parl, govt_status, leader_changes))
+
+
+def mandate_person_months(pers_leg, header, multi_legis_parl, govt_status, leader_changes):
+    """
+    Turn one person-legislature (i.e. one mandate) into the person-months in which that person was at risk of a first
+    party switch, in chronological order.
+
+    :param pers_leg: list, one row of the person-legislature table
+    :param header: list, the header of the person-legislature table
+    :param multi_legis_parl: int, 1 if this person was, ultimately, in more than one legislature, else 0
+    :param govt_status: dict, as made by monthly_govt_status
+    :param leader_changes: dict, as made by monthly_leader_changes
+    :return: list of person-months, as csv lines laid out as in person_month_table_header
+    """
+
+    # get column indexes for the person-legislature table
+    surnames_col_idx, given_names_col_idx = header.index("surnames"), header.index("given names")
+    mandate_start_col_idx, mandate_end_col_idx = header.index("mandate start"), header.index("mandate end")
+    pid_col_idx, seniority_col_idx = header.index("PersID"), header.index("seniority")
+    leg_col_idx, chamb_col_idx = header.index("legislature"), header.index("chamber")
+    const_col_idx, s_party_col_idx = header.index("constituency"), header.index("entry party code")
+    p_switch_mo_col_idx = header.index("first party switch month")
+    p_switch_yr_col_idx, died_col_idx = header.index("first party switch year"), header.index("death status")
+    dest_party_col_idx, frmr_switcher_col_idx = header.index("destination party code"), header.index("former switcher")
+    rank_col_idx, rank_dates_col_idx = header.index("entry ppg rank"), header.index("entry ppg rank dates")
+
+    leg = pers_leg[leg_col_idx]
+    if pers_leg[died_col_idx] != "no death in office" or leg not in legislatures:
+        return []
+
+    # mandate boundaries come in "YR-MO-DAY" format
+    start = month_index(*iso_date(pers_leg[mandate_start_col_idx])[:2])
+    end = month_index(*iso_date(pers_leg[mandate_end_col_idx])[:2])
+    leg_start_yr, leg_end_yr = int(leg.split("-")[0]), int(leg.split("-")[1])
+    left_early_month = end if end < month_index(leg_end_yr, 11) else None
+
+    pid, surnames, given_names = pers_leg[pid_col_idx], pers_leg[surnames_col_idx], pers_leg[given_names_col_idx]
+    senior, senate = pers_leg[seniority_col_idx], 1 if pers_leg[chamb_col_idx] == "SENATOR" else 0
+    const, former_switcher = pers_leg[const_col_idx], pers_leg[frmr_switcher_col_idx]
+    s_party = party_name_changes.get(pers_leg[s_party_col_idx], pers_leg[s_party_col_idx])
+    seniority_cat, h_reg = get_seniority_cat(senior), historical_regions_dict[const]
+    s_party_ethnic = 1 if s_party in ethnic_parties else 0
+    s_personality_party = 1 if s_party in personality_parties else 0
+    local_party_overlap = get_local_govt_parties(leg, const, s_party)
+
+    # the switch month, if any, after cleaning up ppg fusions etc.; the risk set stops there
+    switch_month, dest_party = None, ""
+    if pers_leg[p_switch_yr_col_idx]:
+        switch_yr = int(pers_leg[p_switch_yr_col_idx])
+        party_switch, p_switch_yr, dest_party = ad_hoc_ppg_changes(s_party, pers_leg[dest_party_col_idx], switch_yr,
+                                                                   1, switch_yr)
+        if party_switch:
+            switch_month = month_index(switch_yr, pers_leg[p_switch_mo_col_idx])
+            end = min(end, switch_month)
+    idlgcl_switch_cost = ideological_switch_cost(s_party, dest_party, switch_month // 12) if dest_party else ""
+
+    # rank dates come in "MO.YR-MO.YR" format
+    rank_start, rank_end = (date_month_index(d) for d in pers_leg[rank_dates_col_idx].split("-"))
+    rank = pers_leg[rank_col_idx]
+
+    # PPG size is known at the start of each year, from 2009 on; mandates starting in December of the election year
+    # get the size of the new legislature's PPG, i.e. that at the start of the following year
+    p_sizes = {yr: get_ppg_size(s_party, senate, max(yr, leg_start_yr + 1), leg, pool_chambers=True)
+               if max(yr, leg_start_yr + 1) > 2008 else "" for yr in range(start // 12, end // 12 + 1)}
+
+    no_govt = ["opposition"] * (last_month - first_month + 1)
+    party_govt, party_lead_changes = govt_status.get(s_party, no_govt), leader_changes.get(s_party)
+
+    # NB: csv-writing every cell of every row is most of the cost here, so the fixed part of the row goes through the
+    #     csv writer once (it has names, which may need quoting) and the monthly part, which is only numbers and codes,
+    #     is joined by hand
+    fixed_part = io.StringIO()
+    csv.writer(fixed_part).writerow([pid, surnames, given_names, leg, multi_legis_parl, senate, const, h_reg, senior,
+                                     seniority_cat, s_party, s_party_ethnic, s_personality_party, local_party_overlap,
+                                     former_switcher, ""])
+    prefix = fixed_part.getvalue()[:-2]  # drop the line terminator, keep the trailing comma
+
+    # everything that varies by month, as strings, so that a row is just string concatenation
+    p_sizes = {yr: str(size) for yr, size in p_sizes.items()}
+    elect_yrs = {yr: "1" if yr in election_years else "0" for yr in p_sizes}
+    switch_part = "1," + dest_party + "," + idlgcl_switch_cost
+
+    person_months, previous_rank = [], None
+    for m in range(start, end + 1):
+        yr, offset = m // 12, m - first_month
+        pre_switch_rank = rank if rank_start <= m <= rank_end else "membru"
+        # NB: the rank can only change where the rank dates begin or end, so most months need no comparison
+        delta_rank = get_rank_change(pre_switch_rank, previous_rank) if pre_switch_rank != previous_rank \
+            else "no change"
+        previous_rank = pre_switch_rank
+        person_months.append(prefix + str(m - start + 1) + "," + month_labels[offset] + "," + p_sizes[yr] + "," +
+                             party_govt[offset] + "," + pre_switch_rank + "," + delta_rank + "," +
+                             (switch_part if m == switch_month else "0,,") + "," + elect_yrs[yr] + "," +
+                             (party_lead_changes[offset] if party_lead_changes else "0") + "," +
+                             ("1" if m == left_early_month and m != switch_month else "0") + "\r\n")
+    return person_months
+
+
+if __name__ == "__main__":
+    trunk = "data/parliamentarians/"
+    person_legislature_path = root + trunk + 'parliamentarians_person_legislature_table.csv'
+    person_month_risk_set_path = root + trunk + "parliamentarians_first_party_switch_person_month_risk_set.csv"
+    make_person_month_risk_set(person_legislature_path, person_month_risk_set_path)
@@ -4,8 +4,12 @@ Romanian parliament, with an eye on the causes of a first party switch.
 """
 
 import csv
+import contextlib
+import hashlib
 import itertools
+import json
 import operator
+import os
 from data_tables.dicts.idealogical_switch_cost import ideological_pswitch_costs
 from data_tables.dicts.govt_member import govt_parties
 from data_tables.dicts.party_leaders import party_leader_changes
@@ -14,157 +18,453 @@ from data_tables.dicts.corruption_dicts import leader_conv_one_year, leader_conv
     first_conviction_appeal_possible, final_guilty_verdict, legis_guilty_count
 from data_tables.dicts.reference_dicts import party_name_changes, historical_regions_dict, election_years, ppg_size, \
     ethnic_parties, personality_parties
+from data_tables.dicts.party_colleagues import convicted_colleague_exposure, convicted_colleague_index, \
+    indexed_colleague_exposure, convicted_names
+from data_tables.dates import iso_date, numeric_date
+from data_tables.dict_dependencies import person_year_dependencies, dict_snapshot, changed_dict_keys, affected_rows
 from local import root
 
-
-def make_person_year_table(person_legislature_table_path, person_year_table_out_path, risk_set_table_out_path):
+# the positions within a parliamentary party group, ranked
+rank_order = {"lider": 3, "vicelider": 2, "secretar": 1, "membru": 0}
+
+# novice = first legislature; journeyman = second; master = third or more
+seniority_categories = {1: "novice", 2: "journeyman"}
+
+# the ideological switch costs of each period and party switch edge, as categories rather than numbers
+switch_cost_categories = {0: 'low', 1: 'medium', 2: 'high'}
+ideological_switch_cost_categories = {period: {edge: switch_cost_categories[cost] for edge, cost in costs.items()}
+                                      for period, costs in ideological_pswitch_costs.items()}
+
+# NB: certain parties ran in electoral alliances and then caucused together, for at least part of a legislature.
+#     The dict below shows which small parties were in which caucuses, and when.
+small_party_caucus_switch = {"PC": {"2008-2012": {"ppg switch date": "02.2011",
+                                                  "pre switch ppg": "PSD",
+                                                  "post switch ppg": "PNL"}},
+                             "UNPR": {"2012-2016": {"ppg switch date": "02.2016",
+                                                    "pre switch ppg": "PSD",
+                                                    "post switch ppg": "UNPR"}}
+                             }
+
+# the columns of the person-year table, in order
+person_year_table_header = ["person_id", "surnames", "given names", "legis", "legis_clock", "year",
+                            "multi_legis_parl", "senate", "constit", "h_region", "senior", "senior_cat",
+                            "start_party", "p_size", "p_ethnic", "p_pers", "p_govt", "local_party_overlap",
+                            "pre_switch_rank", "rank_change", "p_switch1", "destination_party",
+                            "idlgcl_switch_cost",
+                            "former_switcher", "elect_year", "lead_change", "leave_early", "lead_conv_one_year",
+                            "lead_conv_multi_year", "min_conv_full", "min_conv_old", "min_conv_new",
+                            "min_conv_none", "other_legis_conv_full", "colleague_conv", "pconv_same_yr",
+                            "pconv_to_elec", "pconv_perm_mark", "ann_year_only", "ann_to_next_elect",
+                            "ann_perm_mark"]
+
+
+def make_person_year_table(person_legislature_table_path, person_year_table_out_path, risk_set_table_out_path,
+                           risk_set_variants=None, streaming=False):
     """
     Starting from a person-legislature table (where each row is one 4-year legislative mandate of one person) create a
     person-year table, where each row represents the data from one legislator in one year.
 
+    NB: next to the person-year table I also write which dict entries each row read, so that later edits to the dicts
+        can be patched in without redoing everything, see patch_person_year_table.
+
     :param person_legislature_table_path: str, path to the person-legislature table
     :param person_year_table_out_path: str, path where we want the person-year table to live
     :param risk_set_table_out_path: str, path where we want the rist set table to live
+    :param risk_set_variants: list of dicts, the risk sets to make (see first_switch_risk_sets); if None, make the
+                              full risk set and the multi-year-only one
+    :param streaming: bool, if True the person-legislature table must already be sorted by PersID, and is processed
+                      one career at a time (see stream_person_year_table); False by default
     :return: None
     """
 
+    if risk_set_variants is None:
+        risk_set_variants = default_risk_set_variants(risk_set_table_out_path)
+
+    if streaming:
+        stream_person_year_table(person_legislature_table_path, person_year_table_out_path, risk_set_variants)
+        return
+
     with open(person_legislature_table_path, 'r') as in_f:
         pers_leg_table = list(csv.reader(in_f))
         header = pers_leg_table[0]
         pers_leg_table = pers_leg_table[1:]  # skip the header
 
-    # get column indexes for the person-legislature table
-    surnames_col_idx, given_names_col_idx = header.index("surnames"), header.index("given names")
-    mandate_start_col_idx, mandate_end_col_idx = header.index("mandate start"), header.index("mandate end")
-    pid_col_idx, seniority_col_idx = header.index("PersID"), header.index("seniority")
-    leg_col_idx, chamb_col_idx = header.index("legislature"), header.index("chamber")
-    const_col_idx, s_party_col_idx = header.index("constituency"), header.index("entry party code")
-    p_switch_yr_col_idx, died_col_idx = header.index("first party switch year"), header.index("death status")
-    dest_party_col_idx, frmr_switcher_col_idx = header.index("destination party code"), header.index("former switcher")
+    pid_col_idx, entry_party_col_idx = header.index("PersID"), header.index("entry party code")
 
     # see how many legislatures each person was ultimately in, i.e. how long their political career was across elections
     career_lens = {pers_leg[pid_col_idx]: 0 for pers_leg in pers_leg_table}
     for pers_leg in pers_leg_table:
         career_lens[pers_leg[pid_col_idx]] += 1
 
-    person_year_table_header = ["person_id", "surnames", "given names", "legis", "legis_clock", "year",
-                                "multi_legis_parl", "senate", "constit", "h_region", "senior", "senior_cat",
-                                "start_party", "p_size", "p_ethnic", "p_pers", "p_govt", "local_party_overlap",
-                                "pre_switch_rank", "rank_change", "p_switch1", "destination_party",
-                                "idlgcl_switch_cost",
-                                "former_switcher", "elect_year", "lead_change", "leave_early", "lead_conv_one_year",
-                                "lead_conv_multi_year", "min_conv_full", "min_conv_old", "min_conv_new",
-                                "min_conv_none", "other_legis_conv_full", "pconv_same_yr", "pconv_to_elec",
-                                "pconv_perm_mark", "ann_year_only", "ann_to_next_elect", "ann_perm_mark"]
-
-    pers_yr_table = []
+    pers_yr_table, dependencies = [], []
 
     for pers_leg in pers_leg_table:
+        # see whether this is, ultimately, a multi-legislature parliamentarian
+        multi_legis_parl = 1 if career_lens[pers_leg[pid_col_idx]] > 1 else 0
+        for pers_yr in mandate_person_years(pers_leg, header, multi_legis_parl):
+            pers_yr_table.append(pers_yr)
+            dependencies.append(person_year_dependencies(pers_yr, person_year_table_header,
+                                                         pers_leg[entry_party_col_idx]))
 
-        # ignore those who died in office: only ~60 mandates out of ~4000 died in office, and of these only 3 switched
-        # parties before dying; so not loosing too much information if we throw out data on these dead, and gain model
-        # simplicity since we don't need to do multiple-outcome survival models
-        if pers_leg[died_col_idx] == "no death in office":
-
-            leg = pers_leg[leg_col_idx]
-
-            # look only at post-2000 legislatures (TODO fill in data for previous legislatures too)
-            if leg in {"2000-2004", "2004-2008", "2008-2012", "2012-2016", "2016-2020"}:
-
-                # get names
-                surnames, given_names = pers_leg[surnames_col_idx], pers_leg[given_names_col_idx]
-
-                # see whether this is, ultimately, a multi-legislature parliamentarian
-                multi_legis_parl = 1 if career_lens[pers_leg[0]] > 1 else 0
-
-                # get the number of years that the parliamentarian served in a particular legislature
-                # NB: since elections are typically in Nov/Dec, mandates usually start in December. Ignore that first
-                # year since politics don't really start until January of the next year, so a mandate from 2004-2008 is
-                # really 2005-2008, which is still 4 years (inclusive), up to the elections in Nov/Dec 2008.
-                if int(pers_leg[mandate_start_col_idx].split('-')[0]) in {2000, 2004, 2008, 2012, 2016} \
-                        and int(pers_leg[mandate_start_col_idx].split('-')[1]) == 12:
-                    # NB: mandate info has form = "YR-MO-DAY"
-                    first_year_in_leg = int(pers_leg[mandate_start_col_idx].split('-')[0]) + 1
-                else:
-                    first_year_in_leg = int(pers_leg[mandate_start_col_idx].split('-')[0])
-
-                last_year_in_leg = int(pers_leg[mandate_end_col_idx].split('-')[0])
-                last_month_in_leg = int(pers_leg[mandate_end_col_idx].split('-')[1])
-                years_in_leg = list(range(first_year_in_leg, last_year_in_leg + 1))
-                pid, senior, leg, = pers_leg[pid_col_idx], pers_leg[seniority_col_idx], pers_leg[leg_col_idx]
-                senate = 1 if pers_leg[chamb_col_idx] == "SENATOR" else 0
-                const, former_switcher = pers_leg[const_col_idx], pers_leg[frmr_switcher_col_idx]
-                s_party, p_switch_yr = pers_leg[s_party_col_idx], pers_leg[p_switch_yr_col_idx]
-
-                seniority_cat = get_seniority_cat(senior)
-
-                if s_party in party_name_changes and \
-                        leg in {"2000-2004", "2004-2008", "2008-2012", "2012-2016", "2016-2020"}:
-                    s_party = party_name_changes[s_party]
-
-                h_reg = historical_regions_dict[const]
-                s_party_ethnic = 1 if s_party in ethnic_parties else 0
-                s_personality_party = 1 if s_party in personality_parties else 0
-
-                for idx, yr in enumerate(years_in_leg):
-                    legis_clock = idx + 1
-                    s_ppg_size = get_ppg_size(s_party, senate, yr, leg, pool_chambers=True) if yr > 2008 else ""
-                    govt = govt_parties[yr][s_party]
-                    local_party_overlap = get_local_govt_parties(leg, const, s_party)
-                    party_switch = 1 if p_switch_yr and int(yr) == int(p_switch_yr) else 0
-                    elec_yr = 1 if int(yr) in election_years else 0
-                    leader_change = 1 if yr in party_leader_changes and s_party in party_leader_changes[yr] else 0
-                    leave_early = 1 if yr == last_year_in_leg and last_month_in_leg <= 5 else 0
-                    dest_party = pers_leg[dest_party_col_idx] if party_switch else ""
-
-                    # catch and clean potential issues arising from ppg changes, like party group fusions
-                    party_switch, p_switch_yr, dest_party = ad_hoc_ppg_changes(s_party, dest_party, yr,
-                                                                               party_switch, p_switch_yr)
-                    pre_switch_rank = get_pre_switch_rank(header, pers_leg, yr)
-
-                    idlgcl_switch_cost = ideological_switch_cost(s_party, dest_party, yr) if dest_party else ""
-
-                    cnvct_data = get_convictions_data(yr, s_party)
-
-                    lead_conv_one_yr = cnvct_data["lead_conv_one_year"]
-                    lead_conv_multi_yr = cnvct_data["lead_conv_multi_year"]
-                    mconv_full, mconv_old = cnvct_data["min_conv_full"], cnvct_data["min_conv_old"]
-                    mconv_new, mconv_none = cnvct_data["min_conv_new"], cnvct_data["min_conv_none"]
-                    others_legs_conv_full = cnvct_data["legis_conv_full"]
-                    pconv_appeal_same_yr = self_convicted_appeal(surnames, given_names, yr, leg, "same year")
-                    pconv_appeal_to_elec = self_convicted_appeal(surnames, given_names, yr, leg, "until next election")
-                    pconv_appeal_pmark = self_convicted_appeal(surnames, given_names, yr, leg, "permanent mark")
-
-                    person_year = [pid, surnames, given_names, leg, legis_clock, yr, multi_legis_parl, senate, const,
-                                   h_reg, senior, seniority_cat, s_party, s_ppg_size, s_party_ethnic,
-                                   s_personality_party, govt, local_party_overlap, pre_switch_rank, party_switch,
-                                   dest_party, idlgcl_switch_cost, former_switcher, elec_yr, leader_change,
-                                   leave_early, lead_conv_one_yr, lead_conv_multi_yr, mconv_full, mconv_old, mconv_new,
-                                   mconv_none, others_legs_conv_full, pconv_appeal_same_yr, pconv_appeal_to_elec,
-                                   pconv_appeal_pmark]
-
-                    pers_yr_table.append(person_year)
-
-    # add rank change column
-    pers_yr_table = rank_change(pers_yr_table, person_year_table_header)
+    # NB: the number of convicted colleagues depends on everyone's party-years, so it can only be computed once the
+    #     whole table exists
+    add_colleague_convictions(pers_yr_table, person_year_table_header)
 
     with open(person_year_table_out_path, 'w') as out_f:
         writer = csv.writer(out_f)
         writer.writerow(person_year_table_header)
         [writer.writerow(p_yr) for p_yr in pers_yr_table]
 
-    first_switch_risk_set(pers_yr_table, risk_set_table_out_path, person_year_table_header)
-    first_switch_risk_set(pers_yr_table, risk_set_table_out_path, person_year_table_header, multi_year_only=True)
+    save_dependencies(person_year_table_out_path, career_hashes(pers_leg_table, header), dependencies)
+
+    first_switch_risk_sets(pers_yr_table, person_year_table_header, risk_set_variants)
+
+
+def patch_person_year_table(person_legislature_table_path, person_year_table_out_path, risk_set_table_out_path,
+                            risk_set_variants=None):
+    """
+    Bring an existing person-year table (and its risk sets) up to date after an edit to the hand-coded dicts or to the
+    person-legislature table, recomputing only the careers that the edit touches; see dict_dependencies.
+
+    A career is recomputed if any of its rows read a dict entry that changed since the last build, or if any of its
+    mandates in the person-legislature table changed. The recomputed rows replace the old ones in place. Since who is
+    whose party colleague spans careers, the convicted colleagues column is then recounted for the whole table, which
+    is cheap compared to making the rows.
+
+    NB: this needs the dependencies file that make_person_year_table writes next to the person-year table; if it is
+        missing (e.g. the table was made in streaming mode) I just make the whole table afresh.
+    NB: since this only tracks the dicts, any change to the code of the person-year table calls for a full rebuild.
+
+    :param person_legislature_table_path: str, path to the person-legislature table
+    :param person_year_table_out_path: str, path to the existing person-year table, which gets overwritten
+    :param risk_set_table_out_path: str, path to the (full) risk set table
+    :param risk_set_variants: list of dicts, the risk sets to make (see first_switch_risk_sets); if None, make the
+                              full risk set and the multi-year-only one
+    :return: set of the person IDs whose careers were recomputed; None if we had to make the whole table
+    """
+
+    if risk_set_variants is None:
+        risk_set_variants = default_risk_set_variants(risk_set_table_out_path)
+
+    stored = load_dependencies(person_year_table_out_path)
+    if stored is None or not os.path.isfile(person_year_table_out_path):
+        make_person_year_table(person_legislature_table_path, person_year_table_out_path, risk_set_table_out_path,
+                               risk_set_variants)
+        return None
+
+    with open(person_legislature_table_path, 'r') as in_f:
+        pers_leg_table = list(csv.reader(in_f))
+        header = pers_leg_table[0]
+        pers_leg_table = pers_leg_table[1:]  # skip the header
+
+    with open(person_year_table_out_path, 'r') as in_f:
+        pers_yr_table = list(csv.reader(in_f))[1:]  # skip the header
+
+    if len(pers_yr_table) != len(stored["rows"]):
+        raise ValueError("PERSON-YEAR TABLE DOES NOT MATCH ITS DEPENDENCIES FILE: " + person_year_table_out_path)
+
+    pid_col_idx, entry_party_col_idx = header.index("PersID"), header.index("entry party code")
+    leg_col_idx = header.index("legislature")
+    py_pid_col_idx = person_year_table_header.index("person_id")
+    py_leg_col_idx = person_year_table_header.index("legis")
+
+    # find the people whose careers we need to recompute
+    new_career_hashes = career_hashes(pers_leg_table, header)
+    old_career_hashes = stored["careers"]
+    affected_pids = {pid for pid in set(new_career_hashes) | set(old_career_hashes)
+                     if new_career_hashes.get(pid) != old_career_hashes.get(pid)}
+    changed_keys = changed_dict_keys(stored["dicts"], dict_snapshot())
+    for row_idx in affected_rows(stored["rows"], changed_keys):
+        affected_pids.add(pers_yr_table[row_idx][py_pid_col_idx])
+
+    # nothing changed, so nothing to do
+    if not affected_pids and not changed_keys:
+        return affected_pids
+
+    # recompute the affected careers, one mandate at a time
+    # NB: rows go through str(), so they look like the ones read in from the csv
+    career_lens = {}
+    for pers_leg in pers_leg_table:
+        career_lens[pers_leg[pid_col_idx]] = career_lens.get(pers_leg[pid_col_idx], 0) + 1
+    new_mandates = {}
+    for pers_leg in pers_leg_table:
+        if pers_leg[pid_col_idx] in affected_pids:
+            multi_legis_parl = 1 if career_lens[pers_leg[pid_col_idx]] > 1 else 0
+            mandate = new_mandates.setdefault((pers_leg[pid_col_idx], pers_leg[leg_col_idx]), [])
+            for pers_yr in mandate_person_years(pers_leg, header, multi_legis_parl):
+                mandate.append(([str(val) for val in pers_yr],
+                                person_year_dependencies(pers_yr, person_year_table_header,
+                                                         pers_leg[entry_party_col_idx])))
+
+    # put the recomputed mandates where the old ones were, and mandates that are new at the end
+    patched_table, dependencies = [], []
+    for pers_yr, row_deps in zip(pers_yr_table, stored["rows"]):
+        pid = pers_yr[py_pid_col_idx]
+        if pid not in affected_pids:
+            patched_table.append(pers_yr)
+            dependencies.append(row_deps)
+        else:
+            for new_pers_yr, new_row_deps in new_mandates.pop((pid, pers_yr[py_leg_col_idx]), []):
+                patched_table.append(new_pers_yr)
+                dependencies.append(new_row_deps)
+    for mandate in new_mandates.values():
+        for new_pers_yr, new_row_deps in mandate:
+            patched_table.append(new_pers_yr)
+            dependencies.append(new_row_deps)
+
+    add_colleague_convictions(patched_table, person_year_table_header)
+
+    with open(person_year_table_out_path, 'w') as out_f:
+        writer = csv.writer(out_f)
+        writer.writerow(person_year_table_header)
+        [writer.writerow(p_yr) for p_yr in patched_table]
+
+    save_dependencies(person_year_table_out_path, new_career_hashes, dependencies)
+
+    first_switch_risk_sets(patched_table, person_year_table_header, risk_set_variants)
+
+    return affected_pids
+
+
+def career_hashes(person_legislature_table, header):
+    """
+    Fingerprint each person's career in the person-legislature table, so that we can tell which careers changed.
+
+    :param person_legislature_table: the person-legislature table as a list of lists, without the header
+    :param header: list, the header of the person-legislature table
+    :return: dict of form {person ID: hex digest of all their person-legislature rows}
+    """
+    pid_col_idx = header.index("PersID")
+    careers = {}
+    for pers_leg in person_legislature_table:
+        careers.setdefault(pers_leg[pid_col_idx], []).append("|".join(pers_leg))
+    return {pid: hashlib.sha1("\n".join(sorted(career)).encode("utf-8")).hexdigest() for pid, career in careers.items()}
+
+
+def dependencies_path(person_year_table_path):
+    """Where the dependencies of a person-year table live."""
+    return person_year_table_path[:-4] + "_dependencies.json"
+
+
+def save_dependencies(person_year_table_path, careers, dependencies):
+    """
+    Write what each row of the person-year table depends on, to be read by patch_person_year_table: the career hashes
+    (see career_hashes), a snapshot of the tracked dicts, and the keys read by each row, in table order.
+
+    :param person_year_table_path: str, path to the person-year table
+    :param careers: dict, as made by career_hashes
+    :param dependencies: list of lists, one per row, as made by dict_dependencies.person_year_dependencies
+    :return: None
+    """
+    # NB: json.dumps then write, since json.dump goes through the (much slower) pure python encoder
+    with open(dependencies_path(person_year_table_path), 'w') as out_f:
+        out_f.write(json.dumps({"careers": careers, "dicts": dict_snapshot(), "rows": dependencies}))
+
+
+def load_dependencies(person_year_table_path):
+    """Return the dependencies saved by save_dependencies, or None if there are none."""
+    if not os.path.isfile(dependencies_path(person_year_table_path)):
+        return None
+    with open(dependencies_path(person_year_table_path), 'r') as in_f:
+        return json.load(in_f)
+
+
+def stream_person_year_table(person_legislature_table_path, person_year_table_out_path, risk_set_variants):
+    """
+    Streaming version of make_person_year_table, for when the person-legislature table gets too big to hold in memory
+    (e.g. with monthly rows, or all legislatures since 1990). The input is read one career (i.e. all the mandates of
+    one person) at a time, and each career's person-years go straight to the person-year table and the risk sets, so
+    that memory use is on the order of one career, not of the whole table.
+
+    The only thing that needs the whole table is the count of convicted colleagues. But there are only a few dozen
+    convicted people, so a first, cheap pass collects the party-years of just these people, and then each career is
+    checked against them, see party_colleagues.convicted_colleague_index.
+
+    NB: the person-legislature table MUST be sorted (or at least grouped) by PersID; I raise an error if it is not.
+    NB: the rows come out in input order, not sorted by person ID and year like the risk sets of the in-memory version.
+
+    :param person_legislature_table_path: str, path to the person-legislature table, sorted by PersID
+    :param person_year_table_out_path: str, path where we want the person-year table to live
+    :param risk_set_variants: list of dicts, the risk sets to make, see first_switch_risk_sets
+    :return: None
+    """
+
+    # first pass: get the person-years of convicted people only
+    convicted_person_years = []
+    with open(person_legislature_table_path, 'r') as in_f:
+        reader = csv.reader(in_f)
+        header = next(reader)
+        surnames_col_idx, given_names_col_idx = header.index("surnames"), header.index("given names")
+        names_to_find = convicted_names()
+        for pers_leg in reader:
+            if pers_leg[surnames_col_idx] + " " + pers_leg[given_names_col_idx] in names_to_find:
+                # NB: multi_legis_parl plays no role in who is whose colleague, so any value will do here
+                convicted_person_years.extend(mandate_person_years(pers_leg, header, 0))
+    convicted_index = convicted_colleague_index(convicted_person_years, person_year_table_header)
+
+    # second pass: one career at a time
+    with open(person_legislature_table_path, 'r') as in_f, open(person_year_table_out_path, 'w') as out_f, \
+            contextlib.ExitStack() as stack:
+        reader = csv.reader(in_f)
+        header = next(reader)
+        pid_col_idx = header.index("PersID")
+
+        writer = csv.writer(out_f)
+        writer.writerow(person_year_table_header)
+        risk_set_writers = open_risk_set_sinks(stack, person_year_table_header, risk_set_variants)
+
+        seen_pids = set()
+        for pid, [*career] in itertools.groupby(reader, key=operator.itemgetter(pid_col_idx)):
+            if pid in seen_pids:
+                raise ValueError("PERSON-LEGISLATURE TABLE NOT SORTED BY PersID: " + pid)
+            seen_pids.add(pid)
+
+            multi_legis_parl = 1 if len(career) > 1 else 0
+            career_person_years = [pers_yr for pers_leg in career
+                                   for pers_yr in mandate_person_years(pers_leg, header, multi_legis_parl)]
+            add_colleague_convictions(career_person_years, person_year_table_header, convicted_index)
+
+            [writer.writerow(p_yr) for p_yr in career_person_years]
+
+            career_person_years.sort(key=operator.itemgetter(person_year_table_header.index("year")))
+            write_person_risk_sets(career_person_years, person_year_table_header, risk_set_variants, risk_set_writers)
+
+
+def mandate_person_years(pers_leg, header, multi_legis_parl):
+    """
+    Turn one person-legislature (i.e. one mandate) into person-years, yielded in chronological order.
+
+    NB: yields nothing for those who died in office, and for pre-2000 legislatures.
+
+    :param pers_leg: list, one row of the person-legislature table
+    :param header: list, the header of the person-legislature table
+    :param multi_legis_parl: int, 1 if this person was, ultimately, in more than one legislature, else 0
+    :return: generator of person-years, as lists laid out as in person_year_table_header
+    """
+
+    # get column indexes for the person-legislature table
+    surnames_col_idx, given_names_col_idx = header.index("surnames"), header.index("given names")
+    mandate_start_col_idx, mandate_end_col_idx = header.index("mandate start"), header.index("mandate end")
+    pid_col_idx, seniority_col_idx = header.index("PersID"), header.index("seniority")
+    leg_col_idx, chamb_col_idx = header.index("legislature"), header.index("chamber")
+    const_col_idx, s_party_col_idx = header.index("constituency"), header.index("entry party code")
+    p_switch_yr_col_idx, died_col_idx = header.index("first party switch year"), header.index("death status")
+    dest_party_col_idx, frmr_switcher_col_idx = header.index("destination party code"), header.index("former switcher")
+
+    # ignore those who died in office: only ~60 mandates out of ~4000 died in office, and of these only 3 switched
+    # parties before dying; so not loosing too much information if we throw out data on these dead, and gain model
+    # simplicity since we don't need to do multiple-outcome survival models
+    if pers_leg[died_col_idx] == "no death in office":
+
+        leg = pers_leg[leg_col_idx]
+
+        # look only at post-2000 legislatures (TODO fill in data for previous legislatures too)
+        if leg in {"2000-2004", "2004-2008", "2008-2012", "2012-2016", "2016-2020"}:
+
+            # get names
+            surnames, given_names = pers_leg[surnames_col_idx], pers_leg[given_names_col_idx]
+
+            # get the number of years that the parliamentarian served in a particular legislature
+            # NB: since elections are typically in Nov/Dec, mandates usually start in December. Ignore that first
+            # year since politics don't really start until January of the next year, so a mandate from 2004-2008 is
+            # really 2005-2008, which is still 4 years (inclusive), up to the elections in Nov/Dec 2008.
+            # NB: mandate info has form = "YR-MO-DAY"
+            start_year, start_month = iso_date(pers_leg[mandate_start_col_idx])[:2]
+            if start_year in {2000, 2004, 2008, 2012, 2016} and start_month == 12:
+                first_year_in_leg = start_year + 1
+            else:
+                first_year_in_leg = start_year
+
+            last_year_in_leg, last_month_in_leg = iso_date(pers_leg[mandate_end_col_idx])[:2]
+            years_in_leg = list(range(first_year_in_leg, last_year_in_leg + 1))
+            pid, senior, leg, = pers_leg[pid_col_idx], pers_leg[seniority_col_idx], pers_leg[leg_col_idx]
+            senate = 1 if pers_leg[chamb_col_idx] == "SENATOR" else 0
+            const, former_switcher = pers_leg[const_col_idx], pers_leg[frmr_switcher_col_idx]
+            s_party, p_switch_yr = pers_leg[s_party_col_idx], pers_leg[p_switch_yr_col_idx]
+
+            seniority_cat = get_seniority_cat(senior)
+
+            if s_party in party_name_changes and \
+                    leg in {"2000-2004", "2004-2008", "2008-2012", "2012-2016", "2016-2020"}:
+                s_party = party_name_changes[s_party]
+
+            h_reg = historical_regions_dict[const]
+            s_party_ethnic = 1 if s_party in ethnic_parties else 0
+            s_personality_party = 1 if s_party in personality_parties else 0
+
+            # the years of a mandate come in order, so rank changes can be computed as we go
+            previous_rank = None
+
+            for idx, yr in enumerate(years_in_leg):
+                legis_clock = idx + 1
+                s_ppg_size = get_ppg_size(s_party, senate, yr, leg, pool_chambers=True) if yr > 2008 else ""
+                govt = govt_parties[yr][s_party]
+                local_party_overlap = get_local_govt_parties(leg, const, s_party)
+                party_switch = 1 if p_switch_yr and int(yr) == int(p_switch_yr) else 0
+                elec_yr = 1 if int(yr) in election_years else 0
+                leader_change = 1 if yr in party_leader_changes and s_party in party_leader_changes[yr] else 0
+                leave_early = 1 if yr == last_year_in_leg and last_month_in_leg <= 5 else 0
+                dest_party = pers_leg[dest_party_col_idx] if party_switch else ""
+
+                # catch and clean potential issues arising from ppg changes, like party group fusions
+                party_switch, p_switch_yr, dest_party = ad_hoc_ppg_changes(s_party, dest_party, yr,
+                                                                           party_switch, p_switch_yr)
+                pre_switch_rank = get_pre_switch_rank(header, pers_leg, yr)
+                delta_rank = get_rank_change(pre_switch_rank, previous_rank)
+                previous_rank = pre_switch_rank
+
+                idlgcl_switch_cost = ideological_switch_cost(s_party, dest_party, yr) if dest_party else ""
+
+                cnvct_data = get_convictions_data(yr, s_party)
+
+                lead_conv_one_yr = cnvct_data["lead_conv_one_year"]
+                lead_conv_multi_yr = cnvct_data["lead_conv_multi_year"]
+                mconv_full, mconv_old = cnvct_data["min_conv_full"], cnvct_data["min_conv_old"]
+                mconv_new, mconv_none = cnvct_data["min_conv_new"], cnvct_data["min_conv_none"]
+                others_legs_conv_full = cnvct_data["legis_conv_full"]
+                pconv_appeal_same_yr = self_convicted_appeal(surnames, given_names, yr, leg, "same year")
+                pconv_appeal_to_elec = self_convicted_appeal(surnames, given_names, yr, leg, "until next election")
+                pconv_appeal_pmark = self_convicted_appeal(surnames, given_names, yr, leg, "permanent mark")
+
+                # NB: the 0 is a placeholder for colleague convictions, see add_colleague_convictions
+                person_year = [pid, surnames, given_names, leg, legis_clock, yr, multi_legis_parl, senate, const,
+                               h_reg, senior, seniority_cat, s_party, s_ppg_size, s_party_ethnic,
+                               s_personality_party, govt, local_party_overlap, pre_switch_rank, delta_rank,
+                               party_switch, dest_party, idlgcl_switch_cost, former_switcher, elec_yr,
+                               leader_change, leave_early, lead_conv_one_yr, lead_conv_multi_yr, mconv_full,
+                               mconv_old, mconv_new, mconv_none, others_legs_conv_full, 0, pconv_appeal_same_yr,
+                               pconv_appeal_to_elec, pconv_appeal_pmark]
+
+                yield person_year
+
+
+def add_colleague_convictions(person_year_table, header, convicted_index=None):
+    """
+    Fill in, in place, the column counting how many of a legislator's (current or former) party colleagues were
+    convicted in a given year. See party_colleagues.convicted_colleague_exposure for how colleagues are defined.
+
+    :param person_year_table: table of person years, as a list of lists
+    :param header: list, the table header for the person_year_table
+    :param convicted_index: dict, as made by party_colleagues.convicted_colleague_index; if given, the table may hold
+                            just some people (e.g. one career) and their colleagues are looked up in the index, else
+                            the table must hold everyone, since colleague-ship is computed from the table itself
+    :return: None
+    """
+    surnames_col_idx, given_names_col_idx = header.index("surnames"), header.index("given names")
+    yr_col_idx, cllg_conv_col_idx = header.index("year"), header.index("colleague_conv")
+
+    if convicted_index is None:
+        exposure = convicted_colleague_exposure(person_year_table, header)
+    else:
+        exposure = indexed_colleague_exposure(person_year_table, header, convicted_index)
+    for pers_yr in person_year_table:
+        fullname = pers_yr[surnames_col_idx] + " " + pers_yr[given_names_col_idx]
+        pers_yr[cllg_conv_col_idx] = exposure.get((fullname, int(pers_yr[yr_col_idx])), 0)
 
 
 def get_seniority_cat(senior):
     """Map a seniority category number to a string."""
-    # novice = first legislature; journeyman = send; master = third or more
-    seniority_cat_dict = {1: "novice", 2: "journeyman"}
-    seniority_cat = "master"  # implicit category "3"
-    if int(senior) in seniority_cat_dict:
-        seniority_cat = seniority_cat_dict[int(senior)]
-    return seniority_cat
+    return seniority_categories.get(int(senior), "master")  # implicit category "3"
 
 
 def ad_hoc_ppg_changes(s_party, dest_party, yr, party_switch, p_switch_yr):
@@ -190,8 +490,7 @@ def get_pre_switch_rank(header, pers_leg, yr):
     """
     rank_col_idx, rank_dates_col_ind = header.index("entry ppg rank"), header.index("entry ppg rank dates")
     # get the rank of the person within the PPG, relative to the daterange of the rank
-    lower_date = int(pers_leg[rank_dates_col_ind].split("-")[0].split(".")[1])  # in MO.YR-MO.YR format
-    upper_date = int(pers_leg[rank_dates_col_ind].split("-")[1].split(".")[1])
+    lower_date, upper_date = (numeric_date(d)[0] for d in pers_leg[rank_dates_col_ind].split("-"))  # MO.YR-MO.YR
     pre_switch_rank = pers_leg[rank_col_idx] if lower_date <= yr <= upper_date else "membru"
     return pre_switch_rank
 
@@ -210,19 +509,11 @@ def get_ppg_size(s_party, senator, yr, legis, pool_chambers=True):
     :return: int, the size of the PPG at the beginning of that calendar year
     """
 
-    # NB: certain parties ran in electoral alliances and then caucused together, for at least part of a legislature.
-    #     The dict below shows which small parties were in which caucuses, and when.
-    small_party_caucus_switch = {"PC": {"2008-2012": {"ppg switch date": "02.2011",
-                                                      "pre switch ppg": "PSD",
-                                                      "post switch ppg": "PNL"}},
-                                 "UNPR": {"2012-2016": {"ppg switch date": "02.2016",
-                                                        "pre switch ppg": "PSD",
-                                                        "post switch ppg": "UNPR"}}
-                                 }
+    # NB: small parties that caucused with bigger ones count as the bigger one, see small_party_caucus_switch
     if s_party in small_party_caucus_switch:
         if legis in small_party_caucus_switch[s_party]:
             # NB: by convention, I take all years before (INCLUDING the switch year) as pre switch ppg years
-            switch_year = int(small_party_caucus_switch[s_party][legis]["ppg switch date"].split(".")[-1])
+            switch_year = numeric_date(small_party_caucus_switch[s_party][legis]["ppg switch date"])[0]
             if yr <= switch_year:
                 s_party = small_party_caucus_switch[s_party][legis]["pre switch ppg"]
             else:
@@ -312,11 +603,11 @@ def self_convicted_appeal(surnames, given_names, yr, legis, condition):
     fullname = surnames + " " + given_names
     last_legis_year = int(legis.split("-")[1])
     if fullname in first_conviction_appeal_possible:
-        first_conv_date = first_conviction_appeal_possible[fullname].split(".")  # comes in "DAY.MO.YR" format
-        first_conv_month, first_conv_year = first_conv_date[1], int(first_conv_date[2])
+        # comes in "DAY.MO.YR" format
+        first_conv_year, first_conv_month = numeric_date(first_conviction_appeal_possible[fullname])[:2]
 
         # ignore everyone who got their final conviction in this year or earlier; again, date in DAY.MO.YR format
-        if fullname in final_guilty_verdict and int(final_guilty_verdict[fullname].split(".")[-1]) <= int(yr):
+        if fullname in final_guilty_verdict and numeric_date(final_guilty_verdict[fullname])[0] <= int(yr):
             return 0
 
         if condition == "same year" and int(yr) == first_conv_year:
@@ -341,65 +632,64 @@ def ideological_switch_cost(entry_party_code, destination_party_code, year):
     """
 
     edge = entry_party_code + "-" + destination_party_code
-    cost_map = {0: 'low', 1: 'medium', 2: 'high'}
     if entry_party_code != "PNL" and destination_party_code != "PNL":
-        switch_cost = ideological_pswitch_costs["any period"][edge]
-    else:  # edge includes PNL
-        if int(year) <= 2014:
-            switch_cost = ideological_pswitch_costs["pre-2014"][edge]
-        else:  # after 2014 (exclusive)
-            switch_cost = ideological_pswitch_costs["post-2014"][edge]
-    return cost_map[switch_cost]
+        return ideological_switch_cost_categories["any period"][edge]
+    # edge includes PNL
+    if int(year) <= 2014:
+        return ideological_switch_cost_categories["pre-2014"][edge]
+    return ideological_switch_cost_categories["post-2014"][edge]  # after 2014 (exclusive)
 
 
-def rank_change(person_year_table, header):
+def get_rank_change(current_rank, previous_rank):
     """
     Sees how one's rank within the first parliamentary party group has changed between years.
 
     NB: by combining person-years in the first year (who by definition cannot have been demoted) with those in the
         who do not move even when they can, this thing committs a pretty big fudge. I do  it to get a rough sense.
 
-    :param person_year_table:
-    :param header:
-    :return:
+    :param current_rank: str, the pre-switch rank this year, e.g. "secretar"
+    :param previous_rank: str, the pre-switch rank last year; None if this is the first year of the legislature
+    :return: str, "increase", "no change", or "decrease"
     """
-    # intialise the new table
-    py_table_with_rank_change = []
+    if previous_rank is None:  # first year of legislature, no rank change was possible
+        return "no change"
+    if rank_order[current_rank] > rank_order[previous_rank]:
+        return "increase"
+    elif rank_order[current_rank] == rank_order[previous_rank]:
+        return "no change"
+    else:  # rank_order[current_rank] < rank_order[previous_rank]:
+        return "decrease"
 
-    # initialise the dictionary of position rankings
-    rank_dict = {"lider": 3, "vicelider": 2, "secretar": 1, "membru": 0}
 
-    # get column indexes
-    pid_col_idx, rank_col_idx = header.index("person_id"), header.index("pre_switch_rank")
-    leg_col_idx, yr_col_idx = header.index("legis"), header.index("year")
+def first_switch_risk_set(person_year_table, risk_set_table_out_path, header, multi_year_only=False):
+    """
+    Write one first-switch risk set. Kept for convenience, see first_switch_risk_sets for the details and for making
+    several variants at once.
 
-    # sort table by pid and year
-    person_year_table.sort(key=operator.itemgetter(pid_col_idx, yr_col_idx))
+    :param person_year_table: table of person years, as a list of lists
+    :param risk_set_table_out_path: str, path where we want the risk set table to live
+    :param header: list, the table header for the person_year_table
+    :param multi_year_only: bool, switch to only keep people that we observe for more than one year
+    :return: None
+    """
+    if multi_year_only:
+        risk_set_table_out_path = risk_set_table_out_path[:-4] + "_multi_year_only.csv"
+    first_switch_risk_sets(person_year_table, header, [{"out_path": risk_set_table_out_path,
+                                                        "multi_year_only": multi_year_only}])
 
-    # group table by person
-    people = [person for key, [*person] in itertools.groupby(person_year_table, key=operator.itemgetter(pid_col_idx))]
-
-    for person in people:
-        # then group by legislature
-        pers_legs = [p_leg for key, [*p_leg] in itertools.groupby(person, key=operator.itemgetter(leg_col_idx))]
-
-        for p_leg in pers_legs:
-            for idx, pers_yr in enumerate(p_leg):
-                if idx > 0:
-                    current_rank, previous_rank = pers_yr[rank_col_idx], p_leg[idx - 1][rank_col_idx]
-                    if rank_dict[current_rank] > rank_dict[previous_rank]:
-                        delta_rank = "increase"
-                    elif rank_dict[current_rank] == rank_dict[previous_rank]:
-                        delta_rank = "no change"
-                    else:  # rank_dict[current_rank] < rank_dict[previous_rank]:
-                        delta_rank = "decrease"
-                else:  # first year of legislature, no rank change was possible
-                    delta_rank = "no change"
-                py_table_with_rank_change.append(pers_yr[:rank_col_idx + 1] + [delta_rank] + pers_yr[rank_col_idx + 1:])
-    return py_table_with_rank_change
 
+def default_risk_set_variants(risk_set_table_out_path):
+    """
+    The risk sets we make by default: all person-years, and only people observed for more than one year.
 
-def first_switch_risk_set(person_year_table, risk_set_table_out_path, header, multi_year_only=False):
+    :param risk_set_table_out_path: str, path where we want the (full) risk set table to live
+    :return: list of risk set variant specs, see first_switch_risk_sets
+    """
+    return [{"out_path": risk_set_table_out_path},
+            {"out_path": risk_set_table_out_path[:-4] + "_multi_year_only.csv", "multi_year_only": True}]
+
+
+def first_switch_risk_sets(person_year_table, header, variants):
     """
     To facilitate survival analysis where we only care about time to first party switch, create an accurate risk set
     where person years are included only up to (and including) the year in which the first party switch occurs. After
@@ -407,50 +697,95 @@ def first_switch_risk_set(person_year_table, risk_set_table_out_path, header, mu
 
     NB: I leave recurring party switches out of this since that's a qualitatively different dynamic.
 
+    Several variants of the risk set (e.g. for robustness checks) are written in the same pass: the table is sorted
+    and grouped by person and legislature once, the switch year is found once per person-legislature, and then each
+    variant keeps whichever of the at-risk person-years pass its filters. Each variant is a dict of form
+        {"out_path": str, path where we want this risk set to live,
+         "multi_year_only": bool, only keep people that we observe for more than one year (default False),
+         "exclude_parties": set of start party codes whose person-years we drop (default none),
+         "min_year": int, drop person-years before this year (default none),
+         "max_year": int, drop person-years after this year (default none)}
+
+    NB: "multi_year_only" looks at all of a person's years, before the other filters are applied.
+
     :param person_year_table: table of person years, as a list of lists
-    :param risk_set_table_out_path: str, path where we want the risk set table to live
     :param header: list, the table header for the person_year_table
-    :param multi_year_only: bool, switch to only keep people that we observe for more than one year
+    :param variants: list of dicts, the risk set variant specs
     :return: None
     """
 
-    # get header column indexes
     pid_col_idx, yr_col_idx = header.index("person_id"), header.index("year")
-    leg_col_idx, pswitch1_indicator_col_idx = header.index("legis"), header.index("p_switch1")
 
-    if multi_year_only:
-        risk_set_table_out_path = risk_set_table_out_path[:-4] + "_multi_year_only.csv"
-
-    # sort by person-ID and year, group by person ID
+    # sort by person-ID and year, then write every variant while going through the people one at a time
     person_year_table.sort(key=operator.itemgetter(pid_col_idx, yr_col_idx))
-    people = [person for key, [*person] in itertools.groupby(person_year_table, key=operator.itemgetter(pid_col_idx))]
 
-    first_switch_risk_set_table = []
-    for person in people:
-        if multi_year_only and len(person) < 2:
-            continue
+    with contextlib.ExitStack() as stack:
+        writers = open_risk_set_sinks(stack, header, variants)
+        for key, [*person] in itertools.groupby(person_year_table, key=operator.itemgetter(pid_col_idx)):
+            write_person_risk_sets(person, header, variants, writers)
 
-        # now group the person by legislature
-        pers_legs = [p_leg for key, [*p_leg] in itertools.groupby(person, key=operator.itemgetter(leg_col_idx))]
 
-        for p_leg in pers_legs:
-            # find the year, if any, in which the person switched parties
-            party_switch_year = ''
-            for pers_yr in p_leg:
-                if int(pers_yr[pswitch1_indicator_col_idx]) == 1:
-                    party_switch_year = int(pers_yr[yr_col_idx])
-            # if there was a party switch, only include pre-switch years (switch year inclusive)
-            for pers_yr in p_leg:
-                if party_switch_year:
-                    if int(pers_yr[yr_col_idx]) <= party_switch_year:
-                        first_switch_risk_set_table.append(pers_yr)
-                else:
-                    first_switch_risk_set_table.append(pers_yr)
+def open_risk_set_sinks(stack, header, variants):
+    """
+    Open the output file of each risk set variant, write the header, and return the csv writers, in variant order.
 
-    with open(risk_set_table_out_path, 'w') as out_f:
-        writer = csv.writer(out_f)
+    :param stack: contextlib.ExitStack, which closes the files when we are done
+    :param header: list, the table header for the person_year_table
+    :param variants: list of dicts, the risk set variant specs, see first_switch_risk_sets
+    :return: list of csv writers
+    """
+    writers = []
+    for variant in variants:
+        writer = csv.writer(stack.enter_context(open(variant["out_path"], 'w')))
         writer.writerow(header)
-        [writer.writerow(p_yr) for p_yr in first_switch_risk_set_table]
+        writers.append(writer)
+    return writers
+
+
+def write_person_risk_sets(person, header, variants, writers):
+    """
+    Write the at-risk person-years of one person to every risk set variant, see first_switch_risk_sets.
+
+    :param person: list of all the person-years of one person, sorted by year
+    :param header: list, the table header for the person_year_table
+    :param variants: list of dicts, the risk set variant specs
+    :param writers: list of csv writers, one per variant, see open_risk_set_sinks
+    :return: None
+    """
+
+    # get header column indexes
+    yr_col_idx, leg_col_idx = header.index("year"), header.index("legis")
+    pswitch1_indicator_col_idx, s_party_col_idx = header.index("p_switch1"), header.index("start_party")
+
+    # group the person by legislature
+    for leg_key, [*p_leg] in itertools.groupby(person, key=operator.itemgetter(leg_col_idx)):
+
+        # find the year, if any, in which the person switched parties
+        party_switch_year = ''
+        for pers_yr in p_leg:
+            if int(pers_yr[pswitch1_indicator_col_idx]) == 1:
+                party_switch_year = int(pers_yr[yr_col_idx])
+        # if there was a party switch, only include pre-switch years (switch year inclusive)
+        if party_switch_year:
+            p_leg = [pers_yr for pers_yr in p_leg if int(pers_yr[yr_col_idx]) <= party_switch_year]
+
+        for variant, writer in zip(variants, writers):
+            if variant.get("multi_year_only") and len(person) < 2:
+                continue
+            for pers_yr in p_leg:
+                if risk_set_variant_keeps(variant, pers_yr, yr_col_idx, s_party_col_idx):
+                    writer.writerow(pers_yr)
+
+
+def risk_set_variant_keeps(variant, pers_yr, yr_col_idx, s_party_col_idx):
+    """Return True if the person-year passes the party and year filters of a risk set variant."""
+    if pers_yr[s_party_col_idx] in variant.get("exclude_parties", ()):
+        return False
+    if "min_year" in variant and int(pers_yr[yr_col_idx]) < variant["min_year"]:
+        return False
+    if "max_year" in variant and int(pers_yr[yr_col_idx]) > variant["max_year"]:
+        return False
+    return True
 
 
 if __name__ == "__main__":
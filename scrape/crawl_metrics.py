@@ -0,0 +1,287 @@
+"""
+Telemetry of a scrape, so that we can compare how fast crawls went across runs, and see when the site slows down while
+one is going on.
+
+The metrics of a scrape (see new_crawl_metrics) count
+    - the requests, by outcome (the HTTP status, or the kind of error, e.g. "ConnectionError") and by whether they went
+      to the network or were answered from the cache (see http_cache)
+    - how long the requests to the network took, as a histogram and as the raw latencies (for exact percentiles)
+    - the bytes fetched, and the retries
+    - the pages done, i.e. archived or given up on, from which we get the pages per second over the last minute or
+      so, and an estimate of how long the rest of the scrape will take
+While the scrape runs they are written every so often (see start_metrics_writer) to a file in the Prometheus text
+format, which e.g. the textfile collector of node_exporter picks up; when it's done, a json summary of the whole crawl
+(see crawl_summary) goes next to it, with a timeline by the minute, so that slowdowns show up.
+"""
+
+import bisect
+import collections
+import json
+import math
+import os
+import threading
+import time
+from scrape import rate_control
+
+# upper bounds, in seconds, of the buckets of the latency histogram
+latency_buckets = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, float("inf"))
+
+
+def new_crawl_metrics(total_pages, controller=None, recent_window=60.0, timeline_step=60.0):
+    """
+    Make the metrics of a scrape.
+
+    :param total_pages: int, how many pages the scrape has to get
+    :param controller: dict, the rate controller of the scrape, if it has one (see rate_control), whose knobs we then
+                       report too
+    :param recent_window: float, seconds over which we measure the current pages per second, for the ETA
+    :param timeline_step: float, seconds per step of the timeline in the summary
+    :return: dict
+    """
+    return {"total pages": total_pages, "controller": controller, "recent window": recent_window,
+            "timeline step": timeline_step, "started": time.time(), "started monotonic": time.monotonic(),
+            "requests": collections.Counter(), "latencies": [], "latency buckets": [0] * len(latency_buckets),
+            "bytes": 0, "retries": 0, "pages": collections.Counter(), "recent pages": collections.deque(),
+            "timeline": {}, "lock": threading.Lock()}
+
+
+def record_request(metrics, started, response=None, error=None):
+    """
+    Count a request.
+
+    :param metrics: dict, as made by new_crawl_metrics; None to count nothing
+    :param started: list, holding the monotonic time at which the request went to the network, if it did; empty if it
+                    was answered from the cache
+    :param response: requests.Response, if the request got one
+    :param error: Exception, if the request failed; NB: that of an error status (from raise_for_status) carries the
+                  response with it
+    :return: None
+    """
+    if metrics is None:
+        return
+    now = time.monotonic()
+    if response is None:
+        response = getattr(error, "response", None)
+    outcome = str(response.status_code) if response is not None else type(error).__name__
+    source = "network" if started else "cache"
+    with metrics["lock"]:
+        metrics["requests"][(outcome, source)] += 1
+        if response is not None:
+            metrics["bytes"] += len(response.content)
+        step = timeline_step_of(metrics, now)
+        step["requests"] += 1
+        if error is not None:
+            step["failures"] += 1
+        if started:
+            latency = now - started[0]
+            metrics["latencies"].append(latency)
+            metrics["latency buckets"][bisect.bisect_left(latency_buckets, latency)] += 1
+            step["latency sum"] += latency
+            step["network requests"] += 1
+
+
+def record_retry(metrics):
+    """Count a page that goes back in line after a failed request."""
+    if metrics is not None:
+        with metrics["lock"]:
+            metrics["retries"] += 1
+
+
+def record_page(metrics, archived):
+    """
+    Count a page as done, i.e. archived, or given up on and put on the recalcitrant list.
+
+    :param metrics: dict, as made by new_crawl_metrics; None to count nothing
+    :param archived: bool
+    :return: None
+    """
+    if metrics is None:
+        return
+    now = time.monotonic()
+    with metrics["lock"]:
+        metrics["pages"]["archived" if archived else "recalcitrant"] += 1
+        timeline_step_of(metrics, now)["pages"] += 1
+        metrics["recent pages"].append(now)
+        while metrics["recent pages"][0] < now - metrics["recent window"]:
+            metrics["recent pages"].popleft()
+
+
+def timeline_step_of(metrics, now):
+    """Return the counts of the step of the timeline that a (monotonic) time falls in; call with the lock held."""
+    idx = int((now - metrics["started monotonic"]) // metrics["timeline step"])
+    if idx not in metrics["timeline"]:
+        metrics["timeline"][idx] = {"requests": 0, "network requests": 0, "failures": 0, "pages": 0,
+                                    "latency sum": 0.0}
+    return metrics["timeline"][idx]
+
+
+def progress(metrics):
+    """
+    Work out how far along the scrape is.
+
+    :param metrics: dict, as made by new_crawl_metrics
+    :return: dict with the pages done and remaining, the pages per second over the whole scrape and over the recent
+             window, and the ETA in seconds (None until we have a rate to go by)
+    """
+    now = time.monotonic()
+    with metrics["lock"]:
+        done = sum(metrics["pages"].values())
+        recent = [t for t in metrics["recent pages"] if t >= now - metrics["recent window"]]
+    elapsed = now - metrics["started monotonic"]
+    # NB: until a whole window has passed, the recent rate is over the time since the start
+    recent_rate = len(recent) / min(elapsed, metrics["recent window"]) if elapsed > 0 else 0.0
+    remaining = max(0, metrics["total pages"] - done)
+    return {"pages done": done, "pages remaining": remaining, "elapsed": elapsed,
+            "pages per second": done / elapsed if elapsed > 0 else 0.0, "recent pages per second": recent_rate,
+            "eta": remaining / recent_rate if recent_rate > 0 else None}
+
+
+def progress_line(metrics):
+    """Return the progress of the scrape in a few words, e.g. "137/9830 pages, 4.21 pages/s, ETA 00:38:22"."""
+    now = progress(metrics)
+    eta = "?" if now["eta"] is None else time.strftime("%H:%M:%S", time.gmtime(now["eta"]))
+    line = str(now["pages done"]) + "/" + str(metrics["total pages"]) + " pages, " + \
+        str(round(now["recent pages per second"], 2)) + " pages/s, ETA " + eta
+    if metrics["controller"] is not None:
+        rate, concurrency = rate_control.current_knobs(metrics["controller"])
+        line += ", " + str(round(rate, 2)) + " requests/s, " + str(concurrency) + " at once"
+    return line
+
+
+def prometheus_text(metrics):
+    """
+    Write out the metrics as they stand, in the Prometheus text format.
+
+    :param metrics: dict, as made by new_crawl_metrics
+    :return: str
+    """
+    now = progress(metrics)
+    with metrics["lock"]:
+        requests_by_label = sorted(metrics["requests"].items())
+        buckets, latencies = list(metrics["latency buckets"]), list(metrics["latencies"])
+        n_bytes, retries, pages = metrics["bytes"], metrics["retries"], dict(metrics["pages"])
+
+    lines = []
+
+    def add_metric(name, kind, help_text, samples):
+        lines.extend(["# HELP scrape_" + name + " " + help_text, "# TYPE scrape_" + name + " " + kind])
+        lines.extend("scrape_" + name + suffix + " " + format_value(value) for suffix, value in samples)
+
+    add_metric("requests_total", "counter", "Requests made, by outcome (HTTP status or error) and source.",
+               [('{outcome="' + outcome + '",source="' + source + '"}', n)
+                for (outcome, source), n in requests_by_label])
+    cumulative = 0
+    histogram = []
+    for bound, n in zip(latency_buckets, buckets):
+        cumulative += n
+        histogram.append(('_bucket{le="' + ("+Inf" if math.isinf(bound) else str(bound)) + '"}', cumulative))
+    histogram.extend([("_sum", sum(latencies)), ("_count", len(latencies))])
+    add_metric("request_duration_seconds", "histogram", "Seconds that requests to the network took.", histogram)
+    add_metric("response_bytes_total", "counter", "Bytes of the bodies of the responses.", [("", n_bytes)])
+    add_metric("retries_total", "counter", "Pages put back in line after a failed request.", [("", retries)])
+    add_metric("pages_total", "counter", "Pages done, by whether they were archived or given up on.",
+               [('{result="' + result + '"}', pages.get(result, 0)) for result in ("archived", "recalcitrant")])
+    add_metric("pages_remaining", "gauge", "Pages still to get.", [("", now["pages remaining"])])
+    add_metric("pages_per_second", "gauge", "Pages done per second, over the recent window.",
+               [("", now["recent pages per second"])])
+    if now["eta"] is not None:
+        add_metric("eta_seconds", "gauge", "Estimated seconds until the scrape is done.", [("", now["eta"])])
+    if metrics["controller"] is not None:
+        rate, concurrency = rate_control.current_knobs(metrics["controller"])
+        add_metric("rate_limit_requests_per_second", "gauge", "Requests a second the rate controller allows.",
+                   [("", rate)])
+        add_metric("concurrency_limit", "gauge", "Requests in flight the rate controller allows.", [("", concurrency)])
+    add_metric("start_time_seconds", "gauge", "Unix time at which the scrape started.", [("", metrics["started"])])
+    add_metric("last_update_time_seconds", "gauge", "Unix time at which these metrics were written.",
+               [("", time.time())])
+    return "\n".join(lines) + "\n"
+
+
+def format_value(value):
+    """Format a sample value as Prometheus likes it: integers as such, floats with up to six decimals."""
+    if isinstance(value, int):
+        return str(value)
+    return repr(round(value, 6))
+
+
+def write_atomically(path, text):
+    """Write a file via a temporary one, so that whoever reads it (e.g. a Prometheus collector) never sees half."""
+    with open(path + ".tmp", "w") as out_f:
+        out_f.write(text)
+    os.replace(path + ".tmp", path)
+
+
+def start_metrics_writer(metrics, metrics_path, interval=15.0):
+    """
+    Write the metrics to a file in the Prometheus text format every so often, from a thread of their own, so that they
+    keep coming even when the site hangs.
+
+    :param metrics: dict, as made by new_crawl_metrics
+    :param metrics_path: str
+    :param interval: float, seconds between writes
+    :return: 2-tuple of (threading.Event, threading.Thread); set the event to stop the writer, which then writes the
+             metrics one last time, and join the thread to wait for that
+    """
+    stop = threading.Event()
+
+    def write_metrics():
+        while not stop.wait(interval):
+            write_atomically(metrics_path, prometheus_text(metrics))
+        write_atomically(metrics_path, prometheus_text(metrics))
+
+    write_atomically(metrics_path, prometheus_text(metrics))
+    writer = threading.Thread(target=write_metrics, daemon=True)
+    writer.start()
+    return stop, writer
+
+
+def latency_percentiles(latencies, percentiles=(50, 90, 99)):
+    """Return the given percentiles (nearest rank) and the maximum of a list of latencies, to the millisecond."""
+    if not latencies:
+        return {}
+    ordered = sorted(latencies)
+    summary = {"p" + str(p): round(ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)], 3) for p in percentiles}
+    summary["max"] = round(ordered[-1], 3)
+    return summary
+
+
+def crawl_summary(metrics):
+    """
+    Sum up a whole scrape, to compare against other runs.
+
+    :param metrics: dict, as made by new_crawl_metrics
+    :return: dict, which goes straight to json
+    """
+    now = progress(metrics)
+    with metrics["lock"]:
+        latencies = list(metrics["latencies"])
+        requests_by_label = dict(metrics["requests"])
+        timeline = sorted(metrics["timeline"].items())
+        summary = {"started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(metrics["started"])),
+                   "seconds": round(now["elapsed"], 3), "total_pages": metrics["total pages"],
+                   "pages": dict(metrics["pages"]), "bytes": metrics["bytes"], "retries": metrics["retries"]}
+    n_requests = sum(requests_by_label.values())
+    summary.update({"requests": n_requests,
+                    "network_requests": sum(n for (_, source), n in requests_by_label.items() if source == "network"),
+                    "requests_by_outcome": {outcome + " " + source: n
+                                            for (outcome, source), n in sorted(requests_by_label.items())},
+                    "requests_per_second": round(n_requests / now["elapsed"], 3) if now["elapsed"] > 0 else 0.0,
+                    "pages_per_second": round(now["pages per second"], 3),
+                    "latency_seconds": latency_percentiles(latencies),
+                    "timeline": [{"from_second": round(idx * metrics["timeline step"]), "pages": step["pages"],
+                                  "requests": step["requests"], "failures": step["failures"],
+                                  "mean_latency": round(step["latency sum"] / step["network requests"], 3)
+                                  if step["network requests"] else None}
+                                 for idx, step in timeline]})
+    if metrics["controller"] is not None:
+        rate, concurrency = rate_control.current_knobs(metrics["controller"])
+        summary.update({"final_rate": round(rate, 3), "final_concurrency": concurrency,
+                        "back_offs": metrics["controller"]["decreases"]})
+    return summary
+
+
+def write_crawl_summary(metrics, summary_path):
+    """Write the summary of a scrape (see crawl_summary) to a json file, and return it."""
+    summary = crawl_summary(metrics)
+    write_atomically(summary_path, json.dumps(summary, indent=2) + "\n")
+    return summary
@@ -0,0 +1,169 @@
+"""
+A durable queue of urls to scrape, in a directory, which several scrapers (on one machine, or on several that share
+the filesystem) can pull from at once; see scrape.crawl_worker.
+
+Each url is a small json file, named after the hash of its normalised url (see http_cache.normalise_url), that moves
+between four subdirectories:
+    - "todo": waiting for a worker
+    - "leased": taken by a worker, which has lease_seconds from the file's modification time to finish with it, and
+      can renew the lease (see renew_leases) while it works
+    - "done": fetched, and in the archive shard of some worker
+    - "failed": given up on after max_attempts failed requests
+A worker takes a url by renaming its file from "todo" to "leased". A rename is atomic, on local filesystems and on NFS
+alike, so when several workers go for the same url only one of them gets it. A url whose lease has expired (e.g. since
+its worker died) goes back to "todo" (see reap_expired_leases), for another worker to take.
+
+NB: a worker that is slow rather than dead may finish with a url after it has been handed out again, so a url can end
+    up in more than one shard; merge_shards in scrape.py keeps one copy of each page. It also means that the clocks of
+    the machines should agree to well within lease_seconds.
+"""
+
+import hashlib
+import json
+import os
+import random
+import time
+from scrape import http_cache
+
+queue_states = ("todo", "leased", "done", "failed")
+
+
+def url_key(url):
+    """Return the name of the file of a url in the queue."""
+    return hashlib.sha256(http_cache.normalise_url(url).encode("utf-8")).hexdigest()
+
+
+def queue_keys(queue_dir, state):
+    """Return the keys of the urls in a state, i.e. in one of the subdirectories, leaving out half-written files."""
+    return [name for name in os.listdir(os.path.join(queue_dir, state)) if not name.endswith(".tmp")]
+
+
+def write_entry(path, entry):
+    """Write the json entry of a url, via a temporary file, so that nobody ever reads half of it."""
+    with open(path + ".tmp", "w") as out_f:
+        json.dump(entry, out_f)
+    os.replace(path + ".tmp", path)
+
+
+def read_entry(path):
+    """Read the json entry of a url."""
+    with open(path, "r") as in_f:
+        return json.load(in_f)
+
+
+def make_crawl_queue(queue_dir, urls):
+    """
+    Put urls in the queue, making it if need be. Urls that are in it already, in whatever state, are left alone, so
+    this can be rerun (e.g. with a longer list of links) without redoing anything.
+
+    :param queue_dir: str
+    :param urls: iterable of str
+    :return: int, how many urls were added
+    """
+    for state in queue_states:
+        os.makedirs(os.path.join(queue_dir, state), exist_ok=True)
+    known = set()
+    for state in queue_states:
+        known.update(queue_keys(queue_dir, state))
+    added = 0
+    for url in urls:
+        key = url_key(url)
+        if key not in known:
+            write_entry(os.path.join(queue_dir, "todo", key), {"url": url, "attempts": 0})
+            known.add(key)
+            added += 1
+    return added
+
+
+def lease_url(queue_dir):
+    """
+    Take a url from the queue.
+
+    :param queue_dir: str
+    :return: 2-tuple of (key, entry), where entry is a dict with the url and how many times it was tried before; or None
+             if there is nothing left to take (though there may be urls leased by other workers, see queue_counts)
+    """
+    keys = queue_keys(queue_dir, "todo")
+    # NB: workers go through the urls in different orders, so that they don't all fight over the same one
+    random.shuffle(keys)
+    for key in keys:
+        todo_path, leased_path = os.path.join(queue_dir, "todo", key), os.path.join(queue_dir, "leased", key)
+        try:
+            # NB: the lease runs from the modification time, which a rename keeps, so we touch the file first; were we
+            #     to do it after, another worker could reap the lease in between, going by when the url was queued
+            os.utime(todo_path)
+            os.rename(todo_path, leased_path)
+        except FileNotFoundError:  # another worker got there first
+            continue
+        return key, read_entry(leased_path)
+    return None
+
+
+def renew_leases(queue_dir, keys):
+    """Restart the leases of urls that we're still working on, so that they don't expire."""
+    for key in keys:
+        try:
+            os.utime(os.path.join(queue_dir, "leased", key))
+        except FileNotFoundError:  # the lease expired already, and the url went back in the queue
+            pass
+
+
+def complete_url(queue_dir, key):
+    """Mark a leased url as done; call only once its page is safely in a shard."""
+    try:
+        os.rename(os.path.join(queue_dir, "leased", key), os.path.join(queue_dir, "done", key))
+    except FileNotFoundError:  # the lease expired while we worked, so someone else will fetch it again; no harm done
+        pass
+
+
+def fail_url(queue_dir, key, entry, max_attempts=3, give_up=False):
+    """
+    Put a leased url whose request failed back in the queue, or give up on it after max_attempts.
+
+    :param queue_dir: str
+    :param key: str
+    :param entry: dict, as returned with the key by lease_url
+    :param max_attempts: int
+    :param give_up: bool, whether to give up on the url now, e.g. after a 404, which retrying won't fix
+    :return: bool, whether we gave up on the url
+    """
+    leased_path = os.path.join(queue_dir, "leased", key)
+    entry = dict(entry, attempts=entry["attempts"] + 1)
+    given_up = give_up or entry["attempts"] >= max_attempts
+    try:
+        write_entry(leased_path, entry)
+        os.rename(leased_path, os.path.join(queue_dir, "failed" if given_up else "todo", key))
+    except FileNotFoundError:  # the lease expired while we worked
+        pass
+    return given_up
+
+
+def reap_expired_leases(queue_dir, lease_seconds):
+    """
+    Put the urls whose leases have expired back in the queue, for another worker to take.
+
+    :param queue_dir: str
+    :param lease_seconds: float
+    :return: int, how many urls went back in the queue
+    """
+    reaped = 0
+    expired_before = time.time() - lease_seconds
+    for key in queue_keys(queue_dir, "leased"):
+        leased_path = os.path.join(queue_dir, "leased", key)
+        try:
+            if os.path.getmtime(leased_path) < expired_before:
+                os.rename(leased_path, os.path.join(queue_dir, "todo", key))
+                reaped += 1
+        except FileNotFoundError:  # its worker finished with it, or another worker reaped it
+            continue
+    return reaped
+
+
+def queue_counts(queue_dir):
+    """Return how many urls are in each state, as a dict of form {state: count}."""
+    return {state: len(queue_keys(queue_dir, state)) for state in queue_states}
+
+
+def failed_urls(queue_dir):
+    """Return the urls that the workers gave up on, sorted."""
+    return sorted(read_entry(os.path.join(queue_dir, "failed", key))["url"] for key in queue_keys(queue_dir, "failed"))
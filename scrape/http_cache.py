@@ -0,0 +1,126 @@
+"""
+An on-disk cache of the responses the scraper gets, so that a scrape can be rerun (to debug it, to test it, or to
+change the layout of the archive) without going to the network, and get exactly the same pages.
+
+Responses are keyed by their normalised url (see normalise_url) and stored one per file: the body as is, next to a json
+file with the url, the status, the headers and the encoding. There are three modes:
+    - "off": always go to the network, the cache is neither read nor written
+    - "record": answer from the cache if we can, otherwise go to the network and store what comes back
+    - "replay": only answer from the cache; a url that isn't in it is an error, never a request
+NB: only successful responses (status under 400) are recorded, so that a rate-limit or error page never gets replayed
+    as if it were the real thing.
+"""
+
+import hashlib
+import json
+import os
+import time
+import urllib.parse
+import requests
+from requests.structures import CaseInsensitiveDict
+
+cache_modes = ("off", "record", "replay")
+
+default_ports = {"http": 80, "https": 443}
+
+
+def normalise_url(url):
+    """
+    Normalise a url so that the same page always gets the same key: lowercase scheme and host, no default port, no
+    fragment, and the query parameters sorted.
+
+    :param url: str, e.g. "HTTP://www.cdep.ro:80/pls/parlam/structura2015.mp?leg=2012&idm=1&cam=2"
+    :return: str, e.g. "http://www.cdep.ro/pls/parlam/structura2015.mp?cam=2&idm=1&leg=2012"
+    """
+    parts = urllib.parse.urlsplit(url)
+    scheme, host = parts.scheme.lower(), (parts.hostname or "").lower()
+    if parts.port and parts.port != default_ports.get(scheme):
+        host += ":" + str(parts.port)
+    query = urllib.parse.urlencode(sorted(urllib.parse.parse_qsl(parts.query, keep_blank_values=True)))
+    return urllib.parse.urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+
+def cache_paths(url, cache_dir):
+    """Return the paths of the body and of the metadata of the cached response to a url."""
+    key = hashlib.sha256(normalise_url(url).encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, key + ".body"), os.path.join(cache_dir, key + ".json")
+
+
+def load_response(url, cache_dir):
+    """
+    Rebuild the cached response to a url, as a requests.Response, so that its .text is exactly what it was.
+
+    :return: requests.Response, or None if the url isn't in the cache
+    """
+    body_path, meta_path = cache_paths(url, cache_dir)
+    if not os.path.isfile(meta_path):
+        return None
+    with open(meta_path, "r") as in_f:
+        meta = json.load(in_f)
+    with open(body_path, "rb") as in_f:
+        content = in_f.read()
+    response = requests.models.Response()
+    response.status_code, response.url, response.encoding = meta["status"], meta["url"], meta["encoding"]
+    response.headers = CaseInsensitiveDict(meta["headers"])
+    response._content = content
+    response.from_cache = True
+    return response
+
+
+def store_response(url, response, cache_dir):
+    """Write a response to the cache; the metadata goes last, so a url only counts as cached once its body is in."""
+    os.makedirs(cache_dir, exist_ok=True)
+    body_path, meta_path = cache_paths(url, cache_dir)
+    meta = {"url": normalise_url(url), "status": response.status_code, "headers": dict(response.headers),
+            "encoding": response.encoding}
+    # write to temporary files first, so that a crash midway never leaves a half-written response
+    with open(body_path + ".tmp", "wb") as out_f:
+        out_f.write(response.content)
+    os.replace(body_path + ".tmp", body_path)
+    with open(meta_path + ".tmp", "w") as out_f:
+        json.dump(meta, out_f, indent=2, sort_keys=True)
+    os.replace(meta_path + ".tmp", meta_path)
+
+
+def check_cache_mode(cache_dir, mode):
+    """
+    Raise a ValueError if a mode is unknown, or needs a cache and has none; NB: a replay without a cache would
+    otherwise quietly go to the network, which is what a replay must never do.
+    """
+    if mode not in cache_modes:
+        raise ValueError("UNKNOWN CACHE MODE " + str(mode))
+    if mode != "off" and cache_dir is None:
+        raise ValueError("NO CACHE DIRECTORY FOR CACHE MODE " + mode)
+
+
+def get_page(url, headers=None, pause=0.0, cache_dir=None, mode="off", timeout=None):
+    """
+    Get a page, from the cache or from the network as the mode says.
+
+    :param url: str
+    :param headers: dict, the headers of the request, if it goes to the network
+    :param pause: float, seconds to wait before going to the network, so as not to hammer the site, or a function that
+                  does the waiting (e.g. for a slot from a rate controller); answers from the cache don't wait
+    :param cache_dir: str, directory of the cache; None only if the mode is "off"
+    :param mode: str, one of cache_modes
+    :param timeout: float, seconds to wait for the site to connect, and then for each part of the answer, before giving
+                    up with a requests.exceptions.Timeout; None to wait forever
+    :return: requests.Response; those from the cache have from_cache set to True
+    """
+    check_cache_mode(cache_dir, mode)
+    if mode != "off":
+        response = load_response(url, cache_dir)
+        if response is not None:
+            return response
+        if mode == "replay":
+            raise ValueError("NOT IN THE CACHE: " + url)
+
+    if callable(pause):
+        pause()
+    else:
+        time.sleep(pause)
+    response = requests.get(url, headers=headers, timeout=timeout)
+    response.from_cache = False
+    if mode == "record" and response.status_code < 400:
+        store_response(url, response, cache_dir)
+    return response
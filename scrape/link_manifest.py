@@ -0,0 +1,169 @@
+"""
+Reading the listing of links to the profile pages (e.g. links_parl_htmls_feb_2021.txt, copied off the site's list of
+all parliamentarians) as a stream, rather than as one BeautifulSoup tree, and keeping what each row says about the
+page that its links lead to.
+
+The listing is an html table, one row per parliamentarian, with the number and the name spanning the rows of all the
+mandates of that parliamentarian; each mandate has two links to the same profile page, one reading the years of the
+legislature (e.g. "2000-2004"), the other the chamber (e.g. "deputat"). E.g.
+    <tr class="even">
+    <td rowspan=2>8.</td>
+    <td rowspan=2 style="text-align: left;" rowspan=2>Adam Ioan</td>
+    <td><a href="/pls/parlam/structura2015.mp?idm=1&leg=2012&cam=2">2012-2016</a></td>
+    <td><a href="/pls/parlam/structura2015.mp?idm=1&leg=2012&cam=2">deputat</a></td>
+    </tr>
+We go through it cell by cell with a regex (see listing_cells), keeping only the last number and name that we saw, so
+it takes a fraction of the time and memory of building the tree.
+
+The manifest (see write_link_manifest) is a csv with one line per profile page, under the name that the page has in
+the archive, so that later stages can attach what the listing says (e.g. the name, the chamber) to a page without
+parsing it; read_link_manifest gives back its columns with their types.
+"""
+
+import csv
+import html
+import re
+import urllib.parse
+
+# a cell of the table, with its attributes and its content, or else a link outside the cells; the links in a cell; and
+# any tag, to strip from the text
+cell_regex = re.compile(r'<td\b([^>]*)>(.*?)</td>|(<a\b[^>]*>.*?</a>)', re.S | re.I)
+link_regex = re.compile(r'<a\b([^>]*)>(.*?)</a>', re.S | re.I)
+href_regex = re.compile(r'href\s*=\s*"([^"]*)"', re.I)
+tag_regex = re.compile(r'<[^>]*>')
+row_number_regex = re.compile(r'(\d+)\.')
+legislature_years_regex = re.compile(r'(\d{4})-(\d{4}|prezent)')
+
+profile_path_prefix = "/pls/parlam/"
+
+# the columns of the manifest, and the types of those that aren't strings; NB: an empty cell reads as None
+manifest_header = ["file_name", "url_path", "number", "name", "legislature", "years", "chamber", "idm", "cam"]
+manifest_types = {"number": int, "legislature": int, "idm": int, "cam": int}
+
+
+def read_blocks(in_f, block_size=1 << 16):
+    """Read an open file in blocks of block_size characters, as they're needed."""
+    return iter(lambda: in_f.read(block_size), "")
+
+
+def listing_cells(chunks):
+    """
+    Cut an html into the cells of its table, and any links outside them, as it comes.
+
+    :param chunks: iterable of str, e.g. an open file (i.e. its lines), or read_blocks of it
+    :return: generator of 2-tuples of (attributes of the cell, its content); for a link outside the cells, (None, the
+             link)
+    """
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        end = 0
+        for match in cell_regex.finditer(buffer):
+            cell_attrs, content, link = match.groups()
+            yield (cell_attrs, content) if link is None else (None, link)
+            end = match.end()
+        # NB: a cell that goes on into the next chunk waits for the rest of it; and if the links in it come whole in
+        #     this chunk, they come out as links outside the cells, which makes no difference to listing_links
+        buffer = buffer[end:]
+
+
+def listing_links(chunks):
+    """
+    Go through the link listing and return each link, with the row that it's in.
+
+    :param chunks: iterable of str, e.g. an open file (i.e. its lines), or read_blocks of it
+    :return: generator of 4-tuples of (href, text of the link, number of the row, name in the row); the number and
+             name are None if the row doesn't have them
+    """
+    number, name = None, None
+    for cell_attrs, content in listing_cells(chunks):
+        if "<a" in content or "<A" in content:
+            for link_attrs, link_text in link_regex.findall(content):
+                found_href = href_regex.search(link_attrs)
+                if found_href:
+                    yield html.unescape(found_href.group(1)), cell_text(link_text), number, name
+            continue
+        value = cell_text(content)
+        is_number = row_number_regex.fullmatch(value)
+        if is_number:
+            # a new parliamentarian: the name comes in the next cell
+            number, name = int(is_number.group(1)), None
+        elif cell_attrs is not None and "text-align: left" in cell_attrs:
+            name = value
+
+
+def cell_text(content):
+    """Return the text of (part of) a cell, as BeautifulSoup's get_text would, stripped."""
+    if "<" in content:
+        content = tag_regex.sub("", content)
+    if "&" in content:
+        content = html.unescape(content)
+    return content.strip()
+
+
+def link_manifest(chunks):
+    """
+    Make the manifest of the link listing: one entry per profile page, with what its row says about it.
+
+    :param chunks: iterable of str, e.g. an open file (i.e. its lines), or read_blocks of it
+    :return: list of dicts, with the keys in manifest_header, in the order in which the pages first come up
+    """
+    entries = {}
+    for href, text, number, name in listing_links(chunks):
+        if href not in entries:
+            query = dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(href).query))
+            entries[href] = {"file_name": href.replace(profile_path_prefix, '') + '_.html', "url_path": href,
+                             "number": number, "name": name, "legislature": as_int(query.get("leg")), "years": None,
+                             "chamber": None, "idm": as_int(query.get("idm")), "cam": as_int(query.get("cam"))}
+        if legislature_years_regex.fullmatch(text):
+            entries[href]["years"] = text
+        elif text:
+            entries[href]["chamber"] = text
+    return list(entries.values())
+
+
+def as_int(value):
+    """Return a string as an int, or None if it's None or not a number."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def write_link_manifest(links_path, manifest_path):
+    """
+    Write the manifest of a link listing to a csv.
+
+    :param links_path: str, the html with the links to the profile pages
+    :param manifest_path: str
+    :return: int, how many pages are in the manifest
+    """
+    with open(links_path, 'r') as in_f:
+        entries = link_manifest(read_blocks(in_f))
+    with open(manifest_path, 'w') as out_f:
+        writer = csv.writer(out_f)
+        writer.writerow(manifest_header)
+        for entry in entries:
+            writer.writerow(["" if entry[column] is None else entry[column] for column in manifest_header])
+    return len(entries)
+
+
+def read_link_manifest(manifest_path):
+    """
+    Read a manifest written by write_link_manifest, with its columns back in their types.
+
+    :param manifest_path: str
+    :return: dict of form {file name of the page in the archive: entry}, where each entry is a dict with the keys in
+             manifest_header
+    """
+    with open(manifest_path, 'r') as in_f:
+        reader = csv.reader(in_f)
+        header = next(reader)
+        if header != manifest_header:
+            raise ValueError("NOT A LINK MANIFEST, OR ONE OF AN OLDER LAYOUT: " + manifest_path)
+        manifest = {}
+        for row in reader:
+            entry = {column: None if value == "" else manifest_types.get(column, str)(value)
+                     for column, value in zip(header, row)}
+            manifest[entry["file_name"]] = entry
+    return manifest
@@ -0,0 +1,135 @@
+"""
+Additive-increase, multiplicative-decrease (AIMD) control of how hard the scraper pushes the site, so that we crawl as
+fast as the site tolerates without tuning pauses by hand.
+
+A controller (see new_rate_controller) holds two knobs: the request rate, i.e. how many requests a second may start,
+and the concurrency, i.e. how many may be in flight at once. Every request waits for a slot (see acquire_slot), then
+reports back how it went:
+    - until the site first struggles, a success that came back within the latency target doubles both knobs for
+      every second's (and every round's) worth of successes, so that we get near the site's limit quickly; this is
+      the "slow start" of TCP, which AIMD also comes from
+    - after that, such a success nudges both knobs up: the rate by rate_step requests a second for every second's
+      worth of successes, the concurrency by one for every round of successes at that concurrency
+    - a failure that looks like the site struggling (a dropped connection, a timeout, a broken answer, a 429 or a
+      5xx), or a success that took longer than the latency target, cuts both knobs by the decrease factor; but at most
+      once per decrease_interval, since the requests in flight when the site starts struggling tend to fail together
+    - a "429 Too Many Requests" with a Retry-After also holds off all requests until then
+The controller is a dict, shared between the fetching threads, with a condition variable to guard it.
+"""
+
+import threading
+import time
+
+
+def new_rate_controller(rate=1.0, concurrency=1, min_rate=0.2, max_rate=50.0, max_concurrency=16, rate_step=0.5,
+                        decrease=0.5, latency_target=2.0, decrease_interval=1.0):
+    """
+    Make a rate controller, starting from the polite defaults of the old scraper: one request at a time, one a second.
+
+    :param rate: float, requests a second to start with
+    :param concurrency: int, requests in flight to start with
+    :param min_rate: float, the rate never goes below this
+    :param max_rate: float, nor above this
+    :param max_concurrency: int, the concurrency never goes above this
+    :param rate_step: float, requests a second added to the rate for every second's worth of successes
+    :param decrease: float, the factor by which a struggling site cuts the rate and the concurrency
+    :param latency_target: float, seconds; a success that takes longer counts as the site struggling
+    :param decrease_interval: float, seconds; the knobs are cut at most once per this
+    :return: dict
+    """
+    return {"rate": rate, "concurrency": concurrency, "min rate": min_rate, "max rate": max_rate,
+            "max concurrency": max_concurrency, "rate step": rate_step, "decrease": decrease,
+            "latency target": latency_target, "decrease interval": decrease_interval,
+            "in flight": 0, "next start": 0.0, "paused until": 0.0, "last decrease": float("-inf"),
+            "slow start": True, "successes at concurrency": 0, "successes": 0, "failures": 0, "decreases": 0,
+            "started": time.monotonic(), "history": [], "condition": threading.Condition()}
+
+
+def acquire_slot(controller):
+    """
+    Wait until a request may start: until fewer than the concurrency are in flight, and its turn at the current rate
+    (or the end of a Retry-After hold) has come.
+
+    :param controller: dict, as made by new_rate_controller
+    :return: None; the caller must then report back with record_success, record_failure or release_slot
+    """
+    with controller["condition"]:
+        controller["condition"].wait_for(lambda: controller["in flight"] < controller["concurrency"])
+        controller["in flight"] += 1
+        now = time.monotonic()
+        start = max(now, controller["next start"], controller["paused until"])
+        controller["next start"] = start + 1 / controller["rate"]
+    time.sleep(start - now)
+
+
+def release_slot(controller):
+    """Give back a slot without judging the site, e.g. after a 404, which says nothing about how the site is doing."""
+    with controller["condition"]:
+        controller["in flight"] -= 1
+        controller["condition"].notify_all()
+
+
+def record_success(controller, latency):
+    """
+    Give back a slot after a success, and nudge the knobs up, or cut them if the answer was slow.
+
+    :param controller: dict, as made by new_rate_controller
+    :param latency: float, seconds the request took
+    :return: None
+    """
+    if latency > controller["latency target"]:
+        record_failure(controller)
+        return
+    with controller["condition"]:
+        controller["in flight"] -= 1
+        controller["successes"] += 1
+        if controller["slow start"]:
+            controller["rate"] = min(controller["max rate"], controller["rate"] * 2 ** (1 / controller["rate"]))
+        else:
+            controller["rate"] = min(controller["max rate"],
+                                     controller["rate"] + controller["rate step"] / controller["rate"])
+        controller["successes at concurrency"] += 1
+        if controller["slow start"]:
+            controller["concurrency"] = min(controller["max concurrency"], controller["concurrency"] + 1)
+        elif controller["successes at concurrency"] >= controller["concurrency"]:
+            controller["concurrency"] = min(controller["max concurrency"], controller["concurrency"] + 1)
+            controller["successes at concurrency"] = 0
+        log_knobs(controller)
+        controller["condition"].notify_all()
+
+
+def record_failure(controller, retry_after=None):
+    """
+    Give back a slot after the site struggled, and cut the knobs (unless we just did).
+
+    :param controller: dict, as made by new_rate_controller
+    :param retry_after: float, seconds the site asked us to hold off for, if it did
+    :return: None
+    """
+    with controller["condition"]:
+        controller["in flight"] -= 1
+        controller["failures"] += 1
+        now = time.monotonic()
+        if now - controller["last decrease"] >= controller["decrease interval"]:
+            controller["rate"] = max(controller["min rate"], controller["rate"] * controller["decrease"])
+            controller["concurrency"] = max(1, int(controller["concurrency"] * controller["decrease"]))
+            controller["successes at concurrency"] = 0
+            controller["last decrease"] = now
+            controller["decreases"] += 1
+            controller["slow start"] = False
+        if retry_after:
+            controller["paused until"] = max(controller["paused until"], now + retry_after)
+        log_knobs(controller)
+        controller["condition"].notify_all()
+
+
+def log_knobs(controller):
+    """Add the current knobs to the history of the controller; call with its condition held."""
+    controller["history"].append((round(time.monotonic() - controller["started"], 3), round(controller["rate"], 3),
+                                  controller["concurrency"]))
+
+
+def current_knobs(controller):
+    """Return the current rate (requests a second) and concurrency, e.g. to show how the crawl is going."""
+    with controller["condition"]:
+        return controller["rate"], controller["concurrency"]
@@ -1,65 +1,543 @@
 """
 Scraping records of parliamentarians' careers from the website of the Romanian parliament, saving the htmls to
 disk for processing.
+
+Pages can also be parsed as they come in (see scrape_and_parse_parliamentarians), so that the person-legislature table
+is ready as soon as the scrape is done, rather than one whole parse of the archive later.
+
+For big backfills, the scrape can also be split among several workers, on one machine or on several that share a
+filesystem: enqueue_parliamentarians puts the urls in a durable queue (see crawl_queue), each crawl_worker fetches
+pages from it into archive shards of its own, and merge_shards puts the shards together into the usual archive.
 """
 
 import requests
-from bs4 import BeautifulSoup
 from io import BytesIO
-from zipfile import ZipFile, ZIP_DEFLATED
+from zipfile import ZipFile, ZipInfo, ZIP_DEFLATED
+import itertools
+import multiprocessing
+import operator
+import os
+import queue
 import shutil
+import socket
+import sys
+import threading
 import time
+from data_tables import person_legislature_table
+from scrape import crawl_metrics, crawl_queue, http_cache, link_manifest, rate_control
 from local import root
 
+# the ways a request can fail that we note and move on from, rather than stop the scrape for
+fetch_errors = (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError,
+                requests.exceptions.HTTPError, requests.exceptions.Timeout)
+
+# with a rate controller, how many of its latency targets a request may stall for before we give up on it; NB: a
+# stalled connection would otherwise hold its slot forever, without ever counting as slow or failed
+timeout_latency_targets = 5
+
+# header to pass to requests, tell site who I am
+request_header = {'User-Agent': 'Mozilla/5.0 (Linux Mint 18, 32-bit)'}
+
+archive_name = 'parliamentarian_legislature_profile_site_htmls.zip'
+
 
-def scrape_parliamentarians(outdir):
+def scrape_parliamentarians(outdir, on_page=None, url_base='http://www.cdep.ro', pause=1, failure_pause=60,
+                            links_path='links_parliamentarians_html.txt',
+                            recalcitrant_path='recalcitrant_profile_sites.txt', cache_dir=None, cache_mode="off",
+                            rate_controller=None, max_attempts=3, metrics_path=None, summary_path=None,
+                            metrics_interval=15.0, manifest_path=None):
     """
     Scrape profiles of all deputies and senators in RO parliament from 1990 to August 2020 and dump the htmls into
     zip archive.
-    """
 
-    # make header to pass to requests, tell site who I am
-    header = {'User-Agent': 'Mozilla/5.0 (Linux Mint 18, 32-bit)'}
+    :param outdir: directory in which we dump the zip archive
+    :param on_page: function, called with the file name and the html text of each page as soon as it's fetched; None
+                    to just archive the pages
+    :param url_base: str, the site to scrape; e.g. that of a local stand-in (see benchmarks/standin_server.py)
+    :param pause: float, seconds to wait before each request, so as not to hammer the site
+    :param failure_pause: float, seconds to wait after a failed request
+    :param links_path: str, the html with the links to the profile pages
+    :param recalcitrant_path: str, the file to which we add the urls of the pages that we failed to get
+    :param cache_dir: str, directory of the response cache; None for no cache, which needs cache_mode "off"
+    :param cache_mode: str, "off", "record" or "replay", see scrape/http_cache.py
+    :param rate_controller: dict, a rate controller (see scrape/rate_control.py) with which to fetch pages concurrently,
+                            as fast as the site tolerates; None to fetch them one by one, with the pauses above
+    :param max_attempts: int, with a rate controller, how many times to try a page before giving up on it
+    :param metrics_path: str, file to which we write the metrics of the scrape every metrics_interval seconds, in the
+                         Prometheus text format (see scrape/crawl_metrics.py); None not to write them
+    :param summary_path: str, json file to which we write the summary of the scrape once it's done; None not to
+    :param metrics_interval: float, seconds between writes of the metrics
+    :param manifest_path: str, csv to which we write what the link listing says about each page, under its name in the
+                          archive (see scrape/link_manifest.py); None not to write it
+    :return: dict, the summary of the scrape, see crawl_metrics.crawl_summary
 
-    # get all links to parliamentarian profile pages
-    with open('links_parliamentarians_html.txt', 'r') as in_f:
-        text = in_f.read()
-        soup = BeautifulSoup(text, 'html.parser')
+    NB: the pages are requested in the (sorted) order of their links, and archived without timestamps, so two scrapes
+        that get the same responses (e.g. replays of the same cache) write byte-identical archives
+    """
 
-    # get all htmls which lead to person-leg profiles
-    person_leg_profile_links = set()
-    for link in soup.find_all('a'):
-        person_leg_profile_links.add(link.get('href'))
+    # NB: check the cache mode before anything goes to the network, see http_cache.check_cache_mode
+    http_cache.check_cache_mode(cache_dir, cache_mode)
 
     # make zip archive
     in_memory_file = BytesIO()
     zip_archive = ZipFile(in_memory_file, mode='w')
 
     # iterate over all the urls, request that htmls, dump the htmls in the zip archive
-    url_base = 'http://www.cdep.ro'
-    for idx, parl_leg_link in enumerate(person_leg_profile_links):
-        full_url = url_base + parl_leg_link
-        try:
-            time.sleep(1)
-            print(idx, " | ", full_url)
-            html = requests.get(full_url, headers=header)
-            file_path = full_url.replace("http://www.cdep.ro/pls/parlam/", '') + '_.html'
-            zip_archive.writestr(file_path, html.text, compress_type=ZIP_DEFLATED)
-        except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError) as e:
-            print(e, ' | ', full_url)
-            # give it a minute
-            time.sleep(60)
-            # save recalcitrant url to file of failed requests, and move on
-            with open('recalcitrant_profile_sites.txt', 'a') as out_f:
-                out_f.write(full_url), out_f.write('\n')
+    urls = profile_urls(links_path, url_base)
+    if manifest_path is not None:
+        link_manifest.write_link_manifest(links_path, manifest_path)
+    metrics = crawl_metrics.new_crawl_metrics(len(urls), rate_controller)
+    if metrics_path is not None:
+        stop_metrics, metrics_writer = crawl_metrics.start_metrics_writer(metrics, metrics_path, metrics_interval)
+    if rate_controller is None:
+        fetched_pages = fetch_one_by_one(urls, request_header, pause, failure_pause, cache_dir, cache_mode, metrics)
+    else:
+        fetched_pages = fetch_adaptively(urls, request_header, rate_controller, max_attempts, cache_dir, cache_mode,
+                                         metrics)
+    try:
+        for idx, (full_url, html, error) in enumerate(fetched_pages):
+            crawl_metrics.record_page(metrics, archived=error is None)
+            if error is not None:
+                print(error, ' | ', full_url)
+                # save recalcitrant url to file of failed requests, and move on
+                with open(recalcitrant_path, 'a') as out_f:
+                    out_f.write(full_url), out_f.write('\n')
+                continue
+            print(idx, " | ", full_url, " | ", crawl_metrics.progress_line(metrics))
+            file_path = profile_file_name(full_url, url_base)
+            zip_archive.writestr(ZipInfo(file_path), html.text, compress_type=ZIP_DEFLATED)
+            if on_page is not None:
+                on_page(file_path, html.text)
+    finally:
+        # NB: the metrics go out even if the scrape stops halfway, since that is when we most want to know how it went
+        if metrics_path is not None:
+            stop_metrics.set()
+            metrics_writer.join()
 
     zip_archive.close()
 
     in_memory_file.seek(0)
-    with open(outdir + '/parliamentarian_legislature_profile_site_htmls.zip', 'wb') as f:
+    with open(outdir + '/' + archive_name, 'wb') as f:
         shutil.copyfileobj(in_memory_file, f)
 
+    if summary_path is not None:
+        summary = crawl_metrics.write_crawl_summary(metrics, summary_path)
+    else:
+        summary = crawl_metrics.crawl_summary(metrics)
+    print("SCRAPED " + str(summary["pages"].get("archived", 0)) + " OF " + str(len(urls)) + " PAGES IN " +
+          str(summary["seconds"]) + " SECONDS, " + str(summary["requests"]) + " REQUESTS, " +
+          str(summary["retries"]) + " RETRIES")
+    return summary
+
+
+def profile_urls(links_path, url_base='http://www.cdep.ro'):
+    """
+    Get the urls of all the profile pages from the html with the links to them.
+
+    :param links_path: str, the html with the links to the profile pages
+    :param url_base: str, the site to scrape
+    :return: list of str, sorted
+    """
+    # get all htmls which lead to person-leg profiles; NB: we stream through the listing rather than parse it whole,
+    # see link_manifest
+    with open(links_path, 'r') as in_f:
+        person_leg_profile_links = {href for href, _, _, _ in
+                                    link_manifest.listing_links(link_manifest.read_blocks(in_f))}
+
+    return [url_base + parl_leg_link for parl_leg_link in sorted(person_leg_profile_links)]
+
+
+def profile_file_name(full_url, url_base='http://www.cdep.ro'):
+    """Return the name under which the page at a url goes in the archive."""
+    return full_url.replace(url_base + "/pls/parlam/", '') + '_.html'
+
+
+def fetch_one_by_one(urls, header, pause, failure_pause, cache_dir=None, cache_mode="off", metrics=None):
+    """
+    Request the pages one at a time, waiting a fixed pause before each request, and a longer one after each failure.
+
+    :param urls: list of str
+    :param header: dict, the headers of the requests
+    :param pause: float, seconds to wait before each request
+    :param failure_pause: float, seconds to wait after a failed request
+    :param cache_dir: str, directory of the response cache; None for no cache, which needs cache_mode "off"
+    :param cache_mode: str, "off", "record" or "replay", see scrape/http_cache.py
+    :param metrics: dict, the metrics of the scrape, in which we count each request (see scrape/crawl_metrics.py)
+    :return: generator of 3-tuples of (url, response or None, error or None), in the order of the urls
+    """
+    for full_url in urls:
+        started = []
+
+        def wait_for_turn():
+            time.sleep(pause)
+            started.append(time.monotonic())
+
+        try:
+            # NB: this waits for the pause only if it goes to the network, not if the page is in the cache
+            html = http_cache.get_page(full_url, header, wait_for_turn, cache_dir, cache_mode)
+            # NB: an error page (e.g. "429 Too Many Requests") is a failure, not a profile to archive
+            html.raise_for_status()
+        except fetch_errors as e:
+            crawl_metrics.record_request(metrics, started, error=e)
+            # give it a minute
+            time.sleep(failure_pause)
+            yield full_url, None, e
+        else:
+            crawl_metrics.record_request(metrics, started, html)
+            yield full_url, html, None
+
+
+def fetch_adaptively(urls, header, controller, max_attempts=3, cache_dir=None, cache_mode="off", metrics=None):
+    """
+    Request the pages from a pool of threads, as many at once and as fast as the rate controller allows, and retry the
+    ones that fail; see scrape/rate_control.py.
+
+    :param urls: list of str
+    :param header: dict, the headers of the requests
+    :param controller: dict, as made by rate_control.new_rate_controller
+    :param max_attempts: int, how many times to try a page before giving up on it
+    :param cache_dir: str, directory of the response cache; None for no cache, which needs cache_mode "off"
+    :param cache_mode: str, "off", "record" or "replay", see scrape/http_cache.py
+    :param metrics: dict, the metrics of the scrape, in which we count each request (see scrape/crawl_metrics.py)
+    :return: generator of 3-tuples of (url, response or None, error or None); NB: in the order of the urls, whatever
+             the order in which they came in, so that the archive comes out the same
+    """
+    tasks, results = queue.Queue(), queue.Queue()
+    for idx, full_url in enumerate(urls):
+        tasks.put((idx, full_url, 1))
+    fetcher_args = (tasks, results, header, controller, max_attempts, cache_dir, cache_mode, metrics)
+    fetchers = [threading.Thread(target=adaptive_fetcher, args=fetcher_args, daemon=True)
+                for _ in range(controller["max concurrency"])]
+    for fetcher in fetchers:
+        fetcher.start()
+
+    fetched, next_idx = {}, 0
+    try:
+        for _ in urls:
+            idx, full_url, html, error = results.get()
+            # NB: anything but a fetch error (e.g. a page missing from the cache in replay mode) stops the scrape
+            if error is not None and not isinstance(error, fetch_errors):
+                raise error
+            fetched[idx] = (full_url, html, error)
+            while next_idx in fetched:
+                yield fetched.pop(next_idx)
+                next_idx += 1
+    finally:
+        # NB: if we stop early (e.g. a page missing from the cache, or an error in on_page), the fetchers are to stop
+        #     too, rather than work through the urls that are left; so the Nones must not queue up behind them
+        while True:
+            try:
+                tasks.get_nowait()
+            except queue.Empty:
+                break
+        for _ in fetchers:
+            tasks.put(None)
+
+
+def adaptive_fetcher(tasks, results, header, controller, max_attempts, cache_dir, cache_mode, metrics):
+    """
+    Fetch the pages that come down the task queue until a None comes, reporting to the rate controller how each request
+    went, and putting the ones that failed (for reasons to do with the site's load) back in the queue; see
+    fetch_adaptively, whose arguments these are.
+    """
+    for idx, full_url, attempt in iter(tasks.get, None):
+        started = []
+
+        def wait_for_slot():
+            rate_control.acquire_slot(controller)
+            started.append(time.monotonic())
+
+        try:
+            # NB: answers from the cache don't go through the controller, they only wait for a slot to go to the network
+            html = http_cache.get_page(full_url, header, wait_for_slot, cache_dir, cache_mode,
+                                       timeout=controller["latency target"] * timeout_latency_targets)
+            html.raise_for_status()
+        except fetch_errors as e:
+            crawl_metrics.record_request(metrics, started, error=e)
+            status = e.response.status_code if isinstance(e, requests.exceptions.HTTPError) else None
+            if status is not None and status != 429 and status < 500:  # e.g. a 404, which retrying won't fix
+                rate_control.release_slot(controller)
+                results.put((idx, full_url, None, e))
+                continue
+            rate_control.record_failure(controller, retry_after_seconds(e))
+            if attempt < max_attempts:
+                crawl_metrics.record_retry(metrics)
+                tasks.put((idx, full_url, attempt + 1))
+            else:
+                results.put((idx, full_url, None, e))
+        except Exception as e:
+            if started:
+                rate_control.release_slot(controller)
+            results.put((idx, full_url, None, e))
+        else:
+            crawl_metrics.record_request(metrics, started, html)
+            if started:
+                rate_control.record_success(controller, time.monotonic() - started[0])
+            results.put((idx, full_url, html, None))
+
+
+def retry_after_seconds(error):
+    """Return the seconds that the site asked us to wait for in a failed request's Retry-After header, or None."""
+    try:
+        return float(error.response.headers["Retry-After"])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+
+def scrape_and_parse_parliamentarians(outdir, table_outdir, workers=2, queue_size=64, quarantine=False,
+                                      strained=False, fast=False, **scrape_kwargs):
+    """
+    Scrape the profiles as scrape_parliamentarians does, but hand each page, as soon as it's fetched, to parser
+    processes through a bounded queue; the rows of the person-legislature table thus pile up during the scrape, and the
+    table is written right after the last page comes in.
+
+    NB: the queue only fills up if the parsers fall behind the scrape, and then the scrape waits for them, so we never
+        hold more than queue_size pages in memory beyond the archive itself.
+
+    :param outdir: directory in which we dump the zip archive
+    :param table_outdir: directory in which we dump the parliamentarian-legislature table, see
+                         person_legislature_table.make_parliamentarians_legislature_table
+    :param workers: int, number of parser processes
+    :param queue_size: int, how many fetched pages may wait for a parser
+    :param quarantine: bool, if True pages that fail to parse are left out of the table; if False (default) any such
+                       page means that the table is not written at all
+    :param strained: bool, whether to only parse the regions of each page that the extractors read
+    :param fast: bool, whether to get the simple fields of each page with regexes
+    :param scrape_kwargs: passed on to scrape_parliamentarians, e.g. cache_dir and cache_mode
+    :return: dict, the summary of the scrape, see crawl_metrics.crawl_summary
+    """
+    page_queue, result_queue = multiprocessing.Queue(queue_size), multiprocessing.Queue()
+    parsers = [multiprocessing.Process(target=person_legislature_table.parse_page_worker,
+                                       args=(page_queue, result_queue, strained, fast)) for _ in range(workers)]
+    for parser in parsers:
+        parser.start()
+
+    # gather the parsed pages in a thread of their own, so that the result queue never backs up (and blocks the
+    # parsers) while we're waiting on the website
+    parsed_pages = []
+
+    def gather_parsed_pages():
+        for _ in range(workers):  # each parser puts a None on the result queue once it's done
+            parsed_pages.extend(iter(result_queue.get, None))
+
+    gatherer = threading.Thread(target=gather_parsed_pages)
+    gatherer.start()
+
+    # number the pages as they come, so that the rows go in the table in the order in which the pages were fetched
+    page_numbers = itertools.count()
+    try:
+        summary = scrape_parliamentarians(outdir, on_page=lambda file_path, html_text: page_queue.put(
+            (next(page_numbers), file_path, html_text)), **scrape_kwargs)
+    finally:
+        for _ in parsers:
+            page_queue.put(None)
+        gatherer.join()
+        for parser in parsers:
+            parser.join()
+
+    parsed_pages.sort(key=operator.itemgetter(0))
+    person_legislature_table.write_parliamentarians_legislature_table([parsed for _, parsed in parsed_pages],
+                                                                      table_outdir, quarantine)
+    return summary
+
+
+def enqueue_parliamentarians(queue_dir, url_base='http://www.cdep.ro', links_path='links_parliamentarians_html.txt'):
+    """
+    Put the urls of all the profile pages in a durable crawl queue (see scrape/crawl_queue.py), for crawl_worker to
+    fetch; urls that are in the queue already are left alone.
+
+    :param queue_dir: str, directory of the queue, on a filesystem that all the workers share
+    :param url_base: str, the site to scrape
+    :param links_path: str, the html with the links to the profile pages
+    :return: int, how many urls were added
+    """
+    added = crawl_queue.make_crawl_queue(queue_dir, profile_urls(links_path, url_base))
+    print("QUEUED " + str(added) + " URLS, QUEUE NOW AT " + str(crawl_queue.queue_counts(queue_dir)))
+    return added
+
+
+def crawl_worker(queue_dir, shard_dir, worker_id=None, url_base='http://www.cdep.ro', pause=1, failure_pause=60,
+                 max_attempts=3, lease_seconds=600, shard_size=100, poll=10, cache_dir=None, cache_mode="off",
+                 metrics_path=None):
+    """
+    Fetch profile pages from a durable crawl queue (see enqueue_parliamentarians) until it's empty, writing them to
+    archive shards of our own; run as many of these at once as you like, on as many machines as share the queue and
+    shard directories, then put the shards together with merge_shards.
+
+    Pages are held in memory until there are shard_size of them, then written to a new shard, and only then marked as
+    done in the queue; so if the worker dies, the pages that it holds go back in the queue when their leases expire,
+    and no page is ever marked done without being in a shard.
+
+    :param queue_dir: str, directory of the queue
+    :param shard_dir: str, directory of the shards, each a zip archive laid out like that of scrape_parliamentarians
+    :param worker_id: str, name of the worker, which goes in the names of its shards; None for the host name and the
+                      process id
+    :param url_base: str, the site that the urls in the queue are on
+    :param pause: float, seconds to wait before each request, so as not to hammer the site; NB: each worker waits its
+                  own pauses, so n workers together hit the site n times as often
+    :param failure_pause: float, seconds to wait after a failed request
+    :param max_attempts: int, how many times (across all workers) to try a page before giving up on it
+    :param lease_seconds: float, how long a url may go without its lease being renewed before it's handed to another
+                          worker; needs to be well over shard_size times the time that a page takes
+    :param shard_size: int, how many pages go in each shard
+    :param poll: float, seconds to wait between looks at the queue when there's nothing to take, but other workers are
+                 still working on (or have died holding) the last urls
+    :param cache_dir: str, directory of the response cache; None for no cache, which needs cache_mode "off"
+    :param cache_mode: str, "off", "record" or "replay", see scrape/http_cache.py
+    :param metrics_path: str, file to which we write the metrics of this worker in the Prometheus text format (see
+                         scrape/crawl_metrics.py); None not to write them
+    :return: dict, the summary of what this worker did, see crawl_metrics.crawl_summary
+    """
+    http_cache.check_cache_mode(cache_dir, cache_mode)
+    worker_id = worker_id or socket.gethostname() + "-" + str(os.getpid())
+    os.makedirs(shard_dir, exist_ok=True)
+    metrics = crawl_metrics.new_crawl_metrics(crawl_queue.queue_counts(queue_dir)["todo"])
+    if metrics_path is not None:
+        stop_metrics, metrics_writer = crawl_metrics.start_metrics_writer(metrics, metrics_path)
+
+    held_pages = {}  # of form {key: (file name, html text)}
+    try:
+        for idx in itertools.count():
+            leased = crawl_queue.lease_url(queue_dir)
+            if leased is None:
+                # nothing left to take: write what we hold, then see whether others still hold anything, or died
+                # holding it
+                write_shard(queue_dir, shard_dir, worker_id, held_pages)
+                reaped = crawl_queue.reap_expired_leases(queue_dir, lease_seconds)
+                counts = crawl_queue.queue_counts(queue_dir)
+                if counts["todo"] == 0 and counts["leased"] == 0:
+                    break
+                if not reaped:
+                    time.sleep(poll)
+                continue
+
+            key, entry = leased
+            full_url, started = entry["url"], []
+
+            def wait_for_turn():
+                time.sleep(pause)
+                started.append(time.monotonic())
+
+            try:
+                html = http_cache.get_page(full_url, request_header, wait_for_turn, cache_dir, cache_mode)
+                html.raise_for_status()
+            except fetch_errors as e:
+                crawl_metrics.record_request(metrics, started, error=e)
+                print(e, ' | ', full_url)
+                time.sleep(failure_pause)
+                status = e.response.status_code if isinstance(e, requests.exceptions.HTTPError) else None
+                # NB: as in adaptive_fetcher, a 4xx other than a 429 (e.g. a 404) won't go away by retrying
+                if crawl_queue.fail_url(queue_dir, key, entry, max_attempts,
+                                        give_up=status is not None and status != 429 and status < 500):
+                    crawl_metrics.record_page(metrics, archived=False)
+                else:
+                    crawl_metrics.record_retry(metrics)
+                continue
+
+            crawl_metrics.record_request(metrics, started, html)
+            crawl_metrics.record_page(metrics, archived=True)
+            print(idx, " | ", full_url, " | ", worker_id)
+            held_pages[key] = (profile_file_name(full_url, url_base), html.text)
+            crawl_queue.renew_leases(queue_dir, held_pages)
+            if len(held_pages) >= shard_size:
+                write_shard(queue_dir, shard_dir, worker_id, held_pages)
+    finally:
+        # NB: whatever stops us (e.g. a page missing from the cache in replay mode), the pages we hold aren't lost
+        write_shard(queue_dir, shard_dir, worker_id, held_pages)
+        if metrics_path is not None:
+            stop_metrics.set()
+            metrics_writer.join()
+
+    summary = crawl_metrics.crawl_summary(metrics)
+    print("WORKER " + worker_id + " FETCHED " + str(summary["pages"].get("archived", 0)) + " PAGES IN " +
+          str(summary["seconds"]) + " SECONDS, QUEUE NOW AT " + str(crawl_queue.queue_counts(queue_dir)))
+    return summary
+
+
+def write_shard(queue_dir, shard_dir, worker_id, held_pages):
+    """
+    Write the pages that a worker holds to a new shard, mark them as done in the queue, and let go of them.
+
+    :param queue_dir: str
+    :param shard_dir: str
+    :param worker_id: str
+    :param held_pages: dict of form {key: (file name, html text)}, which we empty
+    :return: None
+    """
+    if not held_pages:
+        return
+    shard_path = next(path for path in (os.path.join(shard_dir, worker_id + "-" + str(seq).zfill(5) + ".zip")
+                                        for seq in itertools.count()) if not os.path.exists(path))
+    # write to a temporary file first, so that a worker that dies midway never leaves a half-written shard
+    with ZipFile(shard_path + ".tmp", mode='w') as shard:
+        for file_path, html_text in sorted(held_pages.values()):
+            shard.writestr(ZipInfo(file_path), html_text, compress_type=ZIP_DEFLATED)
+    os.replace(shard_path + ".tmp", shard_path)
+    for key in held_pages:
+        crawl_queue.complete_url(queue_dir, key)
+    held_pages.clear()
+
+
+def merge_shards(shard_dir, outdir, queue_dir=None, recalcitrant_path='recalcitrant_profile_sites.txt'):
+    """
+    Put the shards of a distributed crawl (see crawl_worker) together into one archive, laid out as that of
+    scrape_parliamentarians: one copy of each page, in sorted order, without timestamps; so the same pages make a
+    byte-identical archive, however they were fetched.
+
+    :param shard_dir: str, directory of the shards
+    :param outdir: directory in which we dump the zip archive
+    :param queue_dir: str, directory of the queue, whose failed urls we add to the recalcitrant file; None to leave it
+    :param recalcitrant_path: str, the file to which we add the urls of the pages that the workers gave up on
+    :return: int, how many pages went in the archive
+    """
+    pages = {}
+    for shard_name in sorted(os.listdir(shard_dir)):
+        if shard_name.endswith(".zip"):
+            with ZipFile(os.path.join(shard_dir, shard_name), mode='r') as shard:
+                for file_path in shard.namelist():
+                    # NB: a page fetched by two workers (see crawl_queue) is the same page, so we keep the first copy
+                    if file_path not in pages:
+                        pages[file_path] = shard.read(file_path)
+
+    with ZipFile(os.path.join(outdir, archive_name), mode='w') as zip_archive:
+        for file_path in sorted(pages):
+            zip_archive.writestr(ZipInfo(file_path), pages[file_path], compress_type=ZIP_DEFLATED)
+
+    if queue_dir is not None:
+        counts = crawl_queue.queue_counts(queue_dir)
+        if counts["todo"] or counts["leased"]:
+            print("NB: THE CRAWL ISN'T DONE, THE ARCHIVE IS MISSING PAGES; QUEUE AT " + str(counts))
+        failed = crawl_queue.failed_urls(queue_dir)
+        if failed:
+            with open(recalcitrant_path, 'a') as out_f:
+                out_f.write("".join(url + '\n' for url in failed))
+    print("MERGED " + str(len(pages)) + " PAGES INTO " + os.path.join(outdir, archive_name))
+    return len(pages)
+
 
 if __name__ == "__main__":
     out_directory = root + 'data/parliamentarians/'
-    scrape_parliamentarians(out_directory)
+    # NB: with "--record" or "--replay", responses are recorded to / replayed from the cache, see http_cache
+    cache_mode = "replay" if "--replay" in sys.argv else "record" if "--record" in sys.argv else "off"
+    # the metrics of the scrape go next to the archive as it runs, and a summary of it once it's done (see
+    # crawl_metrics), as does the manifest of the link listing (see link_manifest)
+    scrape_kwargs = {"cache_dir": out_directory + 'raw_htmls/http_cache', "cache_mode": cache_mode,
+                     "metrics_path": out_directory + 'raw_htmls/scrape_metrics.prom',
+                     "summary_path": out_directory + 'raw_htmls/scrape_summary.json',
+                     "manifest_path": out_directory + 'raw_htmls/profile_link_manifest.csv'}
+    # NB: with "--adaptive", fetch pages concurrently at whatever rate the site tolerates, see rate_control
+    if "--adaptive" in sys.argv:
+        scrape_kwargs["rate_controller"] = rate_control.new_rate_controller()
+    # NB: with "--enqueue", "--worker" or "--merge", run a step of a distributed crawl instead, see crawl_worker
+    queue_directory, shard_directory = out_directory + 'raw_htmls/crawl_queue', out_directory + 'raw_htmls/shards'
+    # NB: with "--parse", also make the person-legislature table as the pages come in
+    if "--enqueue" in sys.argv:
+        enqueue_parliamentarians(queue_directory)
+    elif "--worker" in sys.argv:
+        crawl_worker(queue_directory, shard_directory, cache_dir=scrape_kwargs["cache_dir"], cache_mode=cache_mode)
+    elif "--merge" in sys.argv:
+        merge_shards(shard_directory, out_directory, queue_directory)
+    elif "--parse" in sys.argv:
+        scrape_and_parse_parliamentarians(out_directory + 'raw_htmls', out_directory, **scrape_kwargs)
+    else:
+        scrape_parliamentarians(out_directory, **scrape_kwargs)